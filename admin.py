@@ -1,24 +1,37 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
-from models import db, User, Building, Apartment, Resident, Service, Charge, Payment, Report
-from datetime import datetime, date
+from models import (db, User, Building, Apartment, Resident, Service, Charge, Payment, Report,
+                    MeterReading, ApartmentBalance, Job, Tariff, AuditLog)
+from datetime import datetime, date, timedelta
+import json
+import os
+import uuid
+from werkzeug.utils import secure_filename
 from sqlalchemy import func, extract
+from sqlalchemy.orm import joinedload
+from stats import LazyStats, dashboard_stats
+from users import user_cache
+from instrumentation import BUCKETS, instrumentation
+from pagination import paginate_request
+from readings import import_readings, read_rows
+from reports import REPORT_TYPES
+from jobs import STATUSES as JOB_STATUSES, cancel as cancel_job, enqueue, job_state
+from ledger import debt_total, debtors as debtors_query
+from money import RATE_SCALE, to_decimal
+from tariffs import set_tariff
+from fragments import Lazy, conditional_page, fragment_cache
+from search import MAX_SEARCH_LIMIT, search
+from archive import ArchiveError, check_not_archived
+from audit import ACTIONS as AUDIT_ACTIONS, ENTITIES as AUDIT_ENTITIES, audit_writer
+from exports import (CHARGE_COLUMNS, PAYMENT_COLUMNS, charges_select, export_format, export_response,
+                     payments_select)
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
 # Контекстный процессор для статистики
 @admin_bp.context_processor
 def inject_stats():
-    stats = {
-        'buildings': Building.query.count(),
-        'apartments': Apartment.query.count(),
-        'residents': Resident.query.count(),
-        'services': Service.query.filter_by(is_active=True).count(),
-        'total_payments': db.session.query(func.sum(Payment.amount)).scalar() or 0,
-        'pending_payments': Payment.query.filter_by(status='pending').count(),
-        'total_charges': db.session.query(func.sum(Charge.total)).scalar() or 0,
-    }
-    return {'stats': stats}
+    return {'stats': LazyStats(dashboard_stats)}
 
 @admin_bp.before_request
 @login_required
@@ -31,30 +44,108 @@ def require_admin():
 @admin_bp.route('/')
 @admin_bp.route('/dashboard')
 def dashboard():
-    return render_template('admin/dashboard.html')
+    return render_template('admin/dashboard.html', user_cache=user_cache.snapshot())
+
+# Диагностика: самые медленные страницы и повторяющиеся запросы SQL
+@admin_bp.route('/diagnostics')
+def diagnostics():
+    return render_template('admin/diagnostics.html',
+                           endpoints=instrumentation.slowest(),
+                           repeated=instrumentation.repeated_statements(),
+                           buckets=BUCKETS,
+                           user_cache=user_cache.snapshot(),
+                           fragment_cache=fragment_cache.snapshot(),
+                           audit=audit_writer.snapshot())
+
+@admin_bp.route('/diagnostics/reset', methods=['POST'])
+def reset_diagnostics():
+    instrumentation.reset()
+    flash('Статистика запросов сброшена', 'success')
+    return redirect(url_for('admin.diagnostics'))
 
 # Управление домами
+# Списки отрисовываются из кэша фрагментов, а запросы выполняются только при промахе (fragments.py)
 @admin_bp.route('/buildings')
+@conditional_page('building')
 def buildings():
-    buildings_list = Building.query.all()
+    buildings_list = Lazy(Building.query.all)
     return render_template('admin/buildings.html', buildings=buildings_list)
 
 # Управление квартирами
 @admin_bp.route('/apartments')
+@conditional_page('apartment', 'building', 'apartment_balance')
 def apartments():
-    apartments_list = Apartment.query.all()
-    return render_template('admin/apartments.html', apartments=apartments_list)
+    query = Apartment.query.options(joinedload(Apartment.building), joinedload(Apartment.balance))
+    page = Lazy(lambda: paginate_request(query, [Apartment.id]))
+    return render_template('admin/apartments.html', apartments=Lazy(lambda: page.items), page=page)
+
+# Должники: выборка по индексу сальдо, самые большие долги первыми
+@admin_bp.route('/debtors')
+@conditional_page('apartment_balance', 'apartment', 'building')
+def debtors():
+    building_id = request.args.get('building_id', type=int)
+    query = debtors_query(building_id).options(
+        joinedload(ApartmentBalance.apartment).joinedload(Apartment.building)
+    )
+    page = Lazy(lambda: paginate_request(query, [ApartmentBalance.debt, ApartmentBalance.apartment_id],
+                                         descending=True))
+    totals = Lazy(lambda: debt_total(building_id))
+    return render_template('admin/debtors.html', balances=Lazy(lambda: page.items), page=page,
+                           debtors_count=Lazy(lambda: totals[0]), debt_total=Lazy(lambda: totals[1]),
+                           buildings=Lazy(Building.query.order_by(Building.address).all),
+                           building_id=building_id)
 
 # Управление жильцами
 @admin_bp.route('/residents')
+@conditional_page('resident', 'apartment', 'user')
 def residents():
-    residents_list = Resident.query.all()
-    return render_template('admin/residents.html', residents=residents_list)
+    q = request.args.get('q', '').strip()
+
+    def load():
+        query = Resident.query.options(joinedload(Resident.apartment), joinedload(Resident.user))
+        if q:
+            # Поиск по ФИО, телефону и адресу через индекс: не больше MAX_SEARCH_LIMIT совпадений
+            query = query.filter(Resident.id.in_(
+                [match['id'] for match in search(q, 'resident', MAX_SEARCH_LIMIT)]
+            ))
+        return paginate_request(query, [Resident.id])
+
+    page = Lazy(load)
+    return render_template('admin/residents.html', residents=Lazy(lambda: page.items), page=page, q=q)
+
+# Доступ жильца в личный кабинет
+@admin_bp.route('/resident/<int:id>/account', methods=['GET', 'POST'])
+def resident_account(id):
+    resident = Resident.query.get_or_404(id)
+    user = resident.user
+    if request.method == 'POST':
+        try:
+            username = request.form['username'].strip()
+            password = request.form.get('password', '')
+            if user is None:
+                if not password:
+                    flash('Укажите пароль для нового пользователя', 'danger')
+                    return redirect(url_for('admin.resident_account', id=id))
+                user = User(resident=resident, is_admin=False,
+                            email=resident.email or f'resident{resident.id}@localhost')
+                db.session.add(user)
+            user.username = username
+            user.is_active = bool(request.form.get('is_active'))
+            if password:
+                user.set_password(password)
+            db.session.commit()
+            flash(f'Доступ в личный кабинет для {resident.full_name} сохранен', 'success')
+            return redirect(url_for('admin.residents'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Ошибка при сохранении доступа: {str(e)}', 'danger')
+    return render_template('admin/resident_account.html', resident=resident, user=user)
 
 # Управление услугами
 @admin_bp.route('/services')
+@conditional_page('service')
 def services():
-    services_list = Service.query.all()
+    services_list = Lazy(Service.query.all)
     return render_template('admin/services.html', services=services_list)
 
 # Создание услуги
@@ -66,7 +157,7 @@ def create_service():
                 name=request.form['name'],
                 description=request.form.get('description'),
                 unit=request.form.get('unit'),
-                rate=float(request.form.get('rate', 0)),
+                rate=to_decimal(request.form.get('rate') or 0, RATE_SCALE),
                 is_counter=bool(request.form.get('is_counter')),
                 is_active=True
             )
@@ -78,18 +169,63 @@ def create_service():
             flash(f'Ошибка: {str(e)}', 'danger')
     return render_template('admin/create_service.html')
 
+# История тарифов услуги
+@admin_bp.route('/service/<int:id>/tariffs', methods=['GET', 'POST'])
+def service_tariffs(id):
+    service = Service.query.get_or_404(id)
+    if request.method == 'POST':
+        try:
+            valid_from = datetime.strptime(request.form['valid_from'], '%Y-%m').date()
+            rate = to_decimal(request.form.get('rate'), RATE_SCALE)
+            if rate < 0:
+                flash('Тариф не может быть отрицательным', 'danger')
+                return redirect(url_for('admin.service_tariffs', id=id))
+            building_id = request.form.get('building_id', type=int) or None
+            set_tariff(service, rate, valid_from, building_id)
+            db.session.commit()
+            flash(f'Тариф {rate} ₽ действует с {valid_from:%m.%Y}', 'success')
+            return redirect(url_for('admin.service_tariffs', id=id))
+        except (KeyError, ValueError):
+            db.session.rollback()
+            flash('Укажите месяц начала действия и тариф', 'danger')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Ошибка при сохранении тарифа: {str(e)}', 'danger')
+    tariffs = Tariff.query.options(joinedload(Tariff.building)).filter_by(service_id=id) \
+        .order_by(Tariff.building_id.isnot(None), Tariff.building_id, Tariff.valid_from.desc()).all()
+    buildings = Building.query.order_by(Building.address).all()
+    return render_template('admin/service_tariffs.html', service=service, tariffs=tariffs, buildings=buildings)
+
 # Управление начислениями
 @admin_bp.route('/charges')
+@conditional_page('charge', 'apartment', 'service')
 def charges():
-    charges_list = Charge.query.order_by(Charge.period.desc()).all()
-    return render_template('admin/charges.html', charges=charges_list)
+    query = Charge.query.options(joinedload(Charge.apartment), joinedload(Charge.service))
+    page = Lazy(lambda: paginate_request(query, [Charge.period, Charge.id], descending=True))
+    return render_template('admin/charges.html', charges=Lazy(lambda: page.items), page=page)
+
+# Выгрузка начислений
+@admin_bp.route('/charges/export')
+def export_charges():
+    fmt = export_format(request.args)
+    
+    period = None
+    if request.args.get('period'):
+        try:
+            period = datetime.strptime(request.args['period'], '%Y-%m').date()
+        except ValueError:
+            pass
+    
+    statement = charges_select(period, request.args.get('building_id', type=int))
+    filename = f'charges_{period:%Y_%m}' if period else 'charges'
+    return export_response(statement, CHARGE_COLUMNS, filename, fmt)
 
 # Создание начислений
 @admin_bp.route('/charge/create', methods=['GET', 'POST'])
 def create_charge():
     if request.method == 'POST':
         try:
-            service_ids = request.form.getlist('service_ids')
+            service_ids = request.form.getlist('service_ids', type=int)
             month = int(request.form['month'])
             year = int(request.form['year'])
             
@@ -97,64 +233,21 @@ def create_charge():
                 flash('Выберите хотя бы одну услугу', 'danger')
                 return redirect(url_for('admin.create_charge'))
             
-            # Получаем выбранные услуги
-            services = Service.query.filter(Service.id.in_(service_ids)).all()
-            
-            # Получаем квартиры
-            apartment_filter = request.form.get('apartment_filter', 'all')
+            check_not_archived(date(year, month, 1))
             
-            if apartment_filter == 'building':
-                building_id = request.form.get('building_id')
-                if building_id:
-                    apartments = Apartment.query.filter_by(building_id=building_id).all()
-                else:
-                    apartments = Apartment.query.all()
-            else:
-                apartments = Apartment.query.all()
+            building_id = None
+            if request.form.get('apartment_filter', 'all') == 'building':
+                building_id = request.form.get('building_id', type=int)
             
-            # Создаем начисления
-            created_count = 0
-            period_date = date(year, month, 1)
-            
-            for apartment in apartments:
-                for service in services:
-                    # Проверяем, не было ли уже начисления за этот период
-                    existing_charge = Charge.query.filter_by(
-                        apartment_id=apartment.id,
-                        service_id=service.id,
-                        period=period_date
-                    ).first()
-                    
-                    if existing_charge:
-                        continue  # Пропускаем, если начисление уже есть
-                    
-                    # Рассчитываем сумму начисления
-                    if service.is_counter:
-                        # Для услуг по счетчику - нужно вводить показания
-                        amount = 0
-                        total = 0
-                    else:
-                        # Для услуг по нормативу: тариф * площадь
-                        amount = apartment.area
-                        total = round(amount * service.rate, 2)
-                    
-                    charge = Charge(
-                        apartment_id=apartment.id,
-                        service_id=service.id,
-                        period=period_date,
-                        amount=amount,
-                        total=total,
-                        is_paid=False,
-                        created_at=datetime.utcnow()
-                    )
-                    
-                    db.session.add(charge)
-                    created_count += 1
-            
-            db.session.commit()
-            flash(f'Успешно создано {created_count} начислений за {month:02d}.{year}', 'success')
-            return redirect(url_for('admin.charges'))
+            # Расчёт по всему фонду идёт минутами - выполняется фоновой задачей
+            job = enqueue('billing', f'Начисления за {month:02d}.{year}',
+                          {'period': date(year, month, 1).isoformat(), 'service_ids': sorted(service_ids),
+                           'building_id': building_id}, current_user.id)
+            flash(f'Расчет начислений за {month:02d}.{year} поставлен в очередь', 'info')
+            return redirect(url_for('admin.job_detail', id=job.id))
             
+        except ArchiveError as e:
+            flash(str(e), 'danger')
         except Exception as e:
             db.session.rollback()
             flash(f'Ошибка при создании начислений: {str(e)}', 'danger')
@@ -169,39 +262,144 @@ def create_charge():
                           current_month=datetime.now().month,
                           current_year=datetime.now().year)
 
-# Управление платежами
-@admin_bp.route('/payments')
-def payments():
-    status_filter = request.args.get('status', 'all')
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
+# Показания счетчиков
+@admin_bp.route('/readings', methods=['GET', 'POST'])
+def readings():
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Выберите файл с показаниями', 'danger')
+            return redirect(url_for('admin.readings'))
+        
+        try:
+            report = import_readings(read_rows(upload.stream, upload.filename))
+            flash(f'Показания загружены: {report.summary()}',
+                  'warning' if report.rejected else 'success')
+            for error in report.errors[:10]:
+                flash(error, 'warning')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Ошибка при загрузке показаний: {str(e)}', 'danger')
+        return redirect(url_for('admin.readings'))
     
+    summary = db.session.query(
+        MeterReading.period,
+        Service.name,
+        func.count(MeterReading.id),
+        func.sum(MeterReading.consumption),
+    ).join(Service).group_by(MeterReading.period, Service.name).order_by(
+        MeterReading.period.desc(), Service.name
+    ).limit(24).all()
+    
+    return render_template('operator/readings.html', summary=summary)
+
+# Фильтрация платежей по параметрам запроса
+def filter_payments(args):
     query = Payment.query
     
+    status_filter = args.get('status', 'all')
     if status_filter != 'all':
         query = query.filter_by(status=status_filter)
     
+    date_from = date_arg(args, 'date_from')
     if date_from:
-        try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            query = query.filter(Payment.date >= date_from_obj)
-        except ValueError:
-            pass
+        query = query.filter(Payment.date >= date_from)
     
+    date_to = date_arg(args, 'date_to')
     if date_to:
+        query = query.filter(Payment.date <= date_to)
+    
+    return query
+
+PAYMENT_STATUSES = ('pending', 'completed', 'failed')
+PAYMENT_METHODS = ('bank', 'card', 'cash')
+
+def payment_values(data, partial):
+    """Проверенные поля платежа из формы или JSON; общая проверка для админки и API.
+
+    partial - изменение: отсутствующие поля не трогаются. Ошибка - ValueError с текстом
+    для пользователя.
+    """
+    values = {}
+    if 'apartment_id' in data or not partial:
         try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d')
-            query = query.filter(Payment.date <= date_to_obj)
-        except ValueError:
-            pass
+            apartment_id = int(data.get('apartment_id') or 0)
+        except (TypeError, ValueError):
+            apartment_id = 0
+        if not apartment_id or db.session.get(Apartment, apartment_id) is None:
+            raise ValueError('Квартира не найдена')
+        values['apartment_id'] = apartment_id
+    if 'amount' in data or not partial:
+        try:
+            values['amount'] = to_decimal(data.get('amount'))
+        except (TypeError, ValueError):
+            raise ValueError('Некорректная сумма')
+        if values['amount'] <= 0:
+            raise ValueError('Сумма должна быть больше нуля')
+    if 'status' in data:
+        if data['status'] not in PAYMENT_STATUSES:
+            raise ValueError(f'Некорректный статус: {data["status"]}')
+        values['status'] = data['status']
+    if 'payment_method' in data:
+        if data['payment_method'] not in PAYMENT_METHODS:
+            raise ValueError(f'Некорректный способ оплаты: {data["payment_method"]}')
+        values['payment_method'] = data['payment_method']
+    if 'description' in data:
+        values['description'] = data['description']
+    return values
+
+def date_arg(args, name):
+    """Дата ГГГГ-ММ-ДД из параметра запроса; None, если её нет или она с ошибкой."""
+    try:
+        return datetime.strptime(args[name], '%Y-%m-%d') if args.get(name) else None
+    except ValueError:
+        return None
+
+# Итоги по отфильтрованным платежам одним сгруппированным запросом
+def payment_totals(query):
+    rows = query.with_entities(
+        Payment.status,
+        Payment.payment_method,
+        func.count(Payment.id),
+        func.coalesce(func.sum(Payment.amount), 0),
+    ).group_by(Payment.status, Payment.payment_method).all()
     
-    payments_list = query.order_by(Payment.date.desc()).all()
+    totals = {'count': 0, 'amount': 0, 'by_status': {}, 'by_method': {}}
+    for status, method, count, amount in rows:
+        totals['count'] += count
+        totals['amount'] += amount
+        for key, group in ((status, totals['by_status']), (method, totals['by_method'])):
+            bucket = group.setdefault(key, {'count': 0, 'amount': 0})
+            bucket['count'] += count
+            bucket['amount'] += amount
+    return totals
+
+# Управление платежами
+@admin_bp.route('/payments')
+@conditional_page('payment', 'apartment', 'building')
+def payments():
+    filtered = filter_payments(request.args)
+    totals = Lazy(lambda: payment_totals(filtered))
+    
+    query = filtered.options(joinedload(Payment.apartment).joinedload(Apartment.building))
+    page = Lazy(lambda: paginate_request(query, [Payment.date, Payment.id], descending=True))
     
     return render_template('admin/payments.html', 
-                          payments=payments_list,
-                          status_filter=status_filter,
-                          date_from=date_from,
-                          date_to=date_to)
+                          payments=Lazy(lambda: page.items),
+                          page=page,
+                          totals=totals,
+                          status_filter=request.args.get('status', 'all'),
+                          date_from=request.args.get('date_from'),
+                          date_to=request.args.get('date_to'))
+
+# Выгрузка платежей с теми же фильтрами, что и список
+@admin_bp.route('/payments/export')
+def export_payments():
+    fmt = export_format(request.args)
+    
+    statement = payments_select(filter_payments(request.args),
+                                date_arg(request.args, 'date_from'), date_arg(request.args, 'date_to'))
+    return export_response(statement, PAYMENT_COLUMNS, 'payments', fmt)
 
 # Обновление платежа
 @admin_bp.route('/payment/<int:payment_id>/update', methods=['POST'])
@@ -209,10 +407,8 @@ def update_payment(payment_id):
     payment = Payment.query.get_or_404(payment_id)
     
     try:
-        payment.amount = float(request.form.get('amount', payment.amount))
-        payment.status = request.form.get('status', payment.status)
-        payment.payment_method = request.form.get('payment_method', payment.payment_method)
-        payment.description = request.form.get('description', payment.description)
+        for field, value in payment_values(request.form, partial=True).items():
+            setattr(payment, field, value)
         
         db.session.commit()
         flash('Платеж успешно обновлен', 'success')
@@ -242,56 +438,180 @@ def delete_payment(payment_id):
 def create_payment():
     if request.method == 'POST':
         try:
-            payment = Payment(
-                apartment_id=int(request.form['apartment_id']),
-                amount=float(request.form['amount']),
-                payment_method=request.form.get('payment_method', 'bank'),
-                status=request.form.get('status', 'completed'),
-                description=request.form.get('description', ''),
-                date=datetime.utcnow()
-            )
+            apartment_id = request.form.get('apartment_id', type=int)
+            if not apartment_id or db.session.get(Apartment, apartment_id) is None:
+                flash('Выберите квартиру из списка найденных', 'danger')
+                return redirect(url_for('admin.create_payment'))
+            values = {'payment_method': 'bank', 'status': 'completed', 'description': ''}
+            values.update(payment_values(request.form, partial=False))
+            payment = Payment(date=datetime.utcnow(), **values)
             
             db.session.add(payment)
             db.session.commit()
             flash('Платеж успешно создан', 'success')
             return redirect(url_for('admin.payments'))
         except Exception as e:
+            db.session.rollback()
             flash(f'Ошибка при создании платежа: {str(e)}', 'danger')
     
-    apartments = Apartment.query.all()
-    return render_template('admin/create_payment.html', apartments=apartments)
+    # Квартира выбирается поиском (GET /api/v1/search), а не из списка всех квартир
+    return render_template('admin/create_payment.html')
+
+# Загрузка реестра платежей банка
+@admin_bp.route('/payments/import', methods=['GET', 'POST'])
+def import_payments():
+    if request.method == 'POST':
+        upload = request.files.get('file')
+        if not upload or not upload.filename:
+            flash('Выберите файл реестра', 'danger')
+            return redirect(url_for('admin.import_payments'))
+        
+        try:
+            # Файл сохраняется до конца задачи; обработчик удалит его сам
+            upload_dir = current_app.config.get('JOB_UPLOAD_DIR') or \
+                os.path.join(current_app.instance_path, 'uploads')
+            os.makedirs(upload_dir, exist_ok=True)
+            path = os.path.join(upload_dir, f'{uuid.uuid4().hex}_{secure_filename(upload.filename)}')
+            upload.save(path)
+            source = request.form.get('source', '').strip()
+            job = enqueue('registry_import', f'Реестр {upload.filename}',
+                          {'path': path, 'filename': upload.filename, 'source': source}, current_user.id)
+            flash(f'Реестр {upload.filename} поставлен в очередь', 'info')
+            return redirect(url_for('admin.job_detail', id=job.id))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Ошибка при загрузке реестра: {str(e)}', 'danger')
+    
+    return render_template('admin/import_payments.html')
 
 # Управление отчетами
 @admin_bp.route('/reports')
+@conditional_page('report', 'user')
 def reports():
-    reports_list = Report.query.order_by(Report.created_at.desc()).all()
-    return render_template('admin/reports.html', reports=reports_list)
+    reports_list = Lazy(Report.query.options(joinedload(Report.author)).order_by(Report.created_at.desc()).all)
+    return render_template('admin/reports.html', reports=reports_list, report_types=REPORT_TYPES)
 
 # Создание отчета
 @admin_bp.route('/report/create', methods=['GET', 'POST'])
 def create_report():
     if request.method == 'POST':
         try:
-            report = Report(
-                title=request.form['title'],
-                content=request.form['content'],
-                report_type=request.form.get('report_type', 'general'),
-                created_by=current_user.id,
-                created_at=datetime.utcnow()
-            )
-            
+            report_type = request.form.get('report_type', 'general')
+            period_date = None
             if request.form.get('period'):
                 try:
                     period_date = datetime.strptime(request.form['period'], '%Y-%m').date()
-                    report.period = period_date
                 except ValueError:
                     pass
             
+            if report_type in REPORT_TYPES:
+                # Сформированный отчет строится по месячным агрегатам
+                if not period_date:
+                    flash('Укажите период отчета', 'danger')
+                    return redirect(url_for('admin.create_report'))
+                title = request.form.get('title') or f'{REPORT_TYPES[report_type]} за {period_date:%m.%Y}'
+                job = enqueue('report', title,
+                              {'report_type': report_type, 'period': period_date.isoformat(), 'title': title,
+                               'user_id': current_user.id,
+                               'building_id': request.form.get('building_id', type=int)}, current_user.id)
+                flash('Формирование отчета поставлено в очередь', 'info')
+                return redirect(url_for('admin.job_detail', id=job.id))
+            
+            title = request.form['title']
+            content = request.form['content']
+            
+            report = Report(
+                title=title,
+                content=content,
+                report_type=report_type,
+                period=period_date,
+                created_by=current_user.id,
+                created_at=datetime.utcnow()
+            )
+            
             db.session.add(report)
             db.session.commit()
             flash('Отчет успешно создан', 'success')
-            return redirect(url_for('admin.reports'))
+            return redirect(url_for('admin.report_detail', id=report.id))
         except Exception as e:
+            db.session.rollback()
             flash(f'Ошибка при создании отчета: {str(e)}', 'danger')
     
-    return render_template('admin/create_report.html')
\ No newline at end of file
+    buildings = Building.query.order_by(Building.address).all()
+    return render_template('admin/create_report.html', report_types=REPORT_TYPES, buildings=buildings)
+
+# Просмотр отчета
+@admin_bp.route('/report/<int:id>')
+def report_detail(id):
+    report = Report.query.get_or_404(id)
+    data = json.loads(report.content) if report.report_type in REPORT_TYPES else None
+    return render_template('admin/report_detail.html', report=report, data=data, report_types=REPORT_TYPES)
+
+# Удаление отчета
+@admin_bp.route('/report/<int:id>/delete', methods=['POST'])
+def delete_report(id):
+    report = Report.query.get_or_404(id)
+    
+    try:
+        db.session.delete(report)
+        db.session.commit()
+        flash('Отчет удален', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при удалении отчета: {str(e)}', 'danger')
+    
+    return redirect(url_for('admin.reports'))
+
+# Журнал изменений
+@admin_bp.route('/audit')
+def audit():
+    # Записи, ещё ждущие в буфере, дописываются сразу, чтобы свежие изменения были видны
+    audit_writer.flush()
+    query = AuditLog.query
+    entity = request.args.get('entity')
+    if entity in AUDIT_ENTITIES:
+        query = query.filter(AuditLog.entity == entity)
+        entity_id = request.args.get('entity_id', type=int)
+        if entity_id:
+            query = query.filter(AuditLog.entity_id == entity_id)
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+    try:
+        if date_from:
+            query = query.filter(AuditLog.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
+        if date_to:
+            query = query.filter(AuditLog.created_at < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        flash('Дата должна быть в формате ГГГГ-ММ-ДД', 'danger')
+    page = paginate_request(query, [AuditLog.id], descending=True)
+    return render_template('admin/audit.html', entries=page.items, page=page,
+                           entities=AUDIT_ENTITIES, actions=AUDIT_ACTIONS)
+
+# Фоновые задачи
+@admin_bp.route('/jobs')
+def jobs():
+    query = Job.query.options(joinedload(Job.author))
+    status = request.args.get('status')
+    if status in JOB_STATUSES:
+        query = query.filter(Job.status == status)
+    page = paginate_request(query, [Job.id], descending=True)
+    return render_template('admin/jobs.html', jobs=page.items, page=page,
+                           statuses=JOB_STATUSES, status=status)
+
+@admin_bp.route('/jobs/<int:id>')
+def job_detail(id):
+    job = Job.query.get_or_404(id)
+    return render_template('admin/job_detail.html', job=job, state=job_state(job), statuses=JOB_STATUSES)
+
+@admin_bp.route('/jobs/<int:id>/cancel', methods=['POST'])
+def cancel_job_view(id):
+    job = Job.query.get_or_404(id)
+    try:
+        if cancel_job(job):
+            flash('Задача отменена' if job.status == 'cancelled' else 'Отмена запрошена', 'success')
+        else:
+            flash('Задача уже завершена', 'warning')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Ошибка при отмене задачи: {str(e)}', 'danger')
+    return redirect(url_for('admin.job_detail', id=id))
@@ -0,0 +1,350 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Blueprint, abort, jsonify, request, url_for
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+
+from models import db, Building, Apartment, Service, Charge, Payment, ApartmentBalance, Job
+from pagination import keyset_paginate, page_size_arg
+from readings import parse_period
+from admin import filter_payments, payment_values
+from jobs import job_state
+from search import KINDS as SEARCH_KINDS, SEARCH_LIMIT, SOURCE_TABLES as SEARCH_TABLES, search as search_index
+from fragments import conditional_response
+
+api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+class Resource:
+    """Описание коллекции API: поля, ключ сортировки и базовый запрос.
+
+    fields - {имя: выражение SQL}; клиент выбирает подмножество через ?fields=a,b,
+    и в SELECT попадают только эти колонки (плюс ключ сортировки). tables - таблицы,
+    по версиям которых строится ETag ответа.
+    """
+
+    def __init__(self, model, fields, key, query, tables, descending=False, filters=None):
+        self.model = model
+        self.fields = fields
+        self.tables = tables
+        self.key = key
+        self.query = query
+        self.descending = descending
+        self.filters = filters
+
+    def selected_fields(self):
+        names = request.args.get('fields')
+        if not names:
+            return list(self.fields)
+        selected = [name.strip() for name in names.split(',') if name.strip()]
+        unknown = [name for name in selected if name not in self.fields]
+        if unknown:
+            abort(400, f'Неизвестные поля: {", ".join(unknown)}')
+        return selected
+
+    def select(self, names, args):
+        query = self.query(args) if self.filters is None else self.filters(self.query(args), args)
+        # Ключ сортировки нужен для курсора, даже если поле не запрошено
+        columns = [self.fields[name].label(name) for name in names]
+        columns += [column.label(column.key) for column in self.key if column.key not in names]
+        return query.with_entities(*columns)
+
+
+def _value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Суммы отдаются строкой, чтобы клиент не терял копейки на float
+        return str(value)
+    return value
+
+
+def _item(row, names):
+    return {name: _value(getattr(row, name)) for name in names}
+
+
+def _int_arg(args, name):
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        abort(400, f'Некорректное значение {name}: {value}')
+
+
+# --- Коллекции ---
+
+def _apartments_query(args):
+    return Apartment.query.join(Building, Apartment.building_id == Building.id) \
+        .outerjoin(ApartmentBalance, ApartmentBalance.apartment_id == Apartment.id)
+
+
+def _filter_apartments(query, args):
+    building_id = _int_arg(args, 'building_id')
+    if building_id:
+        query = query.filter(Apartment.building_id == building_id)
+    return query
+
+
+def _charges_query(args):
+    return Charge.query.join(Apartment, Charge.apartment_id == Apartment.id) \
+        .join(Service, Charge.service_id == Service.id)
+
+
+def _filter_charges(query, args):
+    if args.get('period'):
+        try:
+            query = query.filter(Charge.period == parse_period(args['period']))
+        except ValueError as e:
+            abort(400, str(e))
+    for name, column in (('apartment_id', Charge.apartment_id), ('service_id', Charge.service_id),
+                         ('building_id', Apartment.building_id)):
+        value = _int_arg(args, name)
+        if value:
+            query = query.filter(column == value)
+    if args.get('is_paid') in ('0', '1', 'true', 'false'):
+        query = query.filter(Charge.is_paid.is_(args['is_paid'] in ('1', 'true')))
+    return query
+
+
+def _payments_query(args):
+    return filter_payments(args).join(Apartment, Payment.apartment_id == Apartment.id) \
+        .join(Building, Apartment.building_id == Building.id)
+
+
+def _filter_payments(query, args):
+    apartment_id = _int_arg(args, 'apartment_id')
+    if apartment_id:
+        query = query.filter(Payment.apartment_id == apartment_id)
+    return query
+
+
+RESOURCES = {
+    'buildings': Resource(
+        Building,
+        {
+            'id': Building.id,
+            'address': Building.address,
+            'floors': Building.floors,
+            'apartments_count': Building.apartments_count,
+            'year_built': Building.year_built,
+            'created_at': Building.created_at,
+        },
+        key=[Building.id],
+        query=lambda args: Building.query,
+        tables=('building',),
+    ),
+    'apartments': Resource(
+        Apartment,
+        {
+            'id': Apartment.id,
+            'number': Apartment.number,
+            'area': Apartment.area,
+            'rooms': Apartment.rooms,
+            'floor': Apartment.floor,
+            'building_id': Apartment.building_id,
+            'building_address': Building.address,
+            'debt': db.func.coalesce(ApartmentBalance.debt, 0),
+        },
+        key=[Apartment.id],
+        query=_apartments_query,
+        tables=('apartment', 'building', 'apartment_balance'),
+        filters=_filter_apartments,
+    ),
+    'charges': Resource(
+        Charge,
+        {
+            'id': Charge.id,
+            'period': Charge.period,
+            'apartment_id': Charge.apartment_id,
+            'apartment_number': Apartment.number,
+            'service_id': Charge.service_id,
+            'service_name': Service.name,
+            'amount': Charge.amount,
+            'total': Charge.total,
+            'is_paid': Charge.is_paid,
+            'created_at': Charge.created_at,
+        },
+        key=[Charge.period, Charge.id],
+        descending=True,
+        query=_charges_query,
+        tables=('charge', 'apartment', 'service'),
+        filters=_filter_charges,
+    ),
+    'payments': Resource(
+        Payment,
+        {
+            'id': Payment.id,
+            'apartment_id': Payment.apartment_id,
+            'apartment_number': Apartment.number,
+            'building_address': Building.address,
+            'amount': Payment.amount,
+            'date': Payment.date,
+            'status': Payment.status,
+            'payment_method': Payment.payment_method,
+            'description': Payment.description,
+            'created_at': Payment.created_at,
+        },
+        key=[Payment.date, Payment.id],
+        descending=True,
+        query=_payments_query,
+        tables=('payment', 'apartment', 'building'),
+        filters=_filter_payments,
+    ),
+}
+
+
+def _conditional(payload, status=200):
+    # ETag по телу ответа - для данных без версий таблиц (состояние задач)
+    response = jsonify(payload)
+    response.status_code = status
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def _resource(name):
+    resource = RESOURCES.get(name)
+    if resource is None:
+        abort(404, f'Ресурс {name} не найден')
+    return resource
+
+
+@api_bp.before_request
+def require_admin():
+    if not current_user.is_authenticated:
+        abort(401, 'Требуется вход в систему')
+    if not current_user.is_admin:
+        abort(403, 'Требуются права администратора')
+
+
+@api_bp.errorhandler(HTTPException)
+def json_error(error):
+    response = jsonify({'success': False, 'error': error.description})
+    response.status_code = error.code
+    return response
+
+
+@api_bp.route('/<name>')
+def collection(name):
+    resource = _resource(name)
+    # ETag по версиям таблиц и параметрам: 304 отдаётся до запроса к данным
+    return conditional_response(resource.tables, lambda: _collection(name, resource))
+
+
+def _collection(name, resource):
+    names = resource.selected_fields()
+    try:
+        page = keyset_paginate(
+            resource.select(names, request.args), resource.key,
+            descending=resource.descending,
+            after=request.args.get('after'),
+            before=request.args.get('before'),
+            page_size=page_size_arg(),
+        )
+    except ValueError as e:
+        abort(400, str(e))
+
+    args = {key: value for key, value in request.args.items() if key not in ('after', 'before')}
+    links = {'first': url_for('api.collection', name=name, **args)}
+    if page.has_next:
+        links['next'] = url_for('api.collection', name=name, after=page.next_cursor, **args)
+    if page.has_prev:
+        links['prev'] = url_for('api.collection', name=name, before=page.prev_cursor, **args)
+    return jsonify({
+        'items': [_item(row, names) for row in page.items],
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'links': links,
+    })
+
+
+@api_bp.route('/<name>/<int:item_id>')
+def item(name, item_id):
+    resource = _resource(name)
+    return conditional_response(resource.tables, lambda: _item_response(resource, item_id))
+
+
+def _item_response(resource, item_id):
+    names = resource.selected_fields()
+    row = resource.select(names, {}).filter(resource.model.id == item_id).first()
+    if row is None:
+        abort(404, f'Запись {item_id} не найдена')
+    return jsonify(_item(row, names))
+
+
+@api_bp.route('/search')
+def search():
+    # Подсказки для полей выбора квартиры и жильца: ?q=текст&kind=apartment|resident&limit=N
+    kind = request.args.get('kind') or None
+    if kind is not None and kind not in SEARCH_KINDS:
+        abort(400, f'Неизвестный вид: {kind}')
+    limit = request.args.get('limit', SEARCH_LIMIT, type=int)
+    return conditional_response(SEARCH_TABLES, lambda: jsonify(
+        {'items': search_index(request.args.get('q', ''), kind, limit)}))
+
+
+@api_bp.route('/jobs/<int:job_id>')
+def job(job_id):
+    # Страница статуса опрашивает этот адрес, пока задача не завершится
+    job = db.session.get(Job, job_id) or abort(404, f'Задача {job_id} не найдена')
+    return _conditional(job_state(job))
+
+
+# --- Изменение платежей ---
+
+def _payment_data(partial):
+    try:
+        return payment_values(request.get_json(silent=True) or request.form, partial)
+    except ValueError as e:
+        abort(400, str(e))
+
+
+def _saved_payment(payment_id, status=200):
+    names = list(RESOURCES['payments'].fields)
+    row = RESOURCES['payments'].select(names, {}).filter(Payment.id == payment_id).one()
+    response = jsonify({'success': True, 'item': _item(row, names)})
+    response.status_code = status
+    return response
+
+
+@api_bp.route('/payments', methods=['POST'])
+def create_payment():
+    payment = Payment(date=datetime.utcnow(), **_payment_data(partial=False))
+    try:
+        db.session.add(payment)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        abort(500, f'Ошибка при создании платежа: {str(e)}')
+    response = _saved_payment(payment.id, status=201)
+    response.headers['Location'] = url_for('api.item', name='payments', item_id=payment.id)
+    return response
+
+
+@api_bp.route('/payments/<int:payment_id>', methods=['PATCH'])
+def update_payment(payment_id):
+    payment = db.session.get(Payment, payment_id) or abort(404, f'Платеж {payment_id} не найден')
+    try:
+        for field, value in _payment_data(partial=True).items():
+            setattr(payment, field, value)
+        db.session.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        abort(500, f'Ошибка при обновлении платежа: {str(e)}')
+    return _saved_payment(payment_id)
+
+
+@api_bp.route('/payments/<int:payment_id>', methods=['DELETE'])
+def delete_payment(payment_id):
+    payment = db.session.get(Payment, payment_id) or abort(404, f'Платеж {payment_id} не найден')
+    try:
+        db.session.delete(payment)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        abort(500, f'Ошибка при удалении платежа: {str(e)}')
+    return jsonify({'success': True})
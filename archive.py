@@ -0,0 +1,158 @@
+"""Архив начислений и платежей закрытых лет.
+
+`flask archive ГОД` переносит начисления и платежи этого и более ранних лет
+в таблицы charge_archive_ГГГГ и payment_archive_ГГГГ (по году на таблицу),
+а итоги года записывает в ArchivedYear. Помесячные агрегаты (MonthlyBalance,
+MonthlyServiceRevenue) и сальдо квартир остаются, поэтому отчеты, должники
+и квитанции архива не касаются. Списки админки и API работают только с
+основными таблицами; выгрузки и полный пересчёт агрегатов добавляют архивные
+таблицы, если период их захватывает (with_archives).
+
+Начисления в архивные месяцы запрещены. Платежи не в статусе pending
+переносятся по дате; платёж, загруженный задним числом после архивации,
+остаётся в основной таблице до повторного `flask archive`.
+"""
+from datetime import date, datetime
+
+from sqlalchemy import Column, Index, MetaData, Table, func, insert, select, union_all
+from sqlalchemy.sql.visitors import replacement_traverse
+
+from models import db, ArchivedYear, Charge, Payment
+
+# Архивные таблицы не входят в модели и миграции (см. migrations/env.py)
+archive_metadata = MetaData()
+
+# Колонка, по которой строка относится к году, и индексы архивной таблицы
+ARCHIVED = {
+    Charge: ('period', [('period', 'id'), ('apartment_id',)]),
+    Payment: ('date', [('date', 'id'), ('apartment_id',)]),
+}
+
+# Платежи, которые ещё могут измениться, не архивируются
+OPEN_PAYMENT_STATUS = 'pending'
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def archive_table(model, year):
+    """Таблица архива model за год (описание; в базе создаётся при архивации)."""
+    name = f'{model.__tablename__}_archive_{year}'
+    table = archive_metadata.tables.get(name)
+    if table is None:
+        _, indexes = ARCHIVED[model]
+        table = Table(
+            name, archive_metadata,
+            *[Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+              for column in model.__table__.columns],
+        )
+        for columns in indexes:
+            Index(f'ix_{name}_{"_".join(columns)}', *[table.c[column] for column in columns])
+    return table
+
+
+def archived_years():
+    return db.session.scalars(select(ArchivedYear.year).order_by(ArchivedYear.year)).all()
+
+
+def archive_boundary():
+    """Первый день после архива (всё раньше - в архивных таблицах) или None."""
+    return db.session.scalar(select(func.max(ArchivedYear.until)))
+
+
+def check_not_archived(period):
+    boundary = archive_boundary()
+    if boundary and period < boundary:
+        raise ArchiveError(f'Период {period:%m.%Y} в архиве, начисления за него закрыты')
+
+
+def years_between(date_from=None, date_to=None):
+    """Архивные годы, которые захватывает интервал дат (границы необязательны)."""
+    return [year for year in archived_years()
+            if (date_from is None or year >= date_from.year) and (date_to is None or year <= date_to.year)]
+
+
+def _retarget(statement, table, archive):
+    """Тот же запрос, но по архивной таблице вместо table."""
+    def replace(element, **kw):
+        if isinstance(element, Table) and element.name == table.name:
+            return archive
+        if isinstance(element, Column) and getattr(element.table, 'name', None) == table.name:
+            return archive.c[element.name]
+        return None
+    return replacement_traverse(statement, {}, replace)
+
+
+def with_archive_parts(statement, model, years):
+    """[statement, тот же запрос по архиву каждого из years] - части для UNION ALL."""
+    return [statement] + [_retarget(statement, model.__table__, archive_table(model, year)) for year in years]
+
+
+def with_archives(statement, model, years, order_by):
+    """statement по model, дополненный теми же запросами по архивам years, с сортировкой по order_by.
+
+    order_by - имена колонок результата. Без архивных лет запрос не меняется.
+    """
+    if not years:
+        return statement.order_by(*[statement.selected_columns[name] for name in order_by])
+    combined = union_all(*with_archive_parts(statement, model, years)).subquery()
+    return select(combined).order_by(*[combined.c[name] for name in order_by])
+
+
+def _year_filter(model, table, year):
+    column_name, _ = ARCHIVED[model]
+    column = table.c[column_name]
+    if model is Payment:
+        return (column >= datetime(year, 1, 1), column < datetime(year + 1, 1, 1),
+                table.c.status != OPEN_PAYMENT_STATUS)
+    return column >= date(year, 1, 1), column < date(year + 1, 1, 1)
+
+
+def _move(connection, model, year):
+    """Переносит строки года в архивную таблицу; возвращает (строк, сумма)."""
+    table = model.__table__
+    archive = archive_table(model, year)
+    archive.create(connection, checkfirst=True)
+    conditions = _year_filter(model, table, year)
+    amount = table.c.total if model is Charge else table.c.amount
+    count, total = connection.execute(
+        select(func.count(), func.coalesce(func.sum(amount), 0)).where(*conditions)
+    ).one()
+    if count:
+        columns = [column.name for column in table.columns]
+        connection.execute(insert(archive).from_select(columns, select(*table.columns).where(*conditions)))
+        connection.execute(table.delete().where(*conditions))
+    return count, total
+
+
+def archive_until(year, progress=None):
+    """Архивирует все годы по year включительно, каждый в своей транзакции; возвращает ArchivedYear.
+
+    Архивировать можно только закрытые годы - раньше текущего.
+    """
+    if year >= date.today().year:
+        raise ArchiveError(f'Архивировать можно только закрытые годы, раньше {date.today().year}')
+    first = db.session.scalar(select(func.min(Charge.period)))
+    first_payment = db.session.scalar(select(func.min(Payment.date)))
+    years = [value.year for value in (first, first_payment) if value is not None]
+    done = []
+    for current in range(min(years, default=year + 1), year + 1):
+        if progress:
+            progress(f'{current}: перенос начислений и платежей')
+        connection = db.session.connection()
+        charges_count, charges_total = _move(connection, Charge, current)
+        payments_count, payments_total = _move(connection, Payment, current)
+        summary = db.session.get(ArchivedYear, current)
+        if summary is None:
+            summary = ArchivedYear(year=current, until=date(current + 1, 1, 1), charges_count=0,
+                                   charges_total=0, payments_count=0, payments_total=0)
+            db.session.add(summary)
+        summary.charges_count += charges_count
+        summary.charges_total += charges_total
+        summary.payments_count += payments_count
+        summary.payments_total += payments_total
+        summary.archived_at = datetime.utcnow()
+        db.session.commit()
+        done.append(summary)
+    return done
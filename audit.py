@@ -0,0 +1,242 @@
+"""Журнал изменений денежных и справочных данных.
+
+Изменения Payment, Charge, Service и Building собираются из событий сессии
+(было/стало по каждому полю) и после COMMIT передаются в буфер в памяти.
+Отдельный поток пишет их пакетами в таблицу audit_log, поэтому запрос
+только добавляет их в буфер. Откаченные транзакции в журнал не попадают.
+Пакетные вставки Core (расчёт начислений, реестры банка) сессией не
+отслеживаются - их итоги хранятся в задачах (таблица job).
+"""
+import atexit
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event, inspect, insert
+from sqlalchemy.orm import Session
+
+from models import db, AuditLog, Building, Charge, Payment, Service
+
+# Какие модели попадают в журнал и под каким именем
+AUDITED = {
+    Payment: 'payment',
+    Charge: 'charge',
+    Service: 'service',
+    Building: 'building',
+}
+
+ENTITIES = {
+    'payment': 'Платеж',
+    'charge': 'Начисление',
+    'service': 'Услуга',
+    'building': 'Дом',
+}
+
+ACTIONS = {
+    'insert': 'Создание',
+    'update': 'Изменение',
+    'delete': 'Удаление',
+}
+
+# Сколько записей пишется одним INSERT
+AUDIT_BATCH_SIZE = 500
+
+# Как долго запись может ждать в буфере, пока пакет не наберётся, с
+AUDIT_FLUSH_INTERVAL = 1.0
+
+# Сколько записей может ждать в буфере; при переполнении запрос ждёт писателя
+AUDIT_BUFFER_SIZE = 10000
+
+# Сколько раз повторять запись пакета, если база занята
+AUDIT_RETRIES = 3
+
+logger = logging.getLogger(__name__)
+
+
+def _jsonable(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _diff(obj, action):
+    """{поле: [было, стало]} по колонкам объекта; при изменении - только изменённые поля.
+
+    Незагруженные атрибуты не читаются из базы: событие приходит посреди flush.
+    """
+    state = inspect(obj)
+    changes = {}
+    for column in state.mapper.column_attrs:
+        key = column.key
+        history = state.attrs[key].history
+        if action == 'insert':
+            if key in state.dict:
+                changes[key] = [None, _jsonable(state.dict[key])]
+        elif action == 'delete':
+            before = history.deleted or history.unchanged
+            if before:
+                changes[key] = [_jsonable(before[0]), None]
+        elif history.has_changes():
+            before = history.deleted[0] if history.deleted else None
+            after = history.added[0] if history.added else None
+            if before != after:
+                changes[key] = [_jsonable(before), _jsonable(after)]
+    return changes
+
+
+def _author():
+    """Пользователь и источник изменения; пользователя не загружает, если его ещё не загрузили."""
+    user = g.get('_login_user') if has_app_context() else None
+    user_id = getattr(user, 'id', None)
+    username = getattr(user, 'username', None)
+    if has_request_context():
+        origin = f'{request.method} {request.path}'
+    else:
+        origin = threading.current_thread().name
+    return user_id, username, origin[:200]
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    entries = []
+    for objects, action in ((session.new, 'insert'), (session.dirty, 'update'), (session.deleted, 'delete')):
+        for obj in objects:
+            entity = AUDITED.get(type(obj))
+            if entity is None:
+                continue
+            changes = _diff(obj, action)
+            if not changes:
+                continue
+            # identity новых объектов появится только после flush, первичный ключ уже присвоен
+            entries.append({'entity': entity, 'entity_id': inspect(obj).mapper.primary_key_from_instance(obj)[0],
+                            'action': action, 'changes': json.dumps(changes, ensure_ascii=False)})
+    if entries:
+        user_id, username, origin = _author()
+        for entry in entries:
+            entry.update(user_id=user_id, username=username, origin=origin)
+        session.info.setdefault('audit_entries', []).extend(entries)
+
+
+@event.listens_for(Session, 'after_commit')
+def _submit_changes(session):
+    entries = session.info.pop('audit_entries', None)
+    if entries:
+        now = datetime.utcnow()
+        for entry in entries:
+            entry['created_at'] = now
+        audit_writer.submit(entries)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('audit_entries', None)
+
+
+class AuditWriter:
+    """Буфер записей журнала и поток, который пишет их пакетами."""
+
+    def __init__(self, batch_size=AUDIT_BATCH_SIZE, interval=AUDIT_FLUSH_INTERVAL, maxsize=AUDIT_BUFFER_SIZE):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.maxsize = maxsize
+        self._buffer = deque()
+        self._changed = threading.Condition()
+        # Записи покидают буфер только под этой блокировкой, поэтому flush() видит все недописанные
+        self._write_lock = threading.Lock()
+        self._app = None
+        self._thread = None
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    def configure(self, batch_size=None, interval=None, maxsize=None):
+        if batch_size is not None:
+            self.batch_size = batch_size
+        if interval is not None:
+            self.interval = interval
+        if maxsize is not None:
+            self.maxsize = maxsize
+
+    def submit(self, entries):
+        app = current_app._get_current_object()
+        if self._app is not None and self._app is not app:
+            # Другое приложение в том же процессе (тесты, повторный create_app):
+            # записи прежнего дописываются в его базу
+            self.flush()
+        with self._changed:
+            self._app = app
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='audit-writer', daemon=True)
+                self._thread.start()
+            self._changed.wait_for(lambda: len(self._buffer) < self.maxsize)
+            self._buffer.extend(entries)
+            if len(self._buffer) >= self.batch_size:
+                self._changed.notify_all()
+
+    def _take(self):
+        with self._changed:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            self._changed.notify_all()
+        return batch
+
+    def _write(self, batch):
+        for attempt in range(1, AUDIT_RETRIES + 1):
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(insert(AuditLog), batch)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except Exception:
+                if attempt == AUDIT_RETRIES:
+                    # Записи не теряются бесследно: остаются в логе приложения
+                    logger.exception('Не удалось записать журнал изменений, записей: %d', len(batch))
+                    for entry in batch:
+                        logger.error('audit %s', json.dumps(entry, default=_jsonable, ensure_ascii=False))
+                    self.dropped += len(batch)
+                    return
+                time.sleep(self.interval * attempt)
+
+    def _loop(self):
+        while True:
+            # Пакет набрался или первая запись ждёт дольше interval
+            with self._changed:
+                self._changed.wait_for(lambda: len(self._buffer) >= self.batch_size, timeout=self.interval)
+            self.flush()
+
+    def flush(self):
+        """Записывает всё, что ждёт в буфере, в текущем потоке."""
+        if self._app is None:
+            return
+        with self._write_lock, self._app.app_context():
+            while True:
+                batch = self._take()
+                if not batch:
+                    break
+                self._write(batch)
+
+    @property
+    def pending(self):
+        return len(self._buffer)
+
+    def snapshot(self):
+        return {'pending': self.pending, 'written': self.written, 'batches': self.batches,
+                'dropped': self.dropped}
+
+
+audit_writer = AuditWriter()
+
+# Буфер дописывается при остановке процесса
+atexit.register(audit_writer.flush)
+
+
+def init_audit(app):
+    audit_writer.configure(app.config.get('AUDIT_BATCH_SIZE'), app.config.get('AUDIT_FLUSH_INTERVAL'),
+                           app.config.get('AUDIT_BUFFER_SIZE'))
@@ -0,0 +1,118 @@
+"""Параллельные читатели и один писатель на профиле базы приложения.
+
+Запуск из корня проекта (по умолчанию - временный файл SQLite):
+
+    python benchmarks/concurrency.py --readers 8 --seconds 10
+    DATABASE_URL=postgresql://... python benchmarks/concurrency.py
+
+Код возврата 1, если хотя бы один запрос получил "database is locked".
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'concurrency.db')
+
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app import create_app  # noqa: E402
+from database import upgrade_database  # noqa: E402
+from models import db, Building, Apartment, Payment  # noqa: E402
+from admin import filter_payments, payment_totals  # noqa: E402
+
+
+class Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+        self.locked = 0
+        self.errors = 0
+
+    def add(self, name):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+def reader(app, counters, deadline):
+    with app.app_context():
+        while time.monotonic() < deadline:
+            try:
+                payment_totals(filter_payments({}))
+                Payment.query.order_by(Payment.date.desc(), Payment.id.desc()).limit(50).all()
+                counters.add('reads')
+            except OperationalError as e:
+                db.session.rollback()
+                counters.add('locked' if 'locked' in str(e) else 'errors')
+            finally:
+                db.session.remove()
+
+
+def writer(app, counters, deadline, apartment_ids):
+    with app.app_context():
+        index = 0
+        while time.monotonic() < deadline:
+            try:
+                for _ in range(50):
+                    db.session.add(Payment(apartment_id=apartment_ids[index % len(apartment_ids)],
+                                           amount=100, date=datetime.utcnow()))
+                    index += 1
+                db.session.commit()
+                counters.add('writes')
+            except OperationalError as e:
+                db.session.rollback()
+                counters.add('locked' if 'locked' in str(e) else 'errors')
+            finally:
+                db.session.remove()
+
+
+def run(app, readers, seconds):
+    """readers потоков чтения и один писатель в течение seconds секунд; возвращает Counters."""
+    with app.app_context():
+        building = Building(address='ул. Нагрузочная, д. 1')
+        db.session.add(building)
+        db.session.add_all(Apartment(number=str(i), building=building) for i in range(100))
+        db.session.commit()
+        apartment_ids = [apartment.id for apartment in Apartment.query.filter_by(building_id=building.id)]
+        db.session.remove()
+
+    counters = Counters()
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=reader, args=(app, counters, deadline)) for _ in range(readers)]
+    threads.append(threading.Thread(target=writer, args=(app, counters, deadline, apartment_ids)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        upgrade_database()
+        print('База:', db.engine.url.render_as_string(hide_password=True))
+        if db.engine.dialect.name == 'sqlite':
+            print('journal_mode:', db.session.execute(db.text('PRAGMA journal_mode')).scalar())
+
+    counters = run(app, args.readers, args.seconds)
+
+    print(f'чтений: {counters.reads}, транзакций записи: {counters.writes}, '
+          f'"database is locked": {counters.locked}, прочих ошибок: {counters.errors}')
+    return 1 if counters.locked or counters.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Расчёт сумм начислений: пакетный путь против построчного эталона на Decimal.
+
+Запуск из корня проекта:
+
+    python benchmarks/money_compute.py --apartments 200000
+
+Код возврата 1, если пакетный расчёт (с NumPy и без) хоть в одной строке
+расходится с эталоном money.apply_rate.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import money  # noqa: E402
+from money import apply_rate  # noqa: E402
+from billing import compute_charges  # noqa: E402
+
+
+class FakeService:
+    def __init__(self, id, rate, is_counter):
+        self.id = id
+        self.rate = rate
+        self.is_counter = is_counter
+
+
+def reference_charges(apartments, services, consumption):
+    """Построчный эталон: {(apartment_id, service_id): (объём, сумма)}."""
+    rows = {}
+    for apartment_id, area in apartments:
+        for service in services:
+            amount = consumption.get((apartment_id, service.id), 0) if service.is_counter else area
+            rows[(apartment_id, service.id)] = (money.to_decimal(amount, money.QUANTITY_SCALE),
+                                                apply_rate(amount, service.rate))
+    return rows
+
+
+def batch_charges(apartments, services, consumption):
+    rows = compute_charges(apartments, services, date(2025, 1, 1), set(), consumption, datetime.utcnow())
+    return {(row['apartment_id'], row['service_id']): (row['amount'], row['total']) for row in rows}
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--apartments', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    # Площади и расходы - как их вводят люди и считают счётчики, с "неудобными" дробями
+    apartments = [(i, round(rng.uniform(15, 180), rng.choice((1, 2, 3)))) for i in range(1, args.apartments + 1)]
+    services = [
+        FakeService(1, Decimal('45.5'), True),
+        FakeService(2, Decimal('5.2175'), True),
+        FakeService(3, Decimal('25.3'), False),
+        FakeService(4, Decimal('1800'), False),
+        FakeService(5, Decimal('0.0005'), False),
+    ]
+    consumption = {(apartment_id, service_id): round(rng.uniform(0, 900), 3)
+                   for apartment_id, _ in apartments for service_id in (1, 2)}
+
+    reference, reference_time = timed(reference_charges, apartments, services, consumption)
+    print(f'эталон (Decimal, построчно): {reference_time:.2f} с')
+
+    failed = False
+    numpy_module = money.numpy
+    for label, module in (('NumPy', numpy_module), ('без NumPy', None)):
+        if label == 'NumPy' and module is None:
+            print('NumPy не установлен - пакетный путь с NumPy пропущен')
+            continue
+        money.numpy = module
+        try:
+            result, elapsed = timed(batch_charges, apartments, services, consumption)
+        finally:
+            money.numpy = numpy_module
+        mismatches = [key for key in reference if reference[key] != result.get(key)
+                      or str(reference[key][1]) != str(result[key][1])]
+        failed = failed or bool(mismatches) or len(result) != len(reference)
+        print(f'compute_charges ({label}): {elapsed:.2f} с, строк {len(result)}, расхождений {len(mismatches)}')
+        for key in mismatches[:5]:
+            print('  ', key, reference[key], result.get(key))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Планы и время горячих запросов без индексов схемы и с ними.
+
+Запуск из корня проекта:
+
+    python benchmarks/query_plans.py --apartments 20000 --months 12
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db  # noqa: E402
+
+QUERIES = {
+    'billing: существующие ключи': (
+        'SELECT apartment_id, service_id FROM charge '
+        'WHERE period = :period AND service_id IN (1, 2, 3)'
+    ),
+    'billing: проверка одной пары': (
+        'SELECT id FROM charge '
+        'WHERE apartment_id = :apartment_id AND service_id = 1 AND period = :period LIMIT 1'
+    ),
+    'charges: первая страница': (
+        'SELECT id FROM charge ORDER BY period DESC, id DESC LIMIT 50'
+    ),
+    'payments: фильтр по статусу и дате': (
+        "SELECT id FROM payment WHERE status = 'pending' AND date >= :date_from "
+        'ORDER BY date DESC, id DESC LIMIT 50'
+    ),
+    'payments: итоги за период': (
+        'SELECT status, payment_method, count(id), sum(amount) FROM payment '
+        'WHERE date >= :date_from GROUP BY status, payment_method'
+    ),
+    'apartments: квартиры дома': (
+        'SELECT id, area FROM apartment WHERE building_id = :building_id'
+    ),
+}
+
+
+def fill(connection, apartments, months):
+    buildings = max(1, apartments // 100)
+    connection.execute(text('INSERT INTO building (id, address) VALUES (:id, :address)'),
+                       [{'id': i, 'address': f'ул. Тестовая, д. {i}'} for i in range(1, buildings + 1)])
+    connection.execute(text('INSERT INTO service (id, name, rate) VALUES (:id, :name, 10)'),
+                       [{'id': i, 'name': f'Услуга {i}'} for i in range(1, 6)])
+    connection.execute(
+        text('INSERT INTO apartment (id, number, area, building_id) VALUES (:id, :number, 50, :building_id)'),
+        [{'id': i, 'number': str(i), 'building_id': 1 + i % buildings} for i in range(1, apartments + 1)],
+    )
+
+    charges = []
+    payments = []
+    for month in range(months):
+        period = date(2024 + month // 12, 1 + month % 12, 1)
+        for apartment_id in range(1, apartments + 1):
+            for service_id in range(1, 6):
+                charges.append({'apartment_id': apartment_id, 'service_id': service_id,
+                                'period': period, 'total': 500})
+            payments.append({'apartment_id': apartment_id, 'amount': 2500,
+                             'date': datetime.combine(period, datetime.min.time())
+                             + timedelta(days=random.randint(0, 27)),
+                             'status': random.choice(['completed', 'completed', 'pending']),
+                             'payment_method': random.choice(['bank', 'card', 'cash'])})
+    connection.execute(text('INSERT INTO charge (apartment_id, service_id, period, total) '
+                            'VALUES (:apartment_id, :service_id, :period, :total)'), charges)
+    connection.execute(text('INSERT INTO payment (apartment_id, amount, date, status, payment_method) '
+                            'VALUES (:apartment_id, :amount, :date, :status, :payment_method)'), payments)
+
+
+def measure(connection, params, repeat=20):
+    results = {}
+    for name, sql in QUERIES.items():
+        plan = connection.execute(text('EXPLAIN QUERY PLAN ' + sql), params).fetchall()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            connection.execute(text(sql), params).fetchall()
+        elapsed = (time.perf_counter() - started) / repeat
+        results[name] = (' | '.join(row[-1] for row in plan), elapsed)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--apartments', type=int, default=5000)
+    parser.add_argument('--months', type=int, default=12)
+    args = parser.parse_args()
+
+    engine = create_engine('sqlite://')
+    indexes = [index for table in db.metadata.tables.values() for index in table.indexes]
+
+    with engine.begin() as connection:
+        db.metadata.create_all(connection)
+        # "До": схема без вторичных индексов, как в исходной версии
+        for index in indexes:
+            index.drop(connection)
+        fill(connection, args.apartments, args.months)
+
+        params = {'period': date(2024, 6, 1), 'apartment_id': args.apartments // 2,
+                  'date_from': datetime(2024, 9, 1), 'building_id': 1}
+        before = measure(connection, params)
+
+        for index in indexes:
+            index.create(connection)
+        connection.execute(text('ANALYZE'))
+        after = measure(connection, params)
+
+    for name in QUERIES:
+        plan_before, time_before = before[name]
+        plan_after, time_after = after[name]
+        print(f'\n{name}')
+        print(f'  до:    {time_before * 1000:8.2f} мс  {plan_before}')
+        print(f'  после: {time_after * 1000:8.2f} мс  {plan_after}')
+
+
+if __name__ == '__main__':
+    main()
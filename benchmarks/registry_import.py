@@ -0,0 +1,83 @@
+"""Загрузка реестра платежей банка на синтетических данных.
+
+Запуск из корня проекта (по умолчанию - временный файл SQLite):
+
+    python benchmarks/registry_import.py --lines 50000 --apartments 20000
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'registry.db')
+
+from app import create_app  # noqa: E402
+from database import upgrade_database  # noqa: E402
+from models import db, Building, Apartment, Payment  # noqa: E402
+from registry import import_registry  # noqa: E402
+
+app = create_app()
+
+
+def fill(apartments, per_building=100):
+    buildings = max(1, apartments // per_building)
+    connection = db.session.connection()
+    connection.execute(db.insert(Building), [
+        {'id': i, 'address': f'ул. Тестовая, д. {i}'} for i in range(1, buildings + 1)
+    ])
+    connection.execute(db.insert(Apartment), [
+        {'id': i, 'number': str((i - 1) % per_building + 1), 'building_id': (i - 1) // per_building + 1}
+        for i in range(1, buildings * per_building + 1)
+    ])
+    db.session.commit()
+    return buildings, per_building
+
+
+def registry(lines, buildings, per_building, unmatched, duplicates, encoding):
+    rows = ['Дата;Адрес;Квартира;Сумма;Номер документа;Плательщик']
+    start = datetime(2025, 3, 1)
+    for index in range(lines):
+        building = random.randint(1, buildings)
+        number = random.randint(1, per_building)
+        if random.random() < unmatched:
+            number += per_building
+        reference = index if random.random() >= duplicates else max(0, index - 1)
+        paid_at = start + timedelta(minutes=index)
+        # Адрес пишется иначе, чем в базе: "Тестовая ул, 12"
+        rows.append(f'{paid_at:%d.%m.%Y};Тестовая ул, {building};кв. {number};'
+                    f'{random.randint(500, 9000)},{random.randint(0, 99):02d};DOC-{reference};Иванов И.И.')
+    return io.BytesIO('\n'.join(rows).encode(encoding))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lines', type=int, default=50000)
+    parser.add_argument('--apartments', type=int, default=20000)
+    parser.add_argument('--unmatched', type=float, default=0.02, help='доля строк с неизвестной квартирой')
+    parser.add_argument('--duplicates', type=float, default=0.01, help='доля повторов документа')
+    parser.add_argument('--encoding', default='cp1251')
+    args = parser.parse_args()
+
+    with app.app_context():
+        upgrade_database()
+        buildings, per_building = fill(args.apartments)
+        data = registry(args.lines, buildings, per_building, args.unmatched, args.duplicates, args.encoding)
+
+        report = import_registry(data, 'registry.csv')
+        print(f'первая загрузка: {report.summary()}')
+        print(f'  {args.lines / report.elapsed:.0f} строк/с')
+
+        data.seek(0)
+        report = import_registry(data, 'registry.csv')
+        print(f'повторная загрузка: {report.summary()}')
+        print(f'платежей в базе: {Payment.query.count()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+"""Нагрузочный набор: расчёт, страницы админки, панель и выгрузки на синтетическом городе.
+
+Запуск из корня проекта (по умолчанию - временный файл SQLite):
+
+    python benchmarks/suite.py                       # сравнить с benchmarks/baseline.json
+    python benchmarks/suite.py --save                # записать новые базовые значения
+    python benchmarks/suite.py --buildings 2000 --apartments 100 --months 60 --no-compare
+
+Страницы админки замеряются дважды: name - с кэшем фрагментов (повторный
+просмотр), name_cold - с пустым кэшем, то есть с запросами и отрисовкой списка.
+Для каждого замера печатаются медиана, p95 и число SQL-запросов. Код возврата 1,
+если медиана выросла больше чем в --threshold раз или запросов стало больше.
+Число запросов от размера данных не зависит, поэтому tests/test_benchmarks.py
+сверяет его с базовыми значениями на маленьком городе под pytest.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'suite.db')
+# Фоновые обработчики опрашивают очередь и попали бы в счётчик запросов
+os.environ['JOB_WORKERS'] = '0'
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app  # noqa: E402
+from database import upgrade_database  # noqa: E402
+from models import db, User, Service, Charge  # noqa: E402
+from billing import run_billing  # noqa: E402
+from generator import generate  # noqa: E402
+from stats import dashboard_stats  # noqa: E402
+from fragments import fragment_cache  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Страницы и выгрузки: имя замера -> адрес
+PAGES = {
+    'dashboard': '/admin/dashboard',
+    'buildings': '/admin/buildings',
+    'apartments': '/admin/apartments',
+    'residents': '/admin/residents',
+    'services': '/admin/services',
+    'charges': '/admin/charges',
+    'payments': '/admin/payments',
+    'debtors': '/admin/debtors',
+    'reports': '/admin/reports',
+    'charge_create_form': '/admin/charge/create',
+    'payment_create_form': '/admin/payment/create',
+    'export_charges': '/admin/charges/export',
+    'export_payments': '/admin/payments/export',
+    'api_apartments': '/api/v1/apartments',
+    'api_charges': '/api/v1/charges',
+    'api_payments': '/api/v1/payments',
+}
+
+
+class QueryCounter:
+    """Считает SQL-запросы движка, в том числе при дочитывании потоковых выгрузок.
+
+    Учитываются только запросы потока замера: журнал аудита пишет пакеты из
+    своего потока в случайные моменты.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.thread = threading.get_ident()
+
+    def __call__(self, *args):
+        if threading.get_ident() == self.thread:
+            self.count += 1
+
+
+def _next_month(period):
+    return date(period.year + period.month // 12, period.month % 12 + 1, 1)
+
+
+def prepare(app, params):
+    """Схема, администратор и синтетический город; возвращает (последний период, отчёт генератора)."""
+    with app.app_context():
+        upgrade_database()
+        admin = User(username='admin', email='admin@example.com', is_admin=True, is_active=True)
+        admin.set_password('admin123')
+        db.session.add(admin)
+        db.session.commit()
+        report = generate(params['buildings'], params['apartments'], params['months'], seed=params['seed'],
+                          progress=None)
+        return db.session.scalar(db.select(db.func.max(Charge.period))), report
+
+
+def measure(run, repeat, counter):
+    """Время (мс) и число запросов каждого из repeat запусков после одного прогрева."""
+    run()
+    durations, queries = [], []
+    for _ in range(repeat):
+        counter.count = 0
+        started = time.perf_counter()
+        run()
+        durations.append((time.perf_counter() - started) * 1000)
+        queries.append(counter.count)
+    durations.sort()
+    return {
+        'median': statistics.median(durations),
+        'p95': durations[min(len(durations) - 1, int(0.95 * len(durations)))],
+        'queries': max(queries),
+    }
+
+
+def page(client, url, cold=False):
+    def run():
+        if cold:
+            # Иначе список берётся из кэша фрагментов и регрессии запросов не видны
+            fragment_cache.clear()
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f'{url}: HTTP {response.status_code}')
+        # Выгрузки отдаются потоком - дочитываем до конца
+        response.get_data()
+    return run
+
+
+def cold_dashboard(app, client):
+    run = page(client, PAGES['dashboard'], cold=True)
+
+    def cold():
+        with app.app_context():
+            dashboard_stats.invalidate()
+        run()
+    return cold
+
+
+def billing(app, last_period):
+    # Каждый запуск считает следующий, ещё пустой месяц
+    state = {'period': last_period}
+
+    def run():
+        state['period'] = _next_month(state['period'])
+        with app.app_context():
+            service_ids = list(db.session.scalars(db.select(Service.id).where(Service.is_active.is_(True))))
+            report = run_billing(state['period'], service_ids)
+            db.session.remove()
+        if not report.created:
+            raise RuntimeError(f'{state["period"]}: начисления не созданы')
+    return run
+
+
+def cases(app, last_period, only=None):
+    """Замеры {имя: функция}; клиент входит как администратор из prepare()."""
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+
+    found = {}
+    for name, url in PAGES.items():
+        found[name] = page(client, url)
+        if name == 'dashboard':
+            found['dashboard_cold'] = cold_dashboard(app, client)
+        elif url.startswith('/admin/') and not url.endswith('/export'):
+            found[f'{name}_cold'] = page(client, url, cold=True)
+    found['billing'] = billing(app, last_period)
+    if only:
+        found = {name: run for name, run in found.items() if re.search(only, name)}
+    return found
+
+
+def run_cases(app, cases, repeat, report=None):
+    """Замеряет cases; report(имя, результат) вызывается после каждого замера."""
+    counter = QueryCounter()
+    with app.app_context():
+        event.listen(db.engine, 'after_cursor_execute', counter)
+    results = {}
+    try:
+        for name, run in cases.items():
+            results[name] = measure(run, repeat, counter)
+            if report:
+                report(name, results[name])
+    finally:
+        with app.app_context():
+            event.remove(db.engine, 'after_cursor_execute', counter)
+    return results
+
+
+def load_baseline(path=BASELINE):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if result['median'] > before['median'] * threshold:
+            regressions.append(f'{name}: медиана {before["median"]:.1f} -> {result["median"]:.1f} мс')
+        if result['queries'] > before['queries']:
+            regressions.append(f'{name}: запросов {before["queries"]} -> {result["queries"]}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--buildings', type=int, default=20)
+    parser.add_argument('--apartments', type=int, default=100, help='квартир в доме')
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help='регулярное выражение для имён замеров')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=1.5, help='допустимый рост медианы, раз')
+    parser.add_argument('--save', action='store_true', help='записать результаты как базовые')
+    parser.add_argument('--no-compare', action='store_true')
+    args = parser.parse_args()
+
+    params = {'buildings': args.buildings, 'apartments': args.apartments, 'months': args.months,
+              'seed': args.seed}
+    app = create_app()
+    last_period, generated = prepare(app, params)
+    print('Данные:', generated.summary())
+
+    def report(name, result):
+        print(f'{name:<26}{result["median"]:>14.1f}{result["p95"]:>12.1f}{result["queries"]:>10}')
+
+    print(f'{"замер":<26}{"медиана, мс":>14}{"p95, мс":>12}{"запросов":>10}')
+    results = run_cases(app, cases(app, last_period, args.only), args.repeat, report)
+
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'params': params, 'results': results}, f, ensure_ascii=False, indent=2)
+        print('Базовые значения записаны в', args.baseline)
+        return 0
+    if args.no_compare or not os.path.exists(args.baseline):
+        return 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline.get('params') != params:
+        print('Базовые значения сняты на других размерах данных:', baseline.get('params'))
+        return 0
+    regressions = compare(results, baseline['results'], args.threshold)
+    for line in regressions:
+        print('Регрессия:', line)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+import multiprocessing
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+from models import db, Apartment, Service, Charge, insert_ignore
+from archive import check_not_archived
+from money import QUANTITY_SCALE, RATE_SCALE, apply_rates, from_units, to_units
+from stats import dashboard_stats
+from readings import consumption_for
+from reports import refresh_charges
+from ledger import post_charges
+from statements import snapshot_statements
+from tariffs import TariffResolver
+
+# Сколько строк начислений вставляется за один пакет
+BATCH_SIZE = 5000
+
+# С какого числа квартир расчёт идёт в пуле процессов
+PARALLEL_MIN_APARTMENTS = 20000
+
+# Процессы пула не форкаются из веб-процесса: в нём работают потоки запросов,
+# задач и журнала, и копия их блокировок в дочернем процессе может зависнуть
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+class BillingReport:
+    """Итоги расчёта: количество строк, время по фазам, дома и обработчики пула."""
+
+    def __init__(self, period):
+        self.period = period
+        self.created = 0
+        self.skipped = 0
+        self.timings = {}
+        self.buildings_done = 0
+        self.buildings_skipped = 0
+        self.saved_buildings = []  # Дома, начисления которых уже записаны (COMMIT)
+        self.failed = []  # (building_id, ошибка)
+        self.workers = {}  # обработчик -> [строк, секунд расчёта]
+
+    def add_worker(self, worker, rows, seconds):
+        totals = self.workers.setdefault(worker, [0, 0.0])
+        totals[0] += rows
+        totals[1] += seconds
+
+    @property
+    def elapsed(self):
+        return sum(self.timings.values())
+
+    @property
+    def rows_per_sec(self):
+        if not self.elapsed:
+            return 0.0
+        return self.created / self.elapsed
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
+    def worker_lines(self):
+        return [f'{worker}: {rows} строк за {seconds:.2f} с ({rows / seconds if seconds else 0:.0f} строк/с)'
+                for worker, (rows, seconds) in sorted(self.workers.items())]
+
+    def summary(self):
+        phases = ', '.join(f'{name} {seconds:.2f} с' for name, seconds in self.timings.items())
+        text = (f'создано {self.created}, пропущено {self.skipped} за {self.elapsed:.2f} с '
+                f'({self.rows_per_sec:.0f} строк/с; {phases}); домов рассчитано {self.buildings_done}, '
+                f'уже рассчитаны {self.buildings_skipped}')
+        if self.failed:
+            text += f', с ошибкой {len(self.failed)}'
+        return text
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def compute_charges(apartments, services, period, existing, consumption, created_at):
+    """Строки начислений для пакета квартир; пары из existing пропускаются.
+
+    consumption - расход по счетчикам {(apartment_id, service_id): объем}.
+    Суммы по каждой услуге считаются сразу для всего пакета (money.apply_rates).
+    """
+    areas = dict(apartments)
+    totals = {}
+    for service in services:
+        pending = [apartment_id for apartment_id, _ in apartments if (apartment_id, service.id) not in existing]
+        if service.is_counter:
+            # Для услуг по счетчику: тариф * расход по показаниям
+            amounts = [to_units(consumption.get((apartment_id, service.id), 0), QUANTITY_SCALE)
+                       for apartment_id in pending]
+        else:
+            # Для услуг по нормативу: тариф * площадь
+            amounts = [to_units(areas[apartment_id] or 0, QUANTITY_SCALE) for apartment_id in pending]
+        charged = apply_rates(amounts, to_units(service.rate or 0, RATE_SCALE))
+        for apartment_id, amount, total in zip(pending, amounts, charged):
+            totals[(apartment_id, service.id)] = (amount, total)
+
+    # Порядок строк прежний - квартира за квартирой: от него зависит разнесение оплат
+    rows = []
+    for apartment_id, _ in apartments:
+        for service in services:
+            computed = totals.get((apartment_id, service.id))
+            if computed is None:
+                continue
+            rows.append({
+                'apartment_id': apartment_id,
+                'service_id': service.id,
+                'period': period,
+                'amount': from_units(computed[0], QUANTITY_SCALE),
+                'total': from_units(computed[1]),
+                'is_paid': False,
+                'created_at': created_at,
+            })
+    return rows
+
+
+class ServiceRate(namedtuple('ServiceRate', 'id rate is_counter')):
+    """Услуга с тарифом дома на период; ORM-объекты в процессы пула не передаются."""
+
+
+def _compute_building(task):
+    """Расчёт одного дома в процессе пула: (building_id, строки, обработчик, секунд, ошибка)."""
+    building_id, apartments, services, period, existing, consumption, created_at = task
+    started = time.perf_counter()
+    try:
+        rows = compute_charges(apartments, services, period, existing, consumption, created_at)
+    except Exception as e:
+        return building_id, None, None, 0.0, str(e)
+    return building_id, rows, f'pid {os.getpid()}', time.perf_counter() - started, None
+
+
+def _pool_size(processes, apartments_count):
+    if processes is None:
+        processes = os.cpu_count() or 1
+    # На небольшом фонде запуск процессов дороже самого расчёта
+    if processes <= 1 or apartments_count < PARALLEL_MIN_APARTMENTS:
+        return 0
+    return processes
+
+
+def run_billing(period, service_ids, building_id=None, batch_size=BATCH_SIZE, progress=None, processes=None,
+                report=None):
+    """Создает начисления за период по домам и возвращает BillingReport.
+
+    Суммы считаются в пуле из processes процессов (None - по числу ядер), каждый
+    дом вставляется и проводится по сальдо в своей короткой транзакции. Ошибка
+    в доме откатывает только его; дома, где все начисления уже есть, пропускаются,
+    так что повторный запуск продолжает прерванный расчёт.
+
+    progress(сделано, всего, сообщение) вызывается перед каждым домом;
+    исключение из него (отмена задачи) откатывает текущий дом, готовые остаются.
+    report - BillingReport, который заполняется по ходу: так вызывающий видит
+    записанные дома и тогда, когда расчёт прерван исключением.
+    Период в архиве (archive.py) - ArchiveError.
+    """
+    if report is None:
+        report = BillingReport(period)
+
+    with report.phase('load'):
+        check_not_archived(period)
+        services = db.session.query(Service.id, Service.is_counter, Service.rate) \
+            .filter(Service.id.in_(service_ids)).order_by(Service.id).all()
+        service_ids = [service.id for service in services]
+        # Все тарифы расчёта - одним запросом, дальше поиск по интервалам в памяти
+        tariffs = TariffResolver.load(service_ids, {service.id: service.rate for service in services})
+
+        apartments_query = db.session.query(Apartment.building_id, Apartment.id, Apartment.area)
+        existing_query = db.session.query(Charge.apartment_id, Charge.service_id).filter(
+            Charge.period == period,
+            Charge.service_id.in_(service_ids),
+        )
+        if building_id:
+            apartments_query = apartments_query.filter(Apartment.building_id == building_id)
+            existing_query = existing_query.join(Apartment).filter(Apartment.building_id == building_id)
+
+        buildings = {}
+        for apartment_building_id, apartment_id, area in apartments_query.order_by(Apartment.building_id,
+                                                                                    Apartment.id):
+            buildings.setdefault(apartment_building_id, []).append((apartment_id, area))
+        existing = set(existing_query.all())
+        consumption = consumption_for(period, [service.id for service in services if service.is_counter],
+                                      building_id)
+    # Сессия не должна держать транзакцию, пока считается пул
+    db.session.commit()
+
+    total = sum(len(apartments) for apartments in buildings.values())
+    tasks = []
+    for apartment_building_id, apartments in buildings.items():
+        pairs = [(apartment_id, service.id) for apartment_id, _ in apartments for service in services]
+        done_pairs = sum(1 for pair in pairs if pair in existing)
+        report.skipped += done_pairs
+        if done_pairs == len(pairs):
+            # Дом рассчитан прошлым запуском
+            report.buildings_skipped += 1
+            continue
+        rates = [ServiceRate(service.id, tariffs.rate(service.id, apartment_building_id, period),
+                             service.is_counter) for service in services]
+        tasks.append((
+            apartment_building_id, apartments, rates, period,
+            {pair for pair in pairs if pair in existing},
+            {pair: value for pair in pairs if (value := consumption.get(pair)) is not None},
+            datetime.utcnow(),
+        ))
+
+    pool_size = _pool_size(processes, sum(len(task[1]) for task in tasks))
+    executor = ProcessPoolExecutor(max_workers=pool_size, mp_context=multiprocessing.get_context(POOL_START_METHOD)) \
+        if pool_size else None
+    done = total - sum(len(task[1]) for task in tasks)
+    try:
+        results = _computed(tasks, executor, pool_size * 2)
+        for index, task in enumerate(tasks):
+            if progress:
+                progress(done, total, f'Дом {index + 1} из {len(tasks)}, квартир рассчитано: {done} из {total}')
+            with report.phase('compute'):
+                # Пока вставлялся предыдущий дом, пул считал следующие
+                building, rows, worker, seconds, error = next(results)
+            done += len(task[1])
+            if error:
+                report.failed.append((building, error))
+                continue
+            report.add_worker(worker, len(rows), seconds)
+            _save_building(report, period, building, rows, batch_size)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if report.created:
+            dashboard_stats.invalidate()
+
+    if progress:
+        progress(total, total, f'Рассчитано домов: {report.buildings_done}')
+    return report
+
+
+def _computed(tasks, executor, window):
+    """Итоги расчёта домов по порядку; в пуле одновременно не больше window домов."""
+    if executor is None:
+        yield from map(_compute_building, tasks)
+        return
+    pending = deque()
+    for task in tasks:
+        pending.append(executor.submit(_compute_building, task))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _save_building(report, period, building_id, rows, batch_size):
+    """Вставляет начисления дома, проводит их по агрегатам и сальдо и пишет квитанции одной транзакцией."""
+    statement = insert_ignore(Charge)
+    created = 0
+    try:
+        connection = db.session.connection()
+        for batch in _batches(rows, batch_size):
+            with report.phase('insert'):
+                result = connection.execute(statement, batch)
+            # Уникальный индекс отсекает строки, вставленные параллельным расчётом
+            inserted = result.rowcount if result.rowcount >= 0 else len(batch)
+            created += inserted
+            report.skipped += len(batch) - inserted
+
+        # Пакетная вставка идёт в обход событий ORM - пересчитываем агрегаты дома
+        if created:
+            with report.phase('aggregates'):
+                refresh_charges(period, building_id)
+            with report.phase('ledger'):
+                post_charges(period, building_id)
+            # Квитанции жильцов - вместе с начислениями, чтобы кабинет не считал их на лету
+            with report.phase('statements'):
+                snapshot_statements(period, building_id)
+        with report.phase('commit'):
+            db.session.commit()
+    except Exception as e:
+        # Ошибка откатывает только этот дом, расчёт идёт дальше
+        db.session.rollback()
+        report.failed.append((building_id, str(e)))
+        return
+    report.created += created
+    report.buildings_done += 1
+    report.saved_buildings.append(building_id)
@@ -0,0 +1,102 @@
+import time
+from datetime import datetime
+
+import click
+
+from archive import ArchiveError, archive_until
+from generator import generate
+from jobs import runner
+from models import db
+from search import rebuild_search_index
+from seed import create_admin, seed_demo
+from statements import snapshot_statements
+
+
+def register_commands(app):
+    """Команды flask ... для обслуживания базы."""
+
+    @app.cli.command('seed')
+    def seed_command():
+        """Создает тестовый дом, квартиры, жильца и услуги, если домов в базе нет."""
+        created = seed_demo()
+        if created:
+            click.echo('Создано: ' + ', '.join(created))
+        else:
+            click.echo('В базе уже есть дома, тестовые данные не добавлены')
+
+    @app.cli.command('create-admin')
+    @click.option('--username', default='admin', show_default=True)
+    @click.option('--email', default=None, help='По умолчанию <логин>@localhost')
+    @click.password_option(help='Пароль; если не указан, будет запрошен')
+    def create_admin_command(username, email, password):
+        """Создает администратора или сбрасывает пароль существующему пользователю."""
+        user, created = create_admin(username, email, password)
+        click.echo(f'Администратор {user.username} ' + ('создан' if created else 'обновлен'))
+
+    @app.cli.command('generate')
+    @click.option('--buildings', default=50, show_default=True, help='Сколько домов создать')
+    @click.option('--apartments', 'apartments_per_building', default=100, show_default=True,
+                  help='Квартир в каждом доме')
+    @click.option('--months', default=12, show_default=True, help='За сколько месяцев создать начисления и платежи')
+    @click.option('--start', default=None, help='Первый месяц истории, ММ.ГГГГ')
+    @click.option('--residents', 'residents_per_apartment', default=1, show_default=True,
+                  help='Жильцов в каждой квартире')
+    @click.option('--seed', default=42, show_default=True, help='Зерно генератора случайных чисел')
+    def generate_command(buildings, apartments_per_building, months, start, residents_per_apartment, seed):
+        """Заполняет базу синтетическими данными для нагрузочных замеров."""
+        if start:
+            try:
+                start = datetime.strptime(start, '%m.%Y').date()
+            except ValueError:
+                raise click.BadParameter('ожидается месяц в формате ММ.ГГГГ', param_hint='--start')
+        report = generate(buildings, apartments_per_building, months, start,
+                          residents_per_apartment, seed, progress=click.echo)
+        click.echo(f'Готово: {report.summary()}')
+
+    @app.cli.command('reindex-search')
+    def reindex_search_command():
+        """Заново строит индекс поиска квартир и жильцов (обычно его ведут триггеры)."""
+        started = time.perf_counter()
+        rebuild_search_index()
+        db.session.commit()
+        click.echo(f'Индекс поиска перестроен за {time.perf_counter() - started:.1f} с')
+
+    @app.cli.command('statements')
+    @click.argument('period')
+    @click.option('--building', 'building_id', type=int, default=None, help='Только для дома с этим id')
+    def statements_command(period, building_id):
+        """Заново записывает квитанции жильцов за месяц ММ.ГГГГ (например, после загрузки оплат)."""
+        try:
+            period = datetime.strptime(period, '%m.%Y').date()
+        except ValueError:
+            raise click.BadParameter('ожидается месяц в формате ММ.ГГГГ', param_hint='PERIOD')
+        count = snapshot_statements(period, building_id)
+        db.session.commit()
+        click.echo(f'Записано квитанций: {count}')
+
+    @app.cli.command('archive')
+    @click.argument('year', type=int)
+    def archive_command(year):
+        """Переносит начисления и платежи по YEAR включительно в архивные таблицы по годам."""
+        started = time.perf_counter()
+        try:
+            archived = archive_until(year, progress=click.echo)
+        except ArchiveError as e:
+            raise click.ClickException(str(e))
+        for summary in archived:
+            click.echo(f'{summary.year}: в архиве начислений {summary.charges_count} на {summary.charges_total}, '
+                       f'платежей {summary.payments_count} на {summary.payments_total}')
+        click.echo(f'Готово за {time.perf_counter() - started:.1f} с')
+
+    @app.cli.command('worker')
+    @click.option('--threads', default=2, show_default=True, help='Сколько задач выполнять одновременно')
+    def worker_command(threads):
+        """Выполняет фоновые задачи из очереди, пока не прервут (Ctrl+C)."""
+        runner.start(app, threads)
+        click.echo(f'Обработчик задач запущен, потоков: {threads}')
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            runner.stop()
+            click.echo('Обработчик остановлен; прерванные задачи будут помечены ошибкой через JOB_STALE_AFTER')
@@ -0,0 +1,72 @@
+import os
+
+
+def database_url():
+    url = os.environ.get('DATABASE_URL', 'sqlite:///zhkh.db')
+    # Heroku и некоторые хостинги отдают устаревшую схему postgres://
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url):
+    if url in ('sqlite://', 'sqlite:///:memory:'):
+        return {}
+    if url.startswith('sqlite'):
+        # Один писатель на файл: пул небольшой, ждём блокировку, а не падаем
+        return {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': 30,
+            'connect_args': {'timeout': 30},
+        }
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': 30,
+        'pool_recycle': 1800,
+        'pool_pre_ping': True,
+    }
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Настройки соединения SQLite (применяются к каждому новому соединению)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 30000,
+        'cache_size': -64000,  # 64 МБ
+        'mmap_size': 268435456,  # 256 МБ
+        'temp_store': 'MEMORY',
+    }
+
+    ADMIN_PAGE_SIZE = 50  # Строк на странице списков
+
+    # Кэш пользователей для Flask-Login: время жизни записи (с) и размер
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 60))
+    USER_CACHE_SIZE = 1024
+
+    # Кэш отрисованных фрагментов страниц: сколько хранить (0 - выключен)
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 256))
+
+    # Замеры SQL и шаблонов по запросам: заголовок Server-Timing и /admin/diagnostics
+    INSTRUMENTATION = os.environ.get('INSTRUMENTATION', '1') != '0'
+
+    # Фоновые задачи: обработчиков в потоках веб-процесса (0 - только отдельный `flask worker`)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+    JOB_POLL_INTERVAL = 2.0  # Как часто свободный обработчик проверяет очередь, с
+    JOB_STALE_AFTER = 600  # Через сколько секунд без отметок прогресса задача считается брошенной
+    JOB_UPLOAD_DIR = os.environ.get('JOB_UPLOAD_DIR')  # Куда сохранять файлы для задач; по умолчанию instance/uploads
+
+    # Журнал изменений: записей в одном INSERT, сколько секунд запись ждёт пакета, размер буфера
+    AUDIT_BATCH_SIZE = 500
+    AUDIT_FLUSH_INTERVAL = 1.0
+    AUDIT_BUFFER_SIZE = 10000
+
+    # Процессов для расчёта начислений (по умолчанию - по числу ядер; 1 - без пула)
+    BILLING_PROCESSES = int(os.environ['BILLING_PROCESSES']) if os.environ.get('BILLING_PROCESSES') else None
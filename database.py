@@ -0,0 +1,42 @@
+from flask_migrate import stamp, upgrade
+from sqlalchemy import event, inspect
+
+from models import db, SUPPORTED_DIALECTS
+
+
+def _apply_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+    return on_connect
+
+
+def configure_database(app):
+    """Подключает к движку приложения настройки соединений из конфигурации.
+
+    СУБД без INSERT ... ON CONFLICT (агрегаты, версии таблиц, квитанции) отклоняется здесь,
+    а не первой записью.
+    """
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name not in SUPPORTED_DIALECTS:
+        raise RuntimeError(f'СУБД {engine.dialect.name} не поддерживается, нужна одна из: '
+                           f'{", ".join(SUPPORTED_DIALECTS)}')
+    if engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', _apply_pragmas(app.config.get('SQLITE_PRAGMAS', {})))
+
+
+def upgrade_database():
+    """Приводит схему к последней миграции (то же, что flask db upgrade).
+
+    База, созданная через db.create_all() до появления миграций, сначала
+    отмечается ревизией 0001, чтобы её таблицы не создавались повторно.
+    """
+    tables = inspect(db.engine).get_table_names()
+    if 'building' in tables and 'alembic_version' not in tables:
+        stamp(revision='0001')
+    upgrade()
@@ -0,0 +1,132 @@
+import csv
+import io
+import os
+import tempfile
+
+from flask import Response, abort, send_file, stream_with_context
+from openpyxl import Workbook
+from sqlalchemy import select
+
+from models import db, Apartment, Building, Service, Charge, Payment
+from archive import archived_years, with_archives, years_between
+
+# Строк, выбираемых из курсора за раз
+YIELD_PER = 2000
+
+# Строк CSV в одном фрагменте ответа
+CHUNK_ROWS = 500
+
+# Форматы, в которых отдаются выгрузки (?format=)
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+CHARGE_COLUMNS = ['ID', 'Период', 'Дом', 'Квартира', 'Услуга', 'Объем', 'Ед.', 'Сумма', 'Оплачено']
+PAYMENT_COLUMNS = ['ID', 'Дата', 'Дом', 'Квартира', 'Сумма', 'Статус', 'Способ оплаты', 'Описание']
+
+
+def charges_select(period=None, building_id=None):
+    """Выгрузка начислений; периоды в архиве берутся из архивных таблиц."""
+    statement = (
+        select(Charge.id, Charge.period, Building.address, Apartment.number, Service.name,
+               Charge.amount, Service.unit, Charge.total, Charge.is_paid)
+        .join(Apartment, Charge.apartment_id == Apartment.id)
+        .join(Building, Apartment.building_id == Building.id)
+        .join(Service, Charge.service_id == Service.id)
+    )
+    if period:
+        statement = statement.where(Charge.period == period)
+    if building_id:
+        statement = statement.where(Apartment.building_id == building_id)
+    years = years_between(period, period) if period else archived_years()
+    return with_archives(statement, Charge, years, ['period', 'id'])
+
+
+def payments_select(query, date_from=None, date_to=None):
+    """Колонки выгрузки для запроса платежей с фильтрами admin.payments.
+
+    Архивные годы между date_from и date_to (любая граница может отсутствовать)
+    добавляются к выгрузке с теми же фильтрами.
+    """
+    statement = (
+        query.with_entities(Payment.id, Payment.date, Building.address, Apartment.number,
+                            Payment.amount, Payment.status, Payment.payment_method, Payment.description)
+        .join(Apartment, Payment.apartment_id == Apartment.id)
+        .join(Building, Apartment.building_id == Building.id)
+        .statement
+    )
+    return with_archives(statement, Payment, years_between(date_from, date_to), ['date', 'id'])
+
+
+def _stream_rows(statement):
+    # Курсор читается порциями, в памяти не больше YIELD_PER строк
+    result = db.session.execute(statement.execution_options(stream_results=True, yield_per=YIELD_PER))
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def _csv_chunks(header, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    # BOM, чтобы Excel открыл файл в UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(header)
+    # Заголовок уходит клиенту сразу, до первой строки из базы
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    for index, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if index % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _xlsx_file(header, rows):
+    """Книга XLSX в безымянном временном файле, открытом на чтение с начала.
+
+    XLSX - zip-архив с оглавлением в конце, поэтому потоком его не отдать: книга
+    собирается целиком до ответа. В режиме write_only в памяти держится только
+    текущая строка, остальное пишется на диск; файл исчезает, когда сервер его закроет.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(header)
+    for row in rows:
+        sheet.append(list(row))
+
+    f = tempfile.TemporaryFile(suffix='.xlsx')
+    try:
+        workbook.save(f)
+    except Exception:
+        f.close()
+        raise
+    f.seek(0)
+    return f
+
+
+def export_format(args):
+    """Формат выгрузки из ?format= (по умолчанию csv); неизвестный формат - 400."""
+    fmt = args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400, f'Неизвестный формат выгрузки: {fmt[:20]}')
+    return fmt
+
+
+def export_response(statement, header, filename, fmt='csv'):
+    """Ответ с выгрузкой строк statement: CSV отдаётся потоком, XLSX - готовым файлом."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Неизвестный формат выгрузки: {fmt}')
+    rows = _stream_rows(statement)
+    if fmt == 'xlsx':
+        f = _xlsx_file(header, rows)
+        response = send_file(f, as_attachment=True, download_name=f'{filename}.xlsx',
+                             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        response.content_length = os.fstat(f.fileno()).st_size
+        return response
+
+    response = Response(stream_with_context(_csv_chunks(header, rows)), mimetype='text/csv; charset=utf-8')
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{fmt}'
+    return response
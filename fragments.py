@@ -0,0 +1,309 @@
+"""Кэш отрисованных фрагментов страниц и условные GET по версиям таблиц.
+
+Каждая запись в таблицу (через ORM или Core в сессии) увеличивает её счётчик
+в TableVersion сразу после COMMIT, отдельной короткой транзакцией: строки
+версий не блокируются на время транзакции писателя, и писатели разных таблиц
+не ждут друг друга. Читатель, успевший между COMMIT и увеличением версии,
+кладёт свежие данные под старый ключ - это безвредно, ключ больше не спросят.
+Фрагмент хранится под ключом из версий таблиц, от которых он зависит,
+и перестаёт находиться сам, когда они меняются.
+"""
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+
+from flask import g, has_app_context, make_response, request, session
+from flask_login import current_user
+from markupsafe import Markup
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from models import db, TableVersion, dialect_insert
+
+logger = logging.getLogger(__name__)
+
+# Записи в эти таблицы на страницы не влияют
+IGNORED_TABLES = frozenset(('table_version', 'job', 'audit_log', 'alembic_version'))
+
+# Сколько фрагментов хранится одновременно
+FRAGMENT_CACHE_SIZE = 256
+
+# Ключ conn.info: таблицы, изменённые в текущей транзакции соединения
+_CHANGED = 'changed_tables'
+
+
+# --- Версии таблиц ---
+
+@event.listens_for(Engine, 'after_execute')
+def _track_writes(conn, clauseelement, multiparams, params, execution_options, result):
+    if not isinstance(clauseelement, UpdateBase):
+        return
+    table = getattr(clauseelement, 'table', None)
+    name = getattr(table, 'name', None)
+    if name is None or name in IGNORED_TABLES:
+        return
+    # INSERT ... ON CONFLICT DO NOTHING без вставленных строк данных не менял
+    if result.rowcount == 0:
+        return
+    conn.info.setdefault(_CHANGED, set()).add(name)
+
+
+@event.listens_for(Engine, 'commit')
+def _forget_committed(conn):
+    conn.info.pop(_CHANGED, None)
+
+
+@event.listens_for(Engine, 'rollback')
+def _forget_rolled_back(conn):
+    conn.info.pop(_CHANGED, None)
+
+
+def _bump(connection, tables):
+    now = datetime.utcnow()
+    rows = [{'name': name, 'version': 1, 'updated_at': now} for name in sorted(tables)]
+    statement = dialect_insert(TableVersion, connection)
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=['name'],
+        set_={'version': TableVersion.version + 1, 'updated_at': statement.excluded.updated_at},
+    ), rows)
+
+
+def _collect_changed(session):
+    # Таблицы, изменённые в транзакции сессии, ждут её COMMIT в session.info
+    if not session.in_transaction():
+        return
+    tables = session.connection().info.pop(_CHANGED, None)
+    if tables:
+        session.info.setdefault(_CHANGED, set()).update(tables)
+
+
+# Запись ORM попадает в базу при flush, пакетная запись Core - сразу;
+# before_commit срабатывает до последнего flush, поэтому нужны оба события
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed(session, flush_context):
+    _collect_changed(session)
+
+
+@event.listens_for(Session, 'before_commit')
+def _collect_before_commit(session):
+    _collect_changed(session)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed(session):
+    session.info.pop(_CHANGED, None)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed(session):
+    tables = session.info.pop(_CHANGED, None)
+    if not tables:
+        return
+    engine = session.get_bind()
+    try:
+        with engine.begin() as connection:
+            _bump(connection, tables)
+    except OperationalError:
+        # Данные уже записаны; без новой версии кэш этого процесса сбрасывается целиком
+        logger.warning('Версии таблиц %s не увеличены', ', '.join(sorted(tables)), exc_info=True)
+        fragment_cache.clear()
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_versions(session):
+    # Версии, прочитанные до COMMIT, устарели для остальной части запроса
+    if has_app_context():
+        g.pop('table_versions', None)
+
+
+def table_versions():
+    """Версии всех таблиц {имя: (версия, изменена)}; читаются один раз за запрос."""
+    if 'table_versions' not in g:
+        rows = db.session.execute(select(TableVersion.name, TableVersion.version, TableVersion.updated_at))
+        g.table_versions = {name: (version, updated_at) for name, version, updated_at in rows}
+    return g.table_versions
+
+
+def versions_of(tables):
+    if not tables:
+        return ()
+    versions = table_versions()
+    return tuple(versions.get(name, (0, None))[0] for name in tables)
+
+
+def last_modified(tables):
+    versions = table_versions()
+    stamps = [versions[name][1] for name in tables if name in versions and versions[name][1]]
+    return max(stamps).replace(microsecond=0) if stamps else None
+
+
+# --- Кэш фрагментов ---
+
+class FragmentCache:
+    """LRU-кэш отрисованных фрагментов по ключу (имя, вариант, версии таблиц)."""
+
+    def __init__(self, maxsize=FRAGMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, maxsize=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            self._entries.clear()
+
+    def get(self, key):
+        with self._lock:
+            html = self._entries.get(key)
+            if html is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return html
+
+    def set(self, key, html):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = html
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries),
+                    'hit_rate': self.hit_rate}
+
+
+fragment_cache = FragmentCache()
+
+
+def cache_fragment(name, *tables, vary=None, caller=None):
+    """Глобальная функция шаблонов: {% call cache_fragment('buildings', 'building') %}...{% endcall %}.
+
+    Тело вызова отрисовывается, только если фрагмента с такими версиями таблиц
+    ещё нет в кэше. vary - чем различаются варианты фрагмента (по умолчанию
+    строка запроса: фильтры и курсоры страниц).
+    """
+    if vary is None:
+        vary = request.query_string.decode()
+    key = (name, vary, tables, versions_of(tables))
+    html = fragment_cache.get(key)
+    if html is None:
+        html = str(caller())
+        fragment_cache.set(key, html)
+    return Markup(html)
+
+
+class Lazy:
+    """Значение для шаблона, которое вычисляется при первом обращении.
+
+    Представление передаёт Lazy(lambda: запрос) - если фрагмент найден в кэше,
+    запрос к базе так и не выполняется.
+    """
+
+    def __init__(self, function):
+        self._function = function
+        self._loaded = False
+        self._value = None
+
+    def _load(self):
+        if not self._loaded:
+            self._value = self._function()
+            self._loaded = True
+        return self._value
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._load(), name)
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __bool__(self):
+        return bool(self._load())
+
+    def __str__(self):
+        return str(self._load())
+
+    def __float__(self):
+        return float(self._load())
+
+
+# --- Условные GET ---
+
+def conditional_response(tables, render):
+    """Ответ с ETag и Last-Modified по версиям tables, адресу запроса и пользователю.
+
+    Совпавший запрос получает 304 без вызова render - функции, которая строит
+    ответ (запросы к базе и отрисовка).
+    """
+    raw = repr((request.endpoint, request.full_path, current_user.get_id(), versions_of(tables)))
+    etag = hashlib.sha1(raw.encode()).hexdigest()
+    modified = last_modified(tables)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = bool(modified and since and modified <= since.replace(tzinfo=None))
+
+    if not_modified:
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    if modified:
+        response.last_modified = modified
+    # Браузер хранит ответ, но каждый раз сверяется с сервером
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def conditional_page(*tables):
+    """Условный GET по версиям tables (conditional_response) для представления.
+
+    Страница с непоказанными сообщениями flash всегда отрисовывается заново.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+            return conditional_response(tables, lambda: view(*args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def init_fragments(app):
+    fragment_cache.configure(maxsize=app.config.get('FRAGMENT_CACHE_SIZE', FRAGMENT_CACHE_SIZE))
+    app.jinja_env.globals['cache_fragment'] = cache_fragment
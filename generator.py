@@ -0,0 +1,245 @@
+"""Генератор синтетических данных «города» для нагрузочных замеров.
+
+Дома, квартиры и жильцы вставляются пакетами. Начисления считает тот же
+billing.compute_charges, что и расчёт, с тарифами домов из TariffResolver, и
+квитанции пишет snapshot_statements по каждому дому - замеры идут на тех же
+данных, что даёт настоящий расчёт. Платежи за месяц - одним INSERT ... SELECT.
+"""
+import random
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import BigInteger, case, func, insert, literal, select, type_coerce
+
+from models import db, Building, Apartment, Resident, Service, Charge, Payment
+from billing import ServiceRate, compute_charges
+from stats import dashboard_stats
+from reports import rebuild_balances
+from ledger import rebuild_ledger
+from statements import snapshot_statements
+from tariffs import TariffResolver, set_tariff
+
+# Сколько строк вставляется одним INSERT при пакетной вставке
+BATCH_SIZE = 10000
+
+# У каждого такого по счёту нового дома - свой тариф первой услуги по нормативу (+10%)
+BUILDING_TARIFF_EVERY = 10
+
+STREETS = ('Ленина', 'Мира', 'Садовая', 'Советская', 'Молодежная', 'Школьная', 'Лесная',
+           'Центральная', 'Новая', 'Заречная', 'Набережная', 'Гагарина', 'Пушкина', 'Победы')
+
+DEFAULT_SERVICES = (
+    {'name': 'Холодное водоснабжение', 'unit': 'м³', 'rate': Decimal('45.50'), 'is_counter': True},
+    {'name': 'Электроэнергия', 'unit': 'кВт·ч', 'rate': Decimal('5.20'), 'is_counter': True},
+    {'name': 'Содержание жилья', 'unit': 'м²', 'rate': Decimal('25.30'), 'is_counter': False},
+    {'name': 'Отопление', 'unit': 'Гкал', 'rate': Decimal('1800.00'), 'is_counter': False},
+    {'name': 'Вывоз ТБО', 'unit': 'чел.', 'rate': Decimal('120.00'), 'is_counter': False},
+)
+
+
+class GeneratorReport:
+    """Сколько строк создано и сколько это заняло."""
+
+    def __init__(self):
+        self.rows = {}
+        self.timings = {}
+
+    def add(self, table, count, seconds):
+        # count=None - таблица пересчитывается целиком, важно только время
+        if count is not None:
+            self.rows[table] = self.rows.get(table, 0) + count
+        self.timings[table] = self.timings.get(table, 0.0) + seconds
+
+    def summary(self):
+        return ', '.join(f'{table}: {self.rows[table]} за {seconds:.1f} с' if table in self.rows
+                         else f'{table}: {seconds:.1f} с' for table, seconds in self.timings.items())
+
+
+def _insert_batches(model, rows, batch_size=BATCH_SIZE):
+    connection = db.session.connection()
+    batch = []
+    count = 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            connection.execute(insert(model), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        connection.execute(insert(model), batch)
+        count += len(batch)
+    return count
+
+
+def _months(start, count):
+    for index in range(count):
+        yield date(start.year + (start.month - 1 + index) // 12, (start.month - 1 + index) % 12 + 1, 1)
+
+
+def _services():
+    services = Service.query.filter(Service.is_active.is_(True)).all()
+    if not services:
+        for data in DEFAULT_SERVICES:
+            db.session.add(Service(is_active=True, **data))
+        db.session.flush()
+        services = Service.query.filter(Service.is_active.is_(True)).all()
+    return services
+
+
+def _buildings(count, rng, first_id):
+    for index in range(count):
+        yield {
+            'id': first_id + index,
+            'address': f'ул. {STREETS[index % len(STREETS)]}, д. {index // len(STREETS) + 1}',
+            'floors': rng.choice((5, 9, 12, 16)),
+            'apartments_count': 0,
+            'year_built': rng.randint(1960, 2022),
+            'created_at': datetime.utcnow(),
+        }
+
+
+def _apartments(building_ids, per_building, rng, first_id):
+    apartment_id = first_id
+    for building_id in building_ids:
+        for number in range(1, per_building + 1):
+            rooms = rng.randint(1, 4)
+            yield {
+                'id': apartment_id,
+                'number': str(number),
+                'area': round(18 + rooms * rng.uniform(12, 20), 1),
+                'rooms': rooms,
+                'floor': (number - 1) // 4 + 1,
+                'building_id': building_id,
+            }
+            apartment_id += 1
+
+
+def _building_tariffs(services, building_ids, start):
+    """Тарифы отдельных домов, чтобы расчёт шёл и по ним, а не только по общим."""
+    service = next((service for service in services if not service.is_counter and service.rate), None)
+    if service is None:
+        return
+    for building_id in building_ids[::BUILDING_TARIFF_EVERY]:
+        set_tariff(service, service.rate * Decimal('1.1'), start, building_id)
+
+
+def _charge_rows(period, buildings, services, tariffs, created_at):
+    """Начисления за месяц через billing.compute_charges: тариф дома на период, счётчики - псевдослучайный расход."""
+    month_seed = period.year * 12 + period.month
+    counters = [service.id for service in services if service.is_counter]
+    for building_id, apartments in buildings.items():
+        rates = [ServiceRate(service.id, tariffs.rate(service.id, building_id, period), service.is_counter)
+                 for service in services]
+        # Детерминированный "расход" 3..17 единиц без выборки показаний
+        consumption = {(apartment_id, service_id): (apartment_id * 7919 + month_seed * 31 + service_id) % 15 + 3
+                       for apartment_id, _ in apartments for service_id in counters}
+        yield from compute_charges(apartments, rates, period, set(), consumption, created_at)
+
+
+def _payments_for(period, apartment_filter, created_at):
+    """Платежи за месяц по сумме начислений: ~10% квартир не платят, ~10% платят половину."""
+    # Сумма - в копейках, как она лежит в базе
+    totals = select(Charge.apartment_id, type_coerce(func.sum(Charge.total), BigInteger).label('total')) \
+        .join(Apartment, Charge.apartment_id == Apartment.id) \
+        .where(Charge.period == period, apartment_filter).group_by(Charge.apartment_id).subquery()
+    amount = case((totals.c.apartment_id % 10 == 1, (totals.c.total + 1) // 2), else_=totals.c.total)
+    status = case((totals.c.apartment_id % 50 == 7, 'pending'), else_='completed')
+    method = case((totals.c.apartment_id % 3 == 0, 'cash'), (totals.c.apartment_id % 3 == 1, 'card'),
+                  else_='bank')
+    # Дата платежа - один из четырёх дней месяца следующего за периодом
+    return [
+        select(totals.c.apartment_id, amount,
+               literal(datetime(period.year + period.month // 12, period.month % 12 + 1, day, 10), db.DateTime),
+               method, status, literal(created_at, db.DateTime))
+        .where(totals.c.apartment_id % 10 != 0, totals.c.apartment_id % 4 == bucket)
+        for bucket, day in enumerate((3, 10, 17, 24))
+    ]
+
+
+def generate(buildings=50, apartments_per_building=100, months=12, start=None,
+             residents_per_apartment=1, seed=42, progress=None):
+    """Заполняет базу синтетическими данными и возвращает GeneratorReport.
+
+    Начисления и платежи создаются за months месяцев начиная со start.
+    progress - функция для сообщений о ходе работы (например, print).
+    """
+    rng = random.Random(seed)
+    report = GeneratorReport()
+    start = start or date(date.today().year - (months - 1) // 12 - 1, 1, 1)
+    say = progress or (lambda message: None)
+    created_at = datetime.utcnow()
+
+    services = _services()
+    first_building = (db.session.scalar(select(func.max(Building.id))) or 0) + 1
+    first_apartment = (db.session.scalar(select(func.max(Apartment.id))) or 0) + 1
+
+    started = time.perf_counter()
+    count = _insert_batches(Building, _buildings(buildings, rng, first_building))
+    report.add('building', count, time.perf_counter() - started)
+    building_ids = range(first_building, first_building + buildings)
+
+    started = time.perf_counter()
+    apartment_rows = list(_apartments(building_ids, apartments_per_building, rng, first_apartment))
+    count = _insert_batches(Apartment, apartment_rows)
+    db.session.execute(
+        Building.__table__.update().where(Building.id.in_(building_ids))
+        .values(apartments_count=apartments_per_building)
+    )
+    report.add('apartment', count, time.perf_counter() - started)
+    say(f'Дома и квартиры: {report.summary()}')
+
+    # Только новые квартиры, чтобы повторный запуск не дублировал историю старых
+    new_apartments = Apartment.id >= first_apartment
+    connection = db.session.connection()
+
+    started = time.perf_counter()
+    for number in range(residents_per_apartment):
+        connection.execute(insert(Resident).from_select(
+            ['full_name', 'phone', 'apartment_id', 'is_owner', 'created_at'],
+            select(literal('Жилец ') + func.cast(Apartment.id, db.String) + literal(f'-{number + 1}'),
+                   literal('+7 (900) 000-00-00'), Apartment.id, literal(number == 0),
+                   literal(created_at, db.DateTime)).where(new_apartments),
+        ))
+    report.add('resident', residents_per_apartment * count, time.perf_counter() - started)
+
+    # Пары (квартира, площадь) по домам - вход compute_charges, как в run_billing
+    buildings_apartments = {}
+    for row in apartment_rows:
+        buildings_apartments.setdefault(row['building_id'], []).append((row['id'], row['area']))
+    _building_tariffs(services, list(building_ids), start)
+    tariffs = TariffResolver.load([service.id for service in services],
+                                  {service.id: service.rate for service in services})
+
+    payment_columns = ['apartment_id', 'amount', 'date', 'payment_method', 'status', 'created_at']
+    for period in _months(start, months):
+        started = time.perf_counter()
+        inserted = _insert_batches(Charge, _charge_rows(period, buildings_apartments, services, tariffs, created_at))
+        report.add('charge', inserted, time.perf_counter() - started)
+
+        started = time.perf_counter()
+        inserted = 0
+        for statement in _payments_for(period, new_apartments, created_at):
+            inserted += connection.execute(insert(Payment).from_select(payment_columns, statement)).rowcount
+        report.add('payment', inserted, time.perf_counter() - started)
+        say(f'{period:%m.%Y}: {report.rows["charge"]} начислений, {report.rows["payment"]} платежей')
+
+    # Вставки шли в обход событий ORM - агрегаты и сальдо строятся заново
+    started = time.perf_counter()
+    rebuild_balances()
+    report.add('monthly_balance', None, time.perf_counter() - started)
+    started = time.perf_counter()
+    rebuild_ledger()
+    report.add('apartment_balance', None, time.perf_counter() - started)
+
+    # Квитанции - по домам, как их пишет расчёт; долг на начало берётся из агрегатов выше
+    started = time.perf_counter()
+    inserted = 0
+    for period in _months(start, months):
+        for building_id in building_ids:
+            inserted += snapshot_statements(period, building_id)
+    report.add('statement', inserted, time.perf_counter() - started)
+
+    db.session.commit()
+    dashboard_stats.invalidate()
+    return report
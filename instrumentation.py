@@ -0,0 +1,201 @@
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+
+from models import db
+
+# Сколько последних запросов хранится по каждому endpoint
+WINDOW = 500
+
+# Границы корзин гистограммы времени ответа, мс
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+# Сколько разных повторяющихся выражений SQL хранится
+MAX_STATEMENTS = 200
+
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s)'
+_IN_LIST = re.compile(rf'\bIN \(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_statement(statement):
+    # IN (?, ?, ?) с разной длиной списка - одно и то же выражение (и для %(name)s в PostgreSQL)
+    statement = _IN_LIST.sub('IN (?...)', statement)
+    return _SPACES.sub(' ', statement).strip()[:300]
+
+
+class RequestTimings:
+    """Счётчики одного запроса: SQL, шаблоны, повторяющиеся выражения."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+class EndpointStats:
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+        self.total = 0
+
+    def add(self, sample):
+        self.samples.append(sample)
+        self.total += 1
+
+    def summary(self):
+        durations = sorted(sample['duration'] for sample in self.samples)
+        count = len(durations)
+
+        def percentile(p):
+            return durations[min(count - 1, int(p * count))]
+
+        def average(key):
+            return sum(sample[key] for sample in self.samples) / count
+
+        histogram = [0] * (len(BUCKETS) + 1)
+        for duration in durations:
+            index = next((i for i, bound in enumerate(BUCKETS) if duration <= bound), len(BUCKETS))
+            histogram[index] += 1
+        return {
+            'requests': self.total,
+            'window': count,
+            'p50': percentile(0.5),
+            'p95': percentile(0.95),
+            'max': durations[-1],
+            'queries': average('queries'),
+            'sql': average('sql'),
+            'template': average('template'),
+            'size': average('size'),
+            'histogram': histogram,
+        }
+
+
+class Instrumentation:
+    """Сводка по endpoint'ам за последние WINDOW запросов каждого."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        # (endpoint, выражение) -> [запросов с повтором, максимум повторов за запрос]
+        self.repeated = {}
+
+    def record(self, endpoint, timings, duration, size):
+        sample = {
+            'duration': duration * 1000,
+            'queries': timings.queries,
+            'sql': timings.sql_time * 1000,
+            'template': timings.template_time * 1000,
+            'size': size or 0,
+        }
+        with self._lock:
+            self.endpoints.setdefault(endpoint, EndpointStats()).add(sample)
+            for statement, count in timings.statements.items():
+                if count < 2:
+                    continue
+                key = (endpoint, statement)
+                entry = self.repeated.get(key)
+                if entry is None:
+                    if len(self.repeated) >= MAX_STATEMENTS:
+                        # Вытесняем самое редкое выражение
+                        del self.repeated[min(self.repeated, key=lambda k: self.repeated[k][0])]
+                    entry = self.repeated[key] = [0, 0]
+                entry[0] += 1
+                entry[1] = max(entry[1], count)
+
+    def slowest(self, limit=20):
+        with self._lock:
+            rows = [(endpoint, stats.summary()) for endpoint, stats in self.endpoints.items()]
+        return sorted(rows, key=lambda row: row[1]['p95'], reverse=True)[:limit]
+
+    def repeated_statements(self, limit=20):
+        with self._lock:
+            rows = [(endpoint, statement, requests, most)
+                    for (endpoint, statement), (requests, most) in self.repeated.items()]
+        return sorted(rows, key=lambda row: (row[3], row[2]), reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+            self.repeated.clear()
+
+
+instrumentation = Instrumentation()
+
+
+def _current():
+    if has_request_context():
+        return g.get('timings')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_started', None)
+    timings = _current()
+    if timings is not None and started is not None:
+        timings.queries += 1
+        timings.sql_time += time.perf_counter() - started
+        timings.statements[normalize_statement(statement)] += 1
+
+
+def _before_render(sender, template, context, **extra):
+    timings = _current()
+    if timings is not None:
+        g.template_started = time.perf_counter()
+
+
+def _rendered(sender, template, context, **extra):
+    timings = _current()
+    started = g.pop('template_started', None)
+    if timings is not None and started is not None:
+        timings.template_time += time.perf_counter() - started
+
+
+def _start_request():
+    g.timings = RequestTimings()
+
+
+def _finish_request(response):
+    timings = g.pop('timings', None)
+    if timings is None:
+        return response
+    duration = timings.elapsed
+    # У потоковых ответов размер заранее неизвестен
+    size = None if response.is_streamed else response.calculate_content_length()
+    response.headers['Server-Timing'] = (
+        f'db;dur={timings.sql_time * 1000:.1f};desc="{timings.queries} queries", '
+        f'tpl;dur={timings.template_time * 1000:.1f}, '
+        f'total;dur={duration * 1000:.1f}'
+    )
+    # Несуществующие адреса собираются в одну строку, чтобы не раздувать сводку
+    endpoint = request.endpoint or '<404>'
+    if endpoint != 'static':
+        instrumentation.record(endpoint, timings, duration, size)
+    return response
+
+
+def init_instrumentation(app):
+    """Подключает замеры к движку БД, сигналам шаблонов и обработчикам запросов."""
+    if not app.config.get('INSTRUMENTATION', True):
+        return
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
@@ -0,0 +1,390 @@
+"""Фоновые задачи: очередь в таблице Job и обработчики в пуле потоков.
+
+Очередь живёт в основной базе, внешний брокер не нужен. Задачу забирает
+первый свободный обработчик - в потоках веб-процесса (JOB_WORKERS) или
+в отдельном процессе `flask worker`.
+"""
+import json
+import os
+import socket
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+
+from models import db, Job
+from billing import BillingReport, run_billing
+from registry import import_registry
+from reports import save_report
+
+STATUSES = {
+    'queued': 'В очереди',
+    'running': 'Выполняется',
+    'done': 'Готово',
+    'failed': 'Ошибка',
+    'cancelled': 'Отменено',
+}
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Как часто обработчик без задач заглядывает в очередь, секунд
+POLL_INTERVAL = 2.0
+
+# Как часто прогресс записывается в базу, секунд
+PROGRESS_INTERVAL = 1.0
+
+# Через сколько секунд без признаков жизни выполняемая задача считается брошенной
+STALE_AFTER = 600
+
+# Сколько ждать блокировку SQLite при записи прогресса, мс (расчёт держит её до COMMIT)
+PROGRESS_LOCK_TIMEOUT = 100
+
+
+class JobCancelled(Exception):
+    """Задачу отменили; result - итоги части, записанной до отмены, если обработчик их собрал."""
+
+    def __init__(self, result=None):
+        super().__init__()
+        self.result = result
+
+
+# Обработчики по виду задачи: kind -> функция(context, **params) -> dict с итогами
+HANDLERS = {}
+
+
+def handler(kind):
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+# Прогресс задач, выполняемых в этом процессе: виден странице статуса,
+# даже когда запись в базу ждёт окончания транзакции расчёта
+_live = {}
+_live_lock = threading.Lock()
+
+
+def _write(job_id, lock_timeout=None, **values):
+    """Обновляет задачу в отдельной короткой транзакции; False, если база занята."""
+    try:
+        with db.engine.connect() as connection:
+            sqlite = connection.dialect.name == 'sqlite'
+            if sqlite and lock_timeout is not None:
+                connection.exec_driver_sql(f'PRAGMA busy_timeout={lock_timeout}')
+            try:
+                connection.execute(update(Job).where(Job.id == job_id).values(**values))
+                connection.commit()
+            finally:
+                if sqlite and lock_timeout is not None:
+                    busy_timeout = current_app.config.get('SQLITE_PRAGMAS', {}).get('busy_timeout', 5000)
+                    connection.exec_driver_sql(f'PRAGMA busy_timeout={busy_timeout}')
+        return True
+    except OperationalError:
+        return False
+
+
+class JobContext:
+    """То, что видит обработчик: параметры, прогресс и проверка отмены."""
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._saved_at = 0.0
+        self._pending = {}
+
+    def progress(self, done, total=None, message=None):
+        """Сообщает, сколько сделано; бросает JobCancelled, если задачу отменили."""
+        values = {'progress': int(done)}
+        if total is not None:
+            values['total'] = int(total)
+        if message is not None:
+            values['message'] = message[:300]
+        with _live_lock:
+            _live.setdefault(self.job_id, {}).update(values)
+        self._pending.update(values)
+
+        now = time.monotonic()
+        if now - self._saved_at >= PROGRESS_INTERVAL:
+            self._saved_at = now
+            if _write(self.job_id, PROGRESS_LOCK_TIMEOUT, heartbeat_at=datetime.utcnow(), **self._pending):
+                self._pending = {}
+            self.check_cancelled()
+
+    def check_cancelled(self):
+        # Чтение не ждёт блокировок - флаг виден и посреди транзакции расчёта
+        with db.engine.connect() as connection:
+            cancelled = connection.scalar(select(Job.cancel_requested).where(Job.id == self.job_id))
+        if cancelled:
+            raise JobCancelled()
+
+
+def enqueue(kind, title, params, user_id=None):
+    """Ставит задачу в очередь и возвращает её.
+
+    Если такая же задача (вид и параметры) ещё в очереди или выполняется,
+    новая не создаётся - повторная отправка формы не удваивает нагрузку.
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f'Неизвестный вид задачи: {kind}')
+    raw = json.dumps(params, ensure_ascii=False, sort_keys=True, default=str)
+    existing = Job.query.filter(Job.kind == kind, Job.params == raw, Job.status.in_(ACTIVE_STATUSES)) \
+        .order_by(Job.id).first()
+    if existing:
+        return existing
+    job = Job(kind=kind, title=title[:200], params=raw, status='queued', created_by=user_id)
+    db.session.add(job)
+    db.session.commit()
+    runner.wake()
+    return job
+
+
+def cancel(job):
+    """Отменяет задачу в очереди сразу, выполняемую - по флагу при следующей отметке прогресса."""
+    if job.status == 'queued':
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job.id, Job.status == 'queued')
+            .values(status='cancelled', cancel_requested=True, finished_at=datetime.utcnow(),
+                    message='Отменено до запуска')
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return True
+        db.session.refresh(job)
+    if job.status == 'running':
+        job.cancel_requested = True
+        db.session.commit()
+        return True
+    return False
+
+
+def claim_next(worker):
+    """Забирает старейшую задачу из очереди; UPDATE ... WHERE status='queued' не даст взять её дважды."""
+    oldest = select(Job.id).where(Job.status == 'queued').order_by(Job.id).limit(1).scalar_subquery()
+    now = datetime.utcnow()
+    job_id = db.session.execute(
+        update(Job).where(Job.id == oldest, Job.status == 'queued')
+        .values(status='running', worker=worker, started_at=now, heartbeat_at=now, message='Запущено')
+        .returning(Job.id)
+    ).scalar()
+    db.session.commit()
+    return job_id
+
+
+def recover_stale(stale_after=STALE_AFTER):
+    """Помечает ошибкой задачи, чей обработчик давно не подавал признаков жизни (процесс упал)."""
+    deadline = datetime.utcnow() - timedelta(seconds=stale_after)
+    count = db.session.execute(
+        update(Job).where(Job.status == 'running', Job.heartbeat_at < deadline)
+        .values(status='failed', finished_at=datetime.utcnow(), message='Обработчик перестал отвечать')
+    ).rowcount
+    db.session.commit()
+    return count
+
+
+def run_job(job_id):
+    """Выполняет забранную задачу и записывает итог."""
+    job = db.session.get(Job, job_id)
+    params = json.loads(job.params)
+    kind = job.kind
+    db.session.commit()
+
+    context = JobContext(job_id)
+    started = time.perf_counter()
+    try:
+        result = HANDLERS[kind](context, **params) or {}
+    except JobCancelled as e:
+        db.session.rollback()
+        if e.result:
+            _finish(context, 'cancelled', message=e.result.get('summary'),
+                    result=json.dumps(e.result, ensure_ascii=False, default=str))
+        else:
+            _finish(context, 'cancelled', message='Отменено, изменения задачи не сохранены')
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.exception('Задача %s (%s) завершилась ошибкой', job_id, kind)
+        _finish(context, 'failed', message=str(e))
+    else:
+        result.setdefault('elapsed', round(time.perf_counter() - started, 2))
+        _finish(context, 'done', message=result.get('summary'),
+                result=json.dumps(result, ensure_ascii=False, default=str))
+    finally:
+        with _live_lock:
+            _live.pop(job_id, None)
+        db.session.remove()
+
+
+def _finish(context, status, message=None, **values):
+    # Вместе с итогом записывается прогресс, который не успел попасть в базу
+    values = {**context._pending, **values}
+    values['message'] = message[:300] if message else None
+    _write(context.job_id, status=status, finished_at=datetime.utcnow(), heartbeat_at=datetime.utcnow(), **values)
+
+
+def run_pending(worker=None):
+    """Выполняет все задачи из очереди в текущем потоке; возвращает их число."""
+    worker = worker or _worker_name()
+    count = 0
+    while True:
+        job_id = claim_next(worker)
+        if job_id is None:
+            return count
+        run_job(job_id)
+        count += 1
+
+
+def job_state(job):
+    """Состояние задачи для страницы статуса с учётом прогресса, ещё не записанного в базу."""
+    state = {
+        'id': job.id,
+        'kind': job.kind,
+        'title': job.title,
+        'status': job.status,
+        'status_label': STATUSES.get(job.status, job.status),
+        'progress': job.progress,
+        'total': job.total,
+        'message': job.message,
+        'cancel_requested': job.cancel_requested,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'result': json.loads(job.result) if job.result else None,
+    }
+    if job.status == 'running':
+        with _live_lock:
+            state.update(_live.get(job.id, {}))
+    state['percent'] = round(100 * state['progress'] / state['total']) if state['total'] else None
+    return state
+
+
+def _worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+
+
+class JobRunner:
+    """Пул потоков, разбирающих очередь задач."""
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self._threads = []
+        self._stopping = threading.Event()
+
+    def start(self, app, workers):
+        with self._start_lock:
+            if self._threads or workers <= 0:
+                return
+            self._stopping.clear()
+            self._spawn(app, workers)
+
+    def _spawn(self, app, workers):
+        for number in range(workers):
+            thread = threading.Thread(target=self._loop, args=(app,), name=f'job-worker-{number + 1}',
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wake(self):
+        self._wakeup.set()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+
+    def _loop(self, app):
+        with app.app_context():
+            recover_stale(app.config.get('JOB_STALE_AFTER', STALE_AFTER))
+            interval = app.config.get('JOB_POLL_INTERVAL', POLL_INTERVAL)
+            while not self._stopping.is_set():
+                try:
+                    ran = run_pending()
+                except OperationalError:
+                    # База занята другим писателем - попробуем на следующем круге
+                    db.session.rollback()
+                    ran = 0
+                finally:
+                    db.session.remove()
+                if not ran:
+                    self._wakeup.wait(interval)
+                    self._wakeup.clear()
+
+
+runner = JobRunner()
+
+
+def init_jobs(app):
+    """Обработчики в потоках веб-процесса (JOB_WORKERS=0 - только `flask worker`).
+
+    Потоки стартуют с первым запросом, чтобы команды flask db upgrade и т.п. их не запускали.
+    """
+    workers = app.config.get('JOB_WORKERS', 0)
+
+    def start_workers():
+        runner.start(app, workers)
+
+    if workers > 0:
+        app.before_request(start_workers)
+
+
+# --- Обработчики ---
+# Итог - словарь: summary (строка), lines (подробности), link (endpoint и аргументы для url_for)
+
+@handler('billing')
+def billing_job(context, period, service_ids, building_id=None):
+    period = date.fromisoformat(period)
+    report = BillingReport(period)
+    try:
+        run_billing(period, service_ids, building_id=building_id, progress=context.progress,
+                    processes=current_app.config.get('BILLING_PROCESSES'), report=report)
+    except JobCancelled as e:
+        # Каждый дом записывается своей транзакцией - готовые дома остаются в базе
+        e.result = _billing_result(report, cancelled=True)
+        raise
+    current_app.logger.info('Начисления за %s: %s', f'{period:%m.%Y}', report.summary())
+    return _billing_result(report)
+
+
+def _billing_result(report, cancelled=False):
+    period = report.period
+    if cancelled:
+        summary = (f'Отменено: начисления за {period:%m.%Y} записаны по {len(report.saved_buildings)} домам '
+                   f'({report.created} строк), остальные не рассчитаны - повторный расчёт продолжит с них')
+    else:
+        summary = f'Создано {report.created} начислений за {period:%m.%Y} ({report.rows_per_sec:.0f} строк/с)'
+    if report.failed:
+        summary += f'; домов с ошибкой: {len(report.failed)} - повторите расчёт'
+    lines = [report.summary()] + report.worker_lines() + [
+        f'Дом {building_id}: {error}' for building_id, error in report.failed
+    ]
+    if cancelled and report.saved_buildings:
+        lines.append('Записаны дома: ' + ', '.join(map(str, report.saved_buildings)))
+    return {'summary': summary, 'lines': lines, 'link': ['admin.charges', {}],
+            'saved_buildings': report.saved_buildings}
+
+
+@handler('registry_import')
+def registry_import_job(context, path, filename, source=None):
+    try:
+        with open(path, 'rb') as stream:
+            report = import_registry(stream, filename, source, progress=context.progress)
+    finally:
+        # Файл загрузки нужен только этой задаче
+        os.remove(path)
+    current_app.logger.info('Реестр %s: %s', filename, report.summary())
+    lines = report.invalid_lines + [
+        f'Строка {line}: квартира не найдена - {address}, кв. {apartment}, {amount} ₽'
+        for line, address, apartment, amount in report.unmatched_lines
+    ] + [
+        f'Строка {line}: возможный дубль - платеж {amount} ₽ от {paid_at:%d.%m.%Y} по {address}, кв. {apartment} '
+        f'уже был, проверьте'
+        for line, address, apartment, paid_at, amount in report.suspected_lines
+    ]
+    return {'summary': report.summary(), 'lines': lines, 'link': ['admin.payments', {}]}
+
+
+@handler('report')
+def report_job(context, report_type, period, title, user_id, building_id=None):
+    context.progress(0, 1, 'Формирование отчета')
+    report = save_report(report_type, date.fromisoformat(period), building_id, title, user_id)
+    return {'summary': f'Отчет «{report.title}» сформирован', 'link': ['admin.report_detail', {'id': report.id}]}
@@ -0,0 +1,244 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from sqlalchemy import delete, event, exists, func, select, true, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import (db, Apartment, Charge, Payment, ApartmentBalance, ArchivedYear, MonthlyBalance,
+                    upsert_increment)
+from reports import PAID_STATUS, new_value, old_value
+
+# Сколько квартир разносится за один проход
+ALLOCATE_BATCH = 500
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# --- Разнесение оплаты по начислениям (FIFO) ---
+
+def _archived_charged():
+    """Начислено квартирам в месяцах, перенесённых в архив (archive.py).
+
+    Архивные месяцы раньше всех начислений основной таблицы, поэтому в очереди
+    оплаты они первые; их сумма берётся из помесячных агрегатов.
+    """
+    boundary = select(func.max(ArchivedYear.until)).scalar_subquery()
+    return select(MonthlyBalance.apartment_id, func.sum(MonthlyBalance.charged).label('charged')) \
+        .where(MonthlyBalance.period < boundary).group_by(MonthlyBalance.apartment_id)
+
+
+def _available(archived):
+    """Оплата квартиры, оставшаяся после архивных начислений."""
+    return func.coalesce(ApartmentBalance.paid, 0) - func.coalesce(archived.c.charged, 0)
+
+
+def allocate(apartment_ids):
+    """Разносит оплату квартир по начислениям от старых к новым и выставляет Charge.is_paid.
+
+    Начисление оплачено, если всей оплаты квартиры хватает на него и на все более ранние.
+    Возвращает количество начислений, у которых изменился статус.
+    """
+    connection = db.session.connection()
+    changed = 0
+    for chunk in _chunks(sorted(apartment_ids), ALLOCATE_BATCH):
+        archived = _archived_charged().where(MonthlyBalance.apartment_id.in_(chunk)).subquery()
+        available = dict(connection.execute(
+            select(ApartmentBalance.apartment_id, _available(archived))
+            .outerjoin(archived, archived.c.apartment_id == ApartmentBalance.apartment_id)
+            .where(ApartmentBalance.apartment_id.in_(chunk))
+        ).all())
+        charges = connection.execute(
+            select(Charge.id, Charge.apartment_id, Charge.total, Charge.is_paid)
+            .where(Charge.apartment_id.in_(chunk))
+            .order_by(Charge.apartment_id, Charge.period, Charge.id)
+        )
+
+        paid_ids, unpaid_ids = [], []
+        current, spent = None, 0
+        for charge_id, apartment_id, total, is_paid in charges:
+            if apartment_id != current:
+                current, spent = apartment_id, 0
+            spent += total or 0
+            covered = spent <= available.get(apartment_id, 0)
+            if covered != bool(is_paid):
+                (paid_ids if covered else unpaid_ids).append(charge_id)
+
+        for ids, value in ((paid_ids, True), (unpaid_ids, False)):
+            for ids_chunk in _chunks(ids, ALLOCATE_BATCH):
+                connection.execute(update(Charge).where(Charge.id.in_(ids_chunk)).values(is_paid=value))
+        changed += len(paid_ids) + len(unpaid_ids)
+    return changed
+
+
+# --- Проводки по событиям ORM ---
+
+def _posting(obj, value):
+    """(квартира, поле сальдо, сумма, период) для начисления или платежа."""
+    if isinstance(obj, Charge):
+        return value(obj, 'apartment_id'), 'charged', value(obj, 'total') or 0, value(obj, 'period')
+    amount = (value(obj, 'amount') or 0) if value(obj, 'status') == PAID_STATUS else 0
+    return value(obj, 'apartment_id'), 'paid', amount, None
+
+
+@event.listens_for(Session, 'after_flush')
+def _post_changes(session, flush_context):
+    amounts = defaultdict(lambda: {'charged': 0, 'paid': 0})
+    touched = set()
+
+    def post(posting, sign):
+        apartment_id, field, amount, _ = posting
+        if apartment_id is not None:
+            amounts[apartment_id][field] += sign * amount
+            touched.add(apartment_id)
+
+    for obj in session.new:
+        if isinstance(obj, (Charge, Payment)):
+            post(_posting(obj, new_value), 1)
+    for obj in session.dirty:
+        if isinstance(obj, (Charge, Payment)) and session.is_modified(obj, include_collections=False):
+            old, new = _posting(obj, old_value), _posting(obj, new_value)
+            if old != new:
+                post(old, -1)
+                post(new, 1)
+    removed = set()
+    for obj in session.deleted:
+        if isinstance(obj, (Charge, Payment)):
+            post(_posting(obj, old_value), -1)
+        elif isinstance(obj, Apartment):
+            removed.add(obj.id)
+
+    touched -= removed
+    if not touched:
+        return
+
+    connection = session.connection()
+    buildings = dict(connection.execute(
+        select(Apartment.id, Apartment.building_id).where(Apartment.id.in_(touched))
+    ).all())
+    rows = [
+        {'apartment_id': apartment_id, 'building_id': buildings[apartment_id],
+         'charged': values['charged'], 'paid': values['paid'],
+         'debt': values['charged'] - values['paid']}
+        for apartment_id, values in amounts.items() if apartment_id in buildings
+    ]
+    if rows:
+        connection.execute(upsert_increment(ApartmentBalance, ['apartment_id'],
+                                            ['charged', 'paid', 'debt']), rows)
+    allocate(buildings)
+
+
+# --- Пакетные проводки и пересчёт ---
+
+def sync_balances(building_id=None):
+    """Пересчитывает сальдо квартир по помесячным агрегатам MonthlyBalance."""
+    connection = db.session.connection()
+    insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+    totals = select(
+        MonthlyBalance.apartment_id, MonthlyBalance.building_id,
+        func.sum(MonthlyBalance.charged), func.sum(MonthlyBalance.paid),
+        func.sum(MonthlyBalance.charged - MonthlyBalance.paid),
+    ).where(true()).group_by(MonthlyBalance.apartment_id, MonthlyBalance.building_id)
+    if building_id:
+        # По индексу (apartment_id, period), а не полным просмотром агрегатов
+        totals = totals.where(MonthlyBalance.apartment_id.in_(
+            select(Apartment.id).where(Apartment.building_id == building_id)
+        ))
+
+    statement = insert(ApartmentBalance).from_select(
+        ['apartment_id', 'building_id', 'charged', 'paid', 'debt'], totals
+    )
+    connection.execute(statement.on_conflict_do_update(
+        index_elements=['apartment_id'],
+        set_={column: statement.excluded[column] for column in ('building_id', 'charged', 'paid', 'debt')},
+    ))
+
+
+def post_charges(period, building_id=None):
+    """Проводит по сальдо начисления, вставленные пакетно в обход ORM (run_billing).
+
+    Вызывается после reports.refresh_charges, в той же транзакции.
+    """
+    # Разнесение меняется только там, где есть нераспределённая переплата,
+    # либо если расчёт задним числом встаёт в очередь перед уже оплаченными периодами
+    later = db.session.scalar(select(exists().where(Charge.period > period)))
+    candidates = select(ApartmentBalance.apartment_id).where(ApartmentBalance.paid > 0)
+    if not later:
+        candidates = candidates.where(ApartmentBalance.debt < 0)
+    if building_id:
+        candidates = candidates.where(ApartmentBalance.building_id == building_id)
+    apartment_ids = db.session.scalars(candidates).all()
+
+    sync_balances(building_id)
+    return allocate(apartment_ids)
+
+
+def post_payments(payments):
+    """Проводит по сальдо оплаты, вставленные пакетно в обход ORM, и разносит их.
+
+    payments - словари с apartment_id, building_id и amount.
+    """
+    paid = defaultdict(Decimal)
+    buildings = {}
+    for payment in payments:
+        paid[payment['apartment_id']] += payment['amount']
+        buildings[payment['apartment_id']] = payment['building_id']
+    if not paid:
+        return 0
+    db.session.connection().execute(
+        upsert_increment(ApartmentBalance, ['apartment_id'], ['charged', 'paid', 'debt']),
+        [{'apartment_id': apartment_id, 'building_id': buildings[apartment_id],
+          'charged': 0, 'paid': amount, 'debt': -amount}
+         for apartment_id, amount in paid.items()],
+    )
+    return allocate(paid)
+
+
+def allocate_all():
+    """То же, что allocate, для всех квартир сразу: нарастающий итог считается оконной функцией."""
+    archived = _archived_charged().subquery()
+    running = select(
+        Charge.id,
+        func.sum(Charge.total).over(partition_by=Charge.apartment_id, order_by=(Charge.period, Charge.id))
+        .label('spent'),
+        _available(archived).label('paid'),
+    ).outerjoin(ApartmentBalance, ApartmentBalance.apartment_id == Charge.apartment_id) \
+        .outerjoin(archived, archived.c.apartment_id == Charge.apartment_id).subquery()
+    covered = select(running.c.id).where(running.c.spent <= running.c.paid)
+    uncovered = select(running.c.id).where(running.c.spent > running.c.paid)
+
+    connection = db.session.connection()
+    changed = connection.execute(
+        update(Charge).where(Charge.is_paid.isnot(True), Charge.id.in_(covered)).values(is_paid=True)
+    ).rowcount
+    changed += connection.execute(
+        update(Charge).where(Charge.is_paid.is_(True), Charge.id.in_(uncovered)).values(is_paid=False)
+    ).rowcount
+    return changed
+
+
+def rebuild_ledger():
+    """Полностью перестраивает сальдо и статусы оплаты (после reports.rebuild_balances)."""
+    db.session.execute(delete(ApartmentBalance))
+    sync_balances()
+    return allocate_all()
+
+
+def debtors(building_id=None, min_debt=0):
+    """Запрос должников по индексу ix_apartment_balance_debt (без агрегирования)."""
+    query = ApartmentBalance.query.filter(ApartmentBalance.debt > min_debt)
+    if building_id:
+        query = query.filter(ApartmentBalance.building_id == building_id)
+    return query
+
+
+def debt_total(building_id=None, min_debt=0):
+    query = db.session.query(func.count(), func.coalesce(func.sum(ApartmentBalance.debt), 0)) \
+        .filter(ApartmentBalance.debt > min_debt)
+    if building_id:
+        query = query.filter(ApartmentBalance.building_id == building_id)
+    return query.one()
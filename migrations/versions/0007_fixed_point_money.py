@@ -0,0 +1,53 @@
+"""fixed point money
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 09:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# Колонки, которые хранятся целым числом единиц: {таблица: {колонка: знаков после запятой}}
+COLUMNS = {
+    'service': {'rate': 4},
+    'charge': {'amount': 3, 'total': 2},
+    'payment': {'amount': 2},
+    'monthly_balance': {'charged': 2, 'paid': 2},
+    'monthly_service_revenue': {'charged': 2},
+    'apartment_balance': {'charged': 2, 'paid': 2, 'debt': 2},
+}
+
+
+def upgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    for table, columns in COLUMNS.items():
+        if not postgresql:
+            # SQLite: сначала округляем на месте, пересоздание таблицы перенесёт значения как целые
+            op.execute(f'UPDATE {table} SET ' + ', '.join(
+                f'{column} = ROUND({column} * {10 ** scale})' for column, scale in columns.items()
+            ))
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column, scale in columns.items():
+                batch_op.alter_column(column, existing_type=sa.Float(), type_=sa.BigInteger(),
+                                      postgresql_using=f'ROUND({column} * {10 ** scale})::bigint')
+
+
+def downgrade():
+    postgresql = op.get_bind().dialect.name == 'postgresql'
+    for table, columns in COLUMNS.items():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column, scale in columns.items():
+                batch_op.alter_column(column, existing_type=sa.BigInteger(), type_=sa.Float(),
+                                      postgresql_using=f'{column}::double precision / {10 ** scale}')
+        if not postgresql:
+            op.execute(f'UPDATE {table} SET ' + ', '.join(
+                f'{column} = {column} / {10.0 ** scale}' for column, scale in columns.items()
+            ))
@@ -0,0 +1,99 @@
+"""search index
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17 00:41:07.318254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+# Строки индекса (те же выражения, что в search.py); rowid: квартира id * 2, жилец id * 2 + 1
+APARTMENT_ROWS = """
+SELECT a.id * 2, 'apartment', a.id, a.id,
+       b.address || ', кв. ' || a.number,
+       b.address || ' кв. ' || a.number
+FROM apartment a JOIN building b ON b.id = a.building_id
+"""
+RESIDENT_ROWS = """
+SELECT r.id * 2 + 1, 'resident', r.id, a.id,
+       r.full_name || ' - ' || b.address || ', кв. ' || a.number,
+       r.full_name || ' ' || coalesce(r.phone, '') || ' '
+           || replace(replace(replace(replace(replace(coalesce(r.phone, ''), ' ', ''), '(', ''), ')', ''), '-', ''), '+', '')
+           || ' ' || coalesce(r.email, '') || ' ' || b.address || ' кв. ' || a.number
+FROM resident r JOIN apartment a ON a.id = r.apartment_id JOIN building b ON b.id = a.building_id
+"""
+INSERT = 'INSERT INTO search_index (rowid, kind, ref_id, apartment_id, label, body) '
+
+TRIGGERS = {
+    'search_apartment_insert': f"""
+        AFTER INSERT ON apartment BEGIN
+            {INSERT} {APARTMENT_ROWS} WHERE a.id = NEW.id;
+        END""",
+    'search_apartment_update': f"""
+        AFTER UPDATE OF number, building_id ON apartment BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 2;
+            {INSERT} {APARTMENT_ROWS} WHERE a.id = NEW.id;
+            DELETE FROM search_index WHERE rowid IN (SELECT id * 2 + 1 FROM resident WHERE apartment_id = NEW.id);
+            {INSERT} {RESIDENT_ROWS} WHERE r.apartment_id = NEW.id;
+        END""",
+    'search_apartment_delete': """
+        AFTER DELETE ON apartment BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 2;
+        END""",
+    'search_resident_insert': f"""
+        AFTER INSERT ON resident BEGIN
+            {INSERT} {RESIDENT_ROWS} WHERE r.id = NEW.id;
+        END""",
+    'search_resident_update': f"""
+        AFTER UPDATE OF full_name, phone, email, apartment_id ON resident BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 2 + 1;
+            {INSERT} {RESIDENT_ROWS} WHERE r.id = NEW.id;
+        END""",
+    'search_resident_delete': """
+        AFTER DELETE ON resident BEGIN
+            DELETE FROM search_index WHERE rowid = OLD.id * 2 + 1;
+        END""",
+    'search_building_update': f"""
+        AFTER UPDATE OF address ON building BEGIN
+            DELETE FROM search_index WHERE rowid IN (SELECT id * 2 FROM apartment WHERE building_id = NEW.id);
+            {INSERT} {APARTMENT_ROWS} WHERE a.building_id = NEW.id;
+            DELETE FROM search_index WHERE rowid IN (
+                SELECT r.id * 2 + 1 FROM resident r JOIN apartment a ON a.id = r.apartment_id
+                WHERE a.building_id = NEW.id
+            );
+            {INSERT} {RESIDENT_ROWS} WHERE a.building_id = NEW.id;
+        END""",
+}
+
+
+def upgrade():
+    # Полнотекстовый индекс есть только в SQLite; в других СУБД search.py ищет через LIKE
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("""
+        CREATE VIRTUAL TABLE search_index USING fts5(
+            kind UNINDEXED, ref_id UNINDEXED, apartment_id UNINDEXED, label UNINDEXED, body,
+            tokenize = 'trigram'
+        )
+    """)
+    for name, body in TRIGGERS.items():
+        op.execute(f'CREATE TRIGGER {name} {body}')
+    op.execute(INSERT + APARTMENT_ROWS)
+    op.execute(INSERT + RESIDENT_ROWS)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for name in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
+    op.execute('DROP TABLE IF EXISTS search_index')
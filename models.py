@@ -1,10 +1,44 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import json
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
+from sqlalchemy.dialects import postgresql, sqlite
+
+from money import ZERO, Money, Quantity, Rate, apply_rate
 
 db = SQLAlchemy()
 
+# СУБД с INSERT ... ON CONFLICT; другие отклоняет database.configure_database при запуске
+SUPPORTED_DIALECTS = ('sqlite', 'postgresql')
+
+# INSERT с ON CONFLICT в диалекте bind (по умолчанию - сессии)
+def dialect_insert(model, bind=None):
+    bind = bind if bind is not None else db.session.get_bind()
+    if bind.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+# INSERT, пропускающий строки, которые нарушают уникальные ограничения
+def insert_ignore(model):
+    return dialect_insert(model).on_conflict_do_nothing()
+
+# INSERT, обновляющий columns у строк, уже существующих по ключу index_elements
+def upsert(model, index_elements, columns):
+    statement = dialect_insert(model)
+    return statement.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: statement.excluded[column] for column in columns},
+    )
+
+# INSERT, прибавляющий columns к значениям строк, уже существующих по ключу index_elements
+def upsert_increment(model, index_elements, columns):
+    statement = dialect_insert(model)
+    return statement.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: getattr(model, column) + statement.excluded[column] for column in columns},
+    )
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -12,7 +46,10 @@ class User(db.Model, UserMixin):
     password_hash = db.Column(db.String(128))
     is_admin = db.Column(db.Boolean, default=False)
     is_active = db.Column(db.Boolean, default=True)  # Добавили is_active
+    resident_id = db.Column(db.Integer, db.ForeignKey('resident.id', ondelete='SET NULL'), unique=True)  # Вход жильца
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    resident = db.relationship('Resident', backref=db.backref('user', uselist=False))
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -42,8 +79,13 @@ class Building(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     apartments = db.relationship('Apartment', backref='building', lazy=True, cascade='all, delete-orphan')
+    tariffs = db.relationship('Tariff', backref='building', lazy=True, cascade='all, delete-orphan')
 
 class Apartment(db.Model):
+    __table_args__ = (
+        db.Index('ix_apartment_building_id', 'building_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     number = db.Column(db.String(20), nullable=False)
     area = db.Column(db.Float, default=50.0)
@@ -54,8 +96,15 @@ class Apartment(db.Model):
     residents = db.relationship('Resident', backref='apartment', lazy=True, cascade='all, delete-orphan')
     charges = db.relationship('Charge', backref='apartment', lazy=True, cascade='all, delete-orphan')
     payments = db.relationship('Payment', backref='apartment', lazy=True, cascade='all, delete-orphan')
+    readings = db.relationship('MeterReading', backref='apartment', lazy=True, cascade='all, delete-orphan')
+    balance = db.relationship('ApartmentBalance', backref='apartment', uselist=False, lazy=True,
+                              cascade='all, delete-orphan')
 
 class Resident(db.Model):
+    __table_args__ = (
+        db.Index('ix_resident_apartment_id', 'apartment_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     full_name = db.Column(db.String(150), nullable=False)
     phone = db.Column(db.String(20))
@@ -69,41 +118,142 @@ class Service(db.Model):
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     unit = db.Column(db.String(20))  # м³, кВт·ч, м² и т.д.
-    rate = db.Column(db.Float, default=0.0)  # Тариф за единицу
+    rate = db.Column(Rate(), default=0)  # Тариф за единицу, ₽
     is_counter = db.Column(db.Boolean, default=False)  # Счетчик
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     charges = db.relationship('Charge', backref='service', lazy=True)
+    readings = db.relationship('MeterReading', backref='service', lazy=True)
+    tariffs = db.relationship('Tariff', backref='service', lazy=True, order_by='Tariff.valid_from')
+
+class Tariff(db.Model):
+    # Тариф услуги на интервал периодов [valid_from, valid_to); building_id - тариф отдельного дома
+    __table_args__ = (
+        db.Index('ix_tariff_service_valid_from', 'service_id', 'valid_from'),
+    )
 
-class Charge(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    apartment_id = db.Column(db.Integer, db.ForeignKey('apartment.id'), nullable=False)
     service_id = db.Column(db.Integer, db.ForeignKey('service.id'), nullable=False)
-    period = db.Column(db.Date, nullable=False)  # Период начисления (год-месяц)
-    amount = db.Column(db.Float, default=0.0)  # Количество/объем
-    total = db.Column(db.Float, default=0.0)  # Сумма: amount * service.rate
+    building_id = db.Column(db.Integer, db.ForeignKey('building.id'))  # None - для всех домов
+    rate = db.Column(Rate(), nullable=False)  # Тариф за единицу, ₽
+    valid_from = db.Column(db.Date, nullable=False)  # Первый месяц действия
+    valid_to = db.Column(db.Date)  # Месяц, с которого уже не действует; None - бессрочно
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Charge(db.Model):
+    # Одно начисление на квартиру и услугу за период
+    __table_args__ = (
+        db.Index('uq_charge_apartment_service_period', 'apartment_id', 'service_id', 'period', unique=True),
+        # Сортировка списка и выборка начислений за период
+        db.Index('ix_charge_period_id', 'period', 'id'),
+        db.Index('ix_charge_service_period', 'service_id', 'period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # active_history: проводкам в агрегаты (reports.py, ledger.py) нужно прежнее значение
+    # и у объекта, истёкшего после COMMIT, - при присваивании оно дочитывается из базы
+    apartment_id = db.column_property(db.Column(db.Integer, db.ForeignKey('apartment.id'), nullable=False),
+                                      active_history=True)
+    service_id = db.column_property(db.Column(db.Integer, db.ForeignKey('service.id'), nullable=False),
+                                    active_history=True)
+    period = db.column_property(db.Column(db.Date, nullable=False),  # Период начисления (год-месяц)
+                                active_history=True)
+    amount = db.Column(Quantity(), default=0)  # Количество/объем
+    total = db.column_property(db.Column(Money(), default=0),  # Сумма: amount * service.rate, до копеек
+                               active_history=True)
     is_paid = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    # Метод для расчета суммы
-    def calculate_total(self):
-        if self.amount is not None:
-            service = Service.query.get(self.service_id)
-            if service and service.rate is not None:
-                return self.amount * service.rate
-        return 0.0
+    # Метод для расчета суммы: tariffs - tariffs.TariffResolver, загруженный один раз на весь расчёт
+    def calculate_total(self, tariffs, building_id=None):
+        if self.amount is None:
+            return ZERO
+        if building_id is None:
+            building_id = self.apartment.building_id
+        rate = tariffs.rate(self.service_id, building_id, self.period)
+        return apply_rate(self.amount, rate) if rate is not None else ZERO
+
+class MeterReading(db.Model):
+    # Одно показание счетчика на квартиру и услугу за период
+    __table_args__ = (
+        db.Index('uq_meter_reading_apartment_service_period', 'apartment_id', 'service_id', 'period', unique=True),
+        db.Index('ix_meter_reading_service_period', 'service_id', 'period'),
+    )
 
-class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     apartment_id = db.Column(db.Integer, db.ForeignKey('apartment.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    date = db.Column(db.DateTime, default=datetime.utcnow)
+    service_id = db.Column(db.Integer, db.ForeignKey('service.id'), nullable=False)
+    period = db.Column(db.Date, nullable=False)  # Период показания (год-месяц)
+    value = db.Column(db.Float, nullable=False)  # Показание счетчика
+    consumption = db.Column(db.Float)  # Расход с предыдущего показания
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Payment(db.Model):
+    __table_args__ = (
+        # Сортировка по дате и фильтр по статусу на странице платежей
+        db.Index('ix_payment_date_id', 'date', 'id'),
+        db.Index('ix_payment_status_date', 'status', 'date', 'id'),
+        db.Index('ix_payment_apartment_id', 'apartment_id'),
+        # Повторная загрузка реестра не создаёт дублей
+        db.Index('uq_payment_external_id', 'external_id', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # active_history - как у Charge: прежние значения нужны проводкам
+    apartment_id = db.column_property(db.Column(db.Integer, db.ForeignKey('apartment.id'), nullable=False),
+                                      active_history=True)
+    amount = db.column_property(db.Column(Money(), nullable=False), active_history=True)
+    date = db.column_property(db.Column(db.DateTime, nullable=False, default=datetime.utcnow),
+                              active_history=True)  # Ключ сортировки списков, без NULL
     payment_method = db.Column(db.String(50), default='bank')  # bank, cash, card
-    status = db.Column(db.String(20), default='completed')  # pending, completed, failed
+    status = db.column_property(db.Column(db.String(20), default='completed'),  # pending, completed, failed
+                                active_history=True)
     description = db.Column(db.Text)
+    external_id = db.Column(db.String(64))  # Номер документа из банковского реестра
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+class MonthlyBalance(db.Model):
+    # Начислено и оплачено по квартире за месяц (поддерживается reports.py)
+    __table_args__ = (
+        db.Index('uq_monthly_balance_period_apartment', 'period', 'apartment_id', unique=True),
+        db.Index('ix_monthly_balance_apartment_period', 'apartment_id', 'period'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.Date, nullable=False)
+    apartment_id = db.Column(db.Integer, db.ForeignKey('apartment.id', ondelete='CASCADE'), nullable=False)
+    building_id = db.Column(db.Integer, db.ForeignKey('building.id', ondelete='CASCADE'), nullable=False)
+    charged = db.Column(Money(), default=0, nullable=False)
+    paid = db.Column(Money(), default=0, nullable=False)
+
+class MonthlyServiceRevenue(db.Model):
+    # Начислено по услуге в доме за месяц (поддерживается reports.py)
+    __table_args__ = (
+        db.Index('uq_monthly_service_revenue', 'period', 'building_id', 'service_id', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    period = db.Column(db.Date, nullable=False)
+    building_id = db.Column(db.Integer, db.ForeignKey('building.id', ondelete='CASCADE'), nullable=False)
+    service_id = db.Column(db.Integer, db.ForeignKey('service.id', ondelete='CASCADE'), nullable=False)
+    charged = db.Column(Money(), default=0, nullable=False)
+    charges_count = db.Column(db.Integer, default=0, nullable=False)
+
+class ApartmentBalance(db.Model):
+    # Текущее сальдо квартиры (поддерживается ledger.py)
+    __table_args__ = (
+        # Списки должников: debt > 0 по убыванию, в целом и по дому
+        db.Index('ix_apartment_balance_debt', 'debt', 'apartment_id'),
+        db.Index('ix_apartment_balance_building_debt', 'building_id', 'debt', 'apartment_id'),
+    )
+
+    apartment_id = db.Column(db.Integer, db.ForeignKey('apartment.id', ondelete='CASCADE'), primary_key=True)
+    building_id = db.Column(db.Integer, db.ForeignKey('building.id', ondelete='CASCADE'), nullable=False)
+    charged = db.Column(Money(), default=0, nullable=False)  # Всего начислено
+    paid = db.Column(Money(), default=0, nullable=False)  # Всего оплачено
+    debt = db.Column(Money(), default=0, nullable=False)  # charged - paid, < 0 - переплата
+
 class Report(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
@@ -113,4 +263,89 @@ class Report(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    author = db.relationship('User', backref=db.backref('reports', lazy=True))
\ No newline at end of file
+    author = db.relationship('User', backref=db.backref('reports', lazy=True))
+
+class Job(db.Model):
+    # Фоновая задача: расчёт, загрузка реестра, формирование отчета (выполняется jobs.py)
+    __table_args__ = (
+        db.Index('ix_job_status_id', 'status', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # billing, registry_import, report
+    title = db.Column(db.String(200), nullable=False)
+    params = db.Column(db.Text, nullable=False)  # JSON с параметрами
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, done, failed, cancelled
+    progress = db.Column(db.Integer, default=0, nullable=False)  # Сколько обработано
+    total = db.Column(db.Integer)  # Сколько всего, если известно
+    message = db.Column(db.String(300))  # Текущий этап или итог
+    result = db.Column(db.Text)  # JSON с итогами
+    cancel_requested = db.Column(db.Boolean, default=False, nullable=False)
+    worker = db.Column(db.String(100))
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Последний признак жизни обработчика
+    finished_at = db.Column(db.DateTime)
+
+    author = db.relationship('User')
+
+class TableVersion(db.Model):
+    # Счётчик изменений таблицы: ключ кэша фрагментов и ETag страниц (fragments.py)
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+class Statement(db.Model):
+    # Квитанция квартиры за месяц: снимок, записанный при расчёте начислений (statements.py)
+    __table_args__ = (
+        db.Index('uq_statement_apartment_period', 'apartment_id', 'period', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    apartment_id = db.Column(db.Integer, db.ForeignKey('apartment.id', ondelete='CASCADE'), nullable=False)
+    period = db.Column(db.Date, nullable=False)
+    opening_debt = db.Column(Money(), default=0, nullable=False)  # Долг на начало месяца, < 0 - переплата
+    charged = db.Column(Money(), default=0, nullable=False)
+    paid = db.Column(Money(), default=0, nullable=False)
+    closing_debt = db.Column(Money(), default=0, nullable=False)  # К оплате на конец месяца
+    details = db.Column(db.Text, nullable=False)  # JSON: строки начислений и оплаты месяца
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def lines(self):
+        return json.loads(self.details)
+
+class AuditLog(db.Model):
+    # Журнал изменений (audit.py): строки только добавляются, UPDATE и DELETE запрещены триггерами
+    __tablename__ = 'audit_log'
+    __table_args__ = (
+        db.Index('ix_audit_log_entity', 'entity', 'entity_id', 'id'),
+        db.Index('ix_audit_log_created_at', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    entity = db.Column(db.String(30), nullable=False)  # payment, charge, service, building
+    entity_id = db.Column(db.Integer)
+    action = db.Column(db.String(10), nullable=False)  # insert, update, delete
+    changes = db.Column(db.Text, nullable=False)  # JSON: {поле: [было, стало]}
+    user_id = db.Column(db.Integer)  # Без внешнего ключа: запись переживает удаление пользователя
+    username = db.Column(db.String(80))
+    origin = db.Column(db.String(200))  # Адрес запроса, задача или команда
+    created_at = db.Column(db.DateTime, nullable=False)  # Время COMMIT изменения
+
+    @property
+    def diff(self):
+        return json.loads(self.changes)
+
+class ArchivedYear(db.Model):
+    # Год, начисления и платежи которого перенесены в архивные таблицы (archive.py); итоги остаются здесь
+    __tablename__ = 'archived_year'
+
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    until = db.Column(db.Date, nullable=False)  # 1 января следующего года: всё раньше - в архиве
+    charges_count = db.Column(db.Integer, default=0, nullable=False)
+    charges_total = db.Column(Money(), default=0, nullable=False)
+    payments_count = db.Column(db.Integer, default=0, nullable=False)
+    payments_total = db.Column(Money(), default=0, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False)
@@ -0,0 +1,153 @@
+"""Точные денежные величины.
+
+В базе суммы хранятся целыми числами в минимальных единицах (копейки, тысячные
+доли объёма, десятитысячные доли тарифа), в Python - как Decimal. Расчёт
+начислений для пакета квартир выполняется на целых числах: через NumPy, если он
+установлен, иначе построчно; оба пути дают один и тот же результат, что и
+эталонный apply_rate на Decimal.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from sqlalchemy import BigInteger, Float
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator
+
+try:
+    import numpy
+except ImportError:  # NumPy не обязателен - остаётся построчный расчёт
+    numpy = None
+
+MONEY_SCALE = 2  # копейки
+QUANTITY_SCALE = 3  # объём или площадь с точностью до тысячных
+RATE_SCALE = 4  # тариф с точностью до сотых долей копейки
+
+ZERO = Decimal('0.00')
+
+# Операции, в которых число справа - множитель, а не денежная сумма
+_SCALAR_OPERATORS = {operators.mul, operators.truediv, operators.floordiv, operators.mod}
+
+
+def to_decimal(value, scale=MONEY_SCALE):
+    """Decimal с scale знаками после запятой (половина округляется от нуля)."""
+    if value is None:
+        return None
+    if not isinstance(value, Decimal):
+        # str(float) - кратчайшая запись, без хвоста двоичной погрешности
+        try:
+            value = Decimal(str(value).strip().replace('\xa0', '').replace(' ', '').replace(',', '.'))
+        except InvalidOperation:
+            raise ValueError(f'некорректное число "{value}"') from None
+    if not value.is_finite():
+        raise ValueError(f'некорректное число "{value}"')
+    return value.quantize(Decimal(1).scaleb(-scale), rounding=ROUND_HALF_UP)
+
+
+def to_units(value, scale=MONEY_SCALE):
+    if value is None:
+        return None
+    # Быстрые пути для значений, уже кратных единице: результат тот же, что через to_decimal
+    if isinstance(value, Decimal):
+        scaled = value.scaleb(scale)
+        units = int(scaled) if scaled.is_finite() else None
+        if units == scaled:
+            return units
+    elif isinstance(value, (int, float)):
+        scaled = value * 10 ** scale
+        units = round(scaled)
+        if abs(scaled) < 1e9 and abs(scaled - units) < 1e-6:
+            return units
+    return int(to_decimal(value, scale).scaleb(scale))
+
+
+def from_units(units, scale=MONEY_SCALE):
+    if units is None:
+        return None
+    if not isinstance(units, int):
+        # AVG или умножение на дробь в SQL возвращают нецелое число единиц
+        units = Decimal(str(units)).to_integral_value(rounding=ROUND_HALF_UP)
+    return Decimal(units).scaleb(-scale)
+
+
+class FixedPoint(TypeDecorator):
+    """Decimal с фиксированным числом знаков, хранимый целым числом единиц."""
+
+    impl = BigInteger
+    cache_ok = True
+
+    class Comparator(TypeDecorator.Comparator):
+        def _adapt_expression(self, op, other_comparator):
+            # charged - paid остаётся суммой, а не целым числом копеек
+            other = other_comparator.type
+            if op in (operators.add, operators.sub) and getattr(other, 'scale', None) == self.type.scale:
+                return op, self.type
+            return super()._adapt_expression(op, other_comparator)
+
+    comparator_factory = Comparator
+
+    def __init__(self, scale=MONEY_SCALE):
+        super().__init__()
+        self.scale = scale
+
+    def process_bind_param(self, value, dialect):
+        return to_units(value, self.scale)
+
+    def process_result_value(self, value, dialect):
+        return from_units(value, self.scale)
+
+    @property
+    def python_type(self):
+        return Decimal
+
+    def coerce_compared_value(self, op, value):
+        # total * 0.5 - умножение на число, а не на сумму в копейках
+        if op in _SCALAR_OPERATORS:
+            return Float()
+        return self
+
+
+class Money(FixedPoint):
+    cache_ok = True
+
+    def __init__(self):
+        super().__init__(MONEY_SCALE)
+
+
+class Quantity(FixedPoint):
+    cache_ok = True
+
+    def __init__(self):
+        super().__init__(QUANTITY_SCALE)
+
+
+class Rate(FixedPoint):
+    cache_ok = True
+
+    def __init__(self):
+        super().__init__(RATE_SCALE)
+
+
+# Единицы произведения объёма на тариф - в копейки
+_PRODUCT_SHIFT = 10 ** (QUANTITY_SCALE + RATE_SCALE - MONEY_SCALE)
+
+
+def apply_rate(amount, rate):
+    """Эталон: сумма начисления amount * rate, округлённая до копеек."""
+    return to_decimal(to_decimal(amount, QUANTITY_SCALE) * to_decimal(rate, RATE_SCALE))
+
+
+def _round_units(product):
+    # Половина копейки округляется от нуля, как ROUND_HALF_UP в Decimal
+    half = _PRODUCT_SHIFT // 2
+    if product < 0:
+        return -((-product + half) // _PRODUCT_SHIFT)
+    return (product + half) // _PRODUCT_SHIFT
+
+
+def apply_rates(amount_units, rate_units):
+    """Суммы начислений в копейках для списка объёмов (в тысячных) по одному тарифу."""
+    if numpy is not None and len(amount_units) > 1:
+        products = numpy.asarray(amount_units, dtype=numpy.int64) * numpy.int64(rate_units)
+        half = _PRODUCT_SHIFT // 2
+        rounded = (numpy.abs(products) + half) // _PRODUCT_SHIFT
+        return (numpy.sign(products) * rounded).tolist()
+    return [_round_units(units * rate_units) for units in amount_units]
@@ -0,0 +1,139 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import abort, current_app, request, url_for
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class KeysetPage:
+    """Страница выборки с курсорами на соседние страницы."""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None, page_size=DEFAULT_PAGE_SIZE):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.page_size = page_size
+        self.next_url = None
+        self.prev_url = None
+        self.first_url = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def _dump(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _load(value, column):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(item, columns):
+    values = [_dump(getattr(item, column.key)) for column in columns]
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(columns):
+            raise ValueError(cursor)
+        return [_load(value, column) for value, column in zip(values, columns)]
+    except (ValueError, TypeError):
+        raise ValueError(f'Некорректный курсор: {cursor}') from None
+
+
+def _seek(columns, values, forward):
+    # (c1, c2) > (v1, v2)  ->  c1 > v1 OR (c1 = v1 AND c2 > v2)
+    clauses = []
+    for index, column in enumerate(columns):
+        equal = [columns[i] == values[i] for i in range(index)]
+        step = column > values[index] if forward else column < values[index]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def keyset_paginate(query, columns, descending=False, after=None, before=None,
+                    page_size=DEFAULT_PAGE_SIZE):
+    """Выбирает страницу query по ключу columns (последняя колонка уникальна, все - NOT NULL:
+    строки с NULL в ключе не прошли бы сравнение с курсором и выпали бы из списка).
+
+    after/before - курсоры из KeysetPage; запрос стоит O(page_size)
+    независимо от того, насколько далеко страница от начала.
+    """
+    backwards = bool(before) and not after
+    cursor = before if backwards else after
+    # При листании назад порядок обращается, а строки потом переворачиваются
+    forward = descending == backwards
+
+    if cursor:
+        query = query.filter(_seek(columns, decode_cursor(cursor, columns), forward))
+    order = [column.asc() if forward else column.desc() for column in columns]
+    rows = query.order_by(*order).limit(page_size + 1).all()
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    # Листая назад, мы пришли со следующей страницы - она точно есть
+    more_after = True if backwards else has_more
+    more_before = has_more if backwards else bool(cursor)
+
+    page = KeysetPage(rows, page_size=page_size)
+    if rows and more_after:
+        page.next_cursor = encode_cursor(rows[-1], columns)
+    if rows and more_before:
+        page.prev_cursor = encode_cursor(rows[0], columns)
+    return page
+
+
+def page_size_arg():
+    default = current_app.config.get('ADMIN_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    size = request.args.get('per_page', default, type=int)
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate_request(query, columns, descending=False):
+    """keyset_paginate с курсорами и размером страницы из request.args."""
+    try:
+        page = keyset_paginate(
+            query, columns, descending=descending,
+            after=request.args.get('after'),
+            before=request.args.get('before'),
+            page_size=page_size_arg(),
+        )
+    except ValueError as e:
+        abort(400, str(e))
+
+    args = {key: value for key, value in request.args.items() if key not in ('after', 'before')}
+    page.first_url = url_for(request.endpoint, **args)
+    if page.has_next:
+        page.next_url = url_for(request.endpoint, after=page.next_cursor, **args)
+    if page.has_prev:
+        page.prev_url = url_for(request.endpoint, before=page.prev_cursor, **args)
+    return page
@@ -0,0 +1,151 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from sqlalchemy import update, select
+from sqlalchemy.orm import aliased
+
+from models import db, Apartment, Service, MeterReading, upsert
+
+# Сколько показаний записывается одним INSERT
+BATCH_SIZE = 5000
+
+# Сколько ошибок строк сохраняется в отчете
+MAX_ERRORS = 100
+
+
+class ReadingsImport:
+    """Итоги загрузки показаний."""
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.errors = []
+        self.periods = set()
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'Строка {line}: {message}')
+
+    def summary(self):
+        return f'принято {self.accepted}, отклонено {self.rejected}'
+
+
+def parse_period(value):
+    value = str(value).strip()
+    for fmt in ('%Y-%m', '%Y-%m-%d', '%m.%Y', '%d.%m.%Y'):
+        try:
+            parsed = datetime.strptime(value, fmt).date()
+            return date(parsed.year, parsed.month, 1)
+        except ValueError:
+            continue
+    raise ValueError(f'некорректный период "{value}"')
+
+
+def read_rows(stream, filename):
+    """Строки файла показаний (CSV или JSON) в виде словарей."""
+    if filename.lower().endswith(('.json', '.jsonl')):
+        text = stream.read().decode('utf-8-sig')
+        if text.lstrip().startswith('['):
+            yield from json.loads(text)
+        else:
+            for line in text.splitlines():
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    header = text.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    fields = [name.strip() for name in next(csv.reader([header], delimiter=delimiter))]
+    yield from csv.DictReader(text, fieldnames=fields, delimiter=delimiter)
+
+
+def _validate(rows, report, apartment_ids, service_ids):
+    for line, row in enumerate(rows, start=2):
+        try:
+            apartment_id = int(row['apartment_id'])
+            service_id = int(row['service_id'])
+            period = parse_period(row['period'])
+            value = float(str(row['value']).replace(',', '.'))
+        except KeyError as e:
+            report.reject(line, f'нет поля {e}')
+            continue
+        except (TypeError, ValueError) as e:
+            report.reject(line, str(e))
+            continue
+
+        if apartment_id not in apartment_ids:
+            report.reject(line, f'квартира {apartment_id} не найдена')
+        elif service_id not in service_ids:
+            report.reject(line, f'услуга {service_id} не найдена или не по счетчику')
+        elif value < 0:
+            report.reject(line, 'отрицательное показание')
+        else:
+            yield {'apartment_id': apartment_id, 'service_id': service_id,
+                   'period': period, 'value': value}
+
+
+def update_consumption(service_ids, since):
+    """Пересчитывает расход как разницу с предыдущим показанием одним UPDATE."""
+    previous = aliased(MeterReading)
+    previous_value = (
+        select(previous.value)
+        .where(previous.apartment_id == MeterReading.apartment_id,
+               previous.service_id == MeterReading.service_id,
+               previous.period < MeterReading.period)
+        .order_by(previous.period.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    db.session.execute(
+        update(MeterReading)
+        .where(MeterReading.service_id.in_(service_ids), MeterReading.period >= since)
+        .values(consumption=MeterReading.value - previous_value)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def import_readings(rows, batch_size=BATCH_SIZE):
+    """Проверяет и записывает показания пакетами; повторная загрузка перезаписывает значения."""
+    report = ReadingsImport()
+    apartment_ids = set(db.session.scalars(select(Apartment.id)))
+    service_ids = set(db.session.scalars(select(Service.id).where(Service.is_counter.is_(True))))
+
+    statement = upsert(MeterReading, ['apartment_id', 'service_id', 'period'], ['value'])
+    connection = db.session.connection()
+    created_at = datetime.utcnow()
+    touched_services = set()
+
+    batch = []
+    for row in _validate(rows, report, apartment_ids, service_ids):
+        row['created_at'] = created_at
+        batch.append(row)
+        report.periods.add(row['period'])
+        touched_services.add(row['service_id'])
+        if len(batch) >= batch_size:
+            connection.execute(statement, batch)
+            report.accepted += len(batch)
+            batch = []
+    if batch:
+        connection.execute(statement, batch)
+        report.accepted += len(batch)
+
+    if report.accepted:
+        # Загрузка за прошлый период меняет и расход последующих
+        update_consumption(touched_services, min(report.periods))
+    db.session.commit()
+    return report
+
+
+def consumption_for(period, service_ids, building_id=None):
+    """{(apartment_id, service_id): расход} за период для расчёта начислений."""
+    query = db.session.query(
+        MeterReading.apartment_id, MeterReading.service_id, MeterReading.consumption
+    ).filter(MeterReading.period == period, MeterReading.service_id.in_(service_ids))
+    if building_id:
+        query = query.join(Apartment).filter(Apartment.building_id == building_id)
+    return {(apartment_id, service_id): max(consumption or 0, 0)
+            for apartment_id, service_id, consumption in query}
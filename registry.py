@@ -0,0 +1,315 @@
+import csv
+import hashlib
+import io
+import re
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from sqlalchemy import select
+
+from models import db, Apartment, Building, Payment, insert_ignore
+from money import ZERO, to_decimal
+from stats import dashboard_stats
+from reports import PAID_STATUS, post_payments as post_monthly_payments
+from ledger import post_payments as post_ledger_payments
+
+# Сколько платежей записывается одним INSERT
+BATCH_SIZE = 5000
+
+# Сколько строк каждой категории сохраняется в отчете
+MAX_LINES = 100
+
+# Допустимые заголовки колонок реестра
+COLUMNS = {
+    'date': ('date', 'дата', 'дата платежа', 'дата операции'),
+    'address': ('address', 'адрес', 'адрес дома'),
+    'apartment': ('apartment', 'квартира', 'кв', 'номер квартиры'),
+    'amount': ('amount', 'сумма', 'сумма платежа'),
+    # Номер строки реестра (id, №) не номер документа: в каждом файле он начинается с 1
+    'reference': ('reference', 'номер документа', 'документ', 'номер платежа'),
+    'payer': ('payer', 'плательщик', 'фио'),
+}
+REQUIRED = ('date', 'address', 'apartment', 'amount')
+
+DATE_FORMATS = ('%d.%m.%Y', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%d.%m.%y')
+
+# Ключ платежа в Payment.external_id не длиннее колонки
+EXTERNAL_ID_LENGTH = 64
+
+# Слова, которые в реестрах банков пишут по-разному или пропускают
+ADDRESS_STOPWORDS = {'г', 'город', 'ул', 'улица', 'д', 'дом'}
+
+
+class RegistryImport:
+    """Итоги загрузки реестра платежей."""
+
+    def __init__(self, filename, source=None):
+        self.filename = filename
+        self.source = source
+        self.lines = 0
+        self.matched = 0
+        self.amount = ZERO
+        self.duplicates = 0
+        self.suspected = 0
+        self.unmatched = 0
+        self.invalid = 0
+        self.unmatched_lines = []
+        self.suspected_lines = []
+        self.invalid_lines = []
+        self.elapsed = 0.0
+
+    def unmatch(self, line, address, apartment, amount):
+        self.unmatched += 1
+        if len(self.unmatched_lines) < MAX_LINES:
+            self.unmatched_lines.append((line, address, apartment, amount))
+
+    def suspect(self, line, address, apartment, paid_at, amount):
+        self.suspected += 1
+        if len(self.suspected_lines) < MAX_LINES:
+            self.suspected_lines.append((line, address, apartment, paid_at, amount))
+
+    def reject(self, line, message):
+        self.invalid += 1
+        if len(self.invalid_lines) < MAX_LINES:
+            self.invalid_lines.append(f'Строка {line}: {message}')
+
+    def summary(self):
+        return (f'строк {self.lines}: загружено {self.matched} на {self.amount:.2f} ₽, '
+                f'не найдено квартир {self.unmatched}, дублей {self.duplicates}, '
+                f'возможных дублей {self.suspected}, '
+                f'ошибок {self.invalid} за {self.elapsed:.2f} с')
+
+
+# Адреса, номера квартир и даты в реестре повторяются - разбор кэшируется
+@lru_cache(maxsize=65536)
+def normalize_address(address):
+    words = re.findall(r'[0-9a-zа-я]+', str(address).lower().replace('ё', 'е'))
+    return ' '.join(word for word in words if word not in ADDRESS_STOPWORDS)
+
+
+@lru_cache(maxsize=65536)
+def normalize_number(number):
+    words = re.findall(r'[0-9a-zа-я]+', str(number).lower().replace('ё', 'е'))
+    return ''.join(word for word in words if word not in ('кв', 'квартира'))
+
+
+def apartment_index():
+    """{(адрес, номер квартиры): (apartment_id, building_id)} одним запросом."""
+    rows = db.session.execute(
+        select(Building.address, Apartment.number, Apartment.id, Apartment.building_id)
+        .join(Building, Apartment.building_id == Building.id)
+    )
+    return {(normalize_address(address), normalize_number(number)): (apartment_id, building_id)
+            for address, number, apartment_id, building_id in rows}
+
+
+def _text_stream(stream):
+    # Банки выгружают реестры в UTF-8 или Windows-1251
+    sample = stream.read(64 * 1024)
+    stream.seek(0)
+    encoding = 'utf-8-sig'
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Ошибка только в обрезанном последнем символе образца - это всё же UTF-8
+        if e.start < len(sample) - 3:
+            encoding = 'cp1251'
+    return io.TextIOWrapper(stream, encoding=encoding, newline='')
+
+
+def read_registry(stream):
+    """Строки реестра (CSV с заголовком) в виде словарей с полями COLUMNS."""
+    text = _text_stream(stream)
+    header = text.readline()
+    delimiter = ';' if header.count(';') >= header.count(',') else ','
+    names = [name.strip().lower() for name in next(csv.reader([header], delimiter=delimiter))]
+
+    positions = {}
+    for field, aliases in COLUMNS.items():
+        for position, name in enumerate(names):
+            if name in aliases:
+                positions[field] = position
+                break
+    missing = [field for field in REQUIRED if field not in positions]
+    if missing:
+        text.detach()
+        raise ValueError(f'В заголовке реестра нет колонок: {", ".join(missing)}')
+
+    try:
+        for values in csv.reader(text, delimiter=delimiter):
+            if not any(value.strip() for value in values):
+                continue
+            yield {field: values[position].strip() if position < len(values) else ''
+                   for field, position in positions.items()}
+    finally:
+        # Иначе обёртка закроет файл загрузки вместе с собой
+        text.detach()
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f'некорректная дата "{value}"')
+
+
+def parse_amount(value):
+    try:
+        amount = to_decimal(value)
+    except ValueError:
+        raise ValueError(f'некорректная сумма "{value}"') from None
+    if amount <= 0:
+        raise ValueError(f'сумма должна быть больше нуля: {value}')
+    return amount
+
+
+def _key(*parts):
+    raw = '|'.join(str(part) for part in parts)
+    return 'sha1:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _external_id(row, line, source, filename, paid_at, apartment_id, amount):
+    """Ключ платежа для отсечения повторной загрузки.
+
+    Номер документа уникален только в пределах банка, поэтому ключ включает
+    источник (банк, а если он не указан - имя файла). Без номера документа
+    ключ строится по строке файла: повторная загрузка того же файла отсекается,
+    а два одинаковых платежа в одном реестре загружаются оба.
+    """
+    if row.get('reference'):
+        external_id = f'{source or filename}:{row["reference"]}'
+        if len(external_id) <= EXTERNAL_ID_LENGTH:
+            return external_id
+        return _key(source or filename, row['reference'])
+    return _key(source or '', filename, line, paid_at.isoformat(), apartment_id, f'{amount:.2f}', row.get('payer', ''))
+
+
+def _same_payments(batch):
+    """{(квартира, день, сумма)} уже загруженных платежей по квартирам и дням пакета."""
+    days = [row['date'].date() for row in batch]
+    rows = db.session.execute(
+        select(Payment.apartment_id, Payment.date, Payment.amount).where(
+            Payment.apartment_id.in_({row['apartment_id'] for row in batch}),
+            Payment.date >= datetime.combine(min(days), datetime.min.time()),
+            Payment.date < datetime.combine(max(days) + timedelta(days=1), datetime.min.time()),
+        )
+    )
+    return {(apartment_id, paid_at.date(), amount) for apartment_id, paid_at, amount in rows}
+
+
+def _insert(batch, lines, report, statement, buildings, posted, loaded):
+    """Вставляет пакет; lines - {external_id: (строка, адрес, квартира)} строк без номера документа."""
+    connection = db.session.connection()
+    # Уже загруженные ранее документы отсекаются одним запросом по уникальному индексу
+    existing = set(db.session.scalars(
+        select(Payment.external_id).where(Payment.external_id.in_([row['external_id'] for row in batch]))
+    ))
+    rows = [row for row in batch if row['external_id'] not in existing]
+    report.duplicates += len(batch) - len(rows)
+    if not rows:
+        return
+
+    # Платеж без номера документа, совпадающий с уже загруженным по квартире, дню и сумме,
+    # не отбрасывается, а попадает в отчет для ручной проверки
+    unreferenced = [row for row in rows if row['external_id'] in lines]
+    same = _same_payments(unreferenced) if unreferenced else set()
+    suspected = set()
+    for row in unreferenced:
+        key = (row['apartment_id'], row['date'].date(), row['amount'])
+        if key in same or key in loaded:
+            suspected.add(row['external_id'])
+        loaded.add(key)
+
+    # RETURNING отдаёт только вставленные строки - на случай параллельной загрузки
+    inserted = connection.execute(statement, rows).all()
+    report.duplicates += len(rows) - len(inserted)
+    report.matched += len(inserted)
+    for external_id, apartment_id, paid_at, amount in inserted:
+        report.amount += amount
+        posted.append({'apartment_id': apartment_id, 'building_id': buildings[apartment_id],
+                       'date': paid_at, 'amount': amount})
+        if external_id in suspected:
+            line, address, apartment = lines[external_id]
+            report.suspect(line, address, apartment, paid_at, amount)
+
+
+def import_registry(stream, filename, source=None, batch_size=BATCH_SIZE, progress=None):
+    """Загружает реестр платежей банка пакетами в одной транзакции и возвращает RegistryImport.
+
+    source - банк или другой источник реестра, в пределах которого уникальны номера документов.
+    progress(байт прочитано, размер файла, сообщение) вызывается после каждого пакета.
+    """
+    started = time.perf_counter()
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(0)
+    source = (source or '').strip()
+    report = RegistryImport(filename, source)
+    index = apartment_index()
+    buildings = dict(index.values())
+
+    statement = insert_ignore(Payment).returning(Payment.external_id, Payment.apartment_id, Payment.date,
+                                                 Payment.amount)
+    created_at = datetime.utcnow()
+    description = f'Реестр {source}, {filename}' if source else f'Реестр {filename}'
+    seen = set()
+    loaded = set()
+    posted = []
+
+    batch = []
+    lines = {}
+    for line, row in enumerate(read_registry(stream), start=2):
+        report.lines += 1
+        try:
+            paid_at = parse_date(row['date'])
+            amount = parse_amount(row['amount'])
+        except ValueError as e:
+            report.reject(line, str(e))
+            continue
+
+        target = index.get((normalize_address(row['address']), normalize_number(row['apartment'])))
+        if target is None:
+            report.unmatch(line, row['address'], row['apartment'], amount)
+            continue
+
+        apartment_id = target[0]
+        external_id = _external_id(row, line, source, filename, paid_at, apartment_id, amount)
+        if external_id in seen:
+            report.duplicates += 1
+            continue
+        seen.add(external_id)
+
+        batch.append({
+            'apartment_id': apartment_id,
+            'amount': amount,
+            'date': paid_at,
+            'payment_method': 'bank',
+            'status': PAID_STATUS,
+            'description': f'{description}, {row["payer"]}' if row.get('payer') else description,
+            'external_id': external_id,
+            'created_at': created_at,
+        })
+        if not row.get('reference'):
+            lines[external_id] = (line, row['address'], row['apartment'])
+        if len(batch) >= batch_size:
+            _insert(batch, lines, report, statement, buildings, posted, loaded)
+            batch = []
+            lines = {}
+            if progress:
+                progress(stream.tell(), size, f'Обработано строк: {report.lines}')
+    if batch:
+        _insert(batch, lines, report, statement, buildings, posted, loaded)
+
+    # Пакетная вставка идёт в обход событий ORM - проводим оплаты явно
+    if posted:
+        post_monthly_payments(posted)
+        post_ledger_payments(posted)
+    db.session.commit()
+    if posted:
+        dashboard_stats.invalidate()
+
+    report.elapsed = time.perf_counter() - started
+    return report
@@ -0,0 +1,357 @@
+import json
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import case, delete, event, func, inspect, literal, select, true, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import (db, Apartment, Building, Service, Charge, Payment, Report, ApartmentBalance,
+                    MonthlyBalance, MonthlyServiceRevenue, upsert_increment)
+from archive import archived_years, with_archive_parts
+
+REPORT_TYPES = {
+    'building_balance': 'Начислено и оплачено по домам',
+    'apartment_debt': 'Задолженность по квартирам',
+    'service_revenue': 'Начисления по услугам',
+}
+
+# Статус платежа, который учитывается как оплата
+PAID_STATUS = 'completed'
+
+
+def month_start(value):
+    if value is None:
+        return None
+    return date(value.year, value.month, 1)
+
+
+def _month_start_sql(column, dialect):
+    if dialect == 'postgresql':
+        return func.cast(func.date_trunc('month', column), db.Date)
+    return func.date(column, 'start of month')
+
+
+# --- Инкрементальное обновление по событиям ORM ---
+
+def old_value(obj, attr):
+    """Значение атрибута до flush (для новых объектов - текущее)."""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return inspect(obj).dict.get(attr)
+
+
+def new_value(obj, attr):
+    return inspect(obj).dict.get(attr)
+
+
+def _charge_part(obj, value):
+    apartment_id, period, total = value(obj, 'apartment_id'), value(obj, 'period'), value(obj, 'total')
+    # Нулевое начисление (счётчик без расхода) тоже считается в charges_count, как в refresh_charges
+    if apartment_id is None or period is None or total is None:
+        return None
+    return apartment_id, value(obj, 'service_id'), month_start(period), total
+
+
+def _payment_part(obj, value):
+    if value(obj, 'status') != PAID_STATUS:
+        return None
+    apartment_id, paid_at, amount = value(obj, 'apartment_id'), value(obj, 'date'), value(obj, 'amount')
+    if apartment_id is None or paid_at is None or not amount:
+        return None
+    return apartment_id, month_start(paid_at), amount
+
+
+class _Deltas:
+    def __init__(self):
+        self.balance = defaultdict(lambda: {'charged': 0, 'paid': 0})
+        self.revenue = defaultdict(lambda: {'charged': 0, 'charges_count': 0})
+        self.apartments = set()
+
+    def charge(self, part, sign):
+        if part:
+            apartment_id, service_id, period, total = part
+            self.balance[(period, apartment_id)]['charged'] += sign * total
+            self.revenue[(period, apartment_id, service_id)]['charged'] += sign * total
+            self.revenue[(period, apartment_id, service_id)]['charges_count'] += sign
+            self.apartments.add(apartment_id)
+
+    def payment(self, part, sign):
+        if part:
+            apartment_id, period, amount = part
+            self.balance[(period, apartment_id)]['paid'] += sign * amount
+            self.apartments.add(apartment_id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_balances(session, flush_context):
+    deltas = _Deltas()
+    removed_apartments = {}
+    removed_buildings = set()
+
+    for obj in session.new:
+        if isinstance(obj, Charge):
+            deltas.charge(_charge_part(obj, new_value), 1)
+        elif isinstance(obj, Payment):
+            deltas.payment(_payment_part(obj, new_value), 1)
+    for obj in session.dirty:
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, Charge):
+            deltas.charge(_charge_part(obj, old_value), -1)
+            deltas.charge(_charge_part(obj, new_value), 1)
+        elif isinstance(obj, Payment):
+            deltas.payment(_payment_part(obj, old_value), -1)
+            deltas.payment(_payment_part(obj, new_value), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Charge):
+            deltas.charge(_charge_part(obj, old_value), -1)
+        elif isinstance(obj, Payment):
+            deltas.payment(_payment_part(obj, old_value), -1)
+        elif isinstance(obj, Apartment):
+            removed_apartments[obj.id] = old_value(obj, 'building_id')
+        elif isinstance(obj, Building):
+            removed_buildings.add(obj.id)
+
+    connection = session.connection()
+    if removed_apartments:
+        connection.execute(delete(MonthlyBalance).where(MonthlyBalance.apartment_id.in_(removed_apartments)))
+    if removed_buildings:
+        connection.execute(delete(MonthlyServiceRevenue)
+                           .where(MonthlyServiceRevenue.building_id.in_(removed_buildings)))
+
+    if not deltas.apartments:
+        return
+    buildings = dict(removed_apartments)
+    buildings.update(connection.execute(
+        select(Apartment.id, Apartment.building_id)
+        .where(Apartment.id.in_(deltas.apartments - set(removed_apartments)))
+    ).all())
+
+    balance_rows = [
+        {'period': period, 'apartment_id': apartment_id, 'building_id': buildings[apartment_id], **values}
+        for (period, apartment_id), values in deltas.balance.items()
+        if apartment_id in buildings and apartment_id not in removed_apartments
+    ]
+    revenue = defaultdict(lambda: {'charged': 0, 'charges_count': 0})
+    for (period, apartment_id, service_id), values in deltas.revenue.items():
+        if apartment_id in buildings:
+            bucket = revenue[(period, buildings[apartment_id], service_id)]
+            bucket['charged'] += values['charged']
+            bucket['charges_count'] += values['charges_count']
+    revenue_rows = [
+        {'period': period, 'building_id': building_id, 'service_id': service_id, **values}
+        for (period, building_id, service_id), values in revenue.items()
+        if building_id not in removed_buildings
+    ]
+
+    if balance_rows:
+        connection.execute(upsert_increment(MonthlyBalance, ['period', 'apartment_id'],
+                                            ['charged', 'paid']), balance_rows)
+    if revenue_rows:
+        connection.execute(upsert_increment(MonthlyServiceRevenue,
+                                            ['period', 'building_id', 'service_id'],
+                                            ['charged', 'charges_count']), revenue_rows)
+
+
+# --- Пересчёт по таблицам начислений и платежей ---
+
+def refresh_charges(period, building_id=None):
+    """Пересчитывает начисленные суммы за период из Charge (после пакетных вставок)."""
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+
+    reset = update(MonthlyBalance).where(MonthlyBalance.period == period).values(charged=0)
+    clear = delete(MonthlyServiceRevenue).where(MonthlyServiceRevenue.period == period)
+    charges = select(Charge.apartment_id, Apartment.building_id, Charge.service_id, Charge.total) \
+        .join(Apartment, Charge.apartment_id == Apartment.id).where(Charge.period == period)
+    if building_id:
+        apartments = select(Apartment.id).where(Apartment.building_id == building_id)
+        reset = reset.where(MonthlyBalance.apartment_id.in_(apartments))
+        clear = clear.where(MonthlyServiceRevenue.building_id == building_id)
+        # Расчёт по домам вызывает это для каждого дома: начисления ищутся по квартирам дома
+        # (начало уникального индекса), а не перебором всех начислений периода
+        charges = charges.where(Charge.apartment_id.in_(apartments))
+    connection.execute(reset)
+    connection.execute(clear)
+    charges = charges.subquery()
+
+    balance = insert(MonthlyBalance).from_select(
+        ['period', 'apartment_id', 'building_id', 'charged', 'paid'],
+        select(literal(period, db.Date), charges.c.apartment_id, charges.c.building_id,
+               func.sum(charges.c.total), literal(0))
+        # WHERE обязателен для INSERT ... SELECT ... ON CONFLICT в SQLite
+        .where(true())
+        .group_by(charges.c.apartment_id, charges.c.building_id),
+    )
+    connection.execute(balance.on_conflict_do_update(
+        index_elements=['period', 'apartment_id'],
+        set_={'charged': balance.excluded.charged},
+    ))
+    connection.execute(insert(MonthlyServiceRevenue).from_select(
+        ['period', 'building_id', 'service_id', 'charged', 'charges_count'],
+        select(literal(period, db.Date), charges.c.building_id, charges.c.service_id,
+               func.sum(charges.c.total), func.count())
+        .group_by(charges.c.building_id, charges.c.service_id),
+    ))
+
+
+def post_payments(payments):
+    """Добавляет к агрегатам оплаты, вставленные пакетно в обход ORM (реестры банка).
+
+    payments - словари с apartment_id, building_id, date и amount.
+    """
+    paid = defaultdict(Decimal)
+    for payment in payments:
+        paid[(month_start(payment['date']), payment['apartment_id'], payment['building_id'])] += payment['amount']
+    if not paid:
+        return
+    db.session.connection().execute(
+        upsert_increment(MonthlyBalance, ['period', 'apartment_id'], ['charged', 'paid']),
+        [{'period': period, 'apartment_id': apartment_id, 'building_id': building_id,
+          'charged': 0, 'paid': amount}
+         for (period, apartment_id, building_id), amount in paid.items()],
+    )
+
+
+def rebuild_balances():
+    """Полностью перестраивает агрегаты по всей истории начислений и платежей, включая архив."""
+    connection = db.session.connection()
+    dialect = connection.dialect.name
+    connection.execute(delete(MonthlyBalance))
+    connection.execute(delete(MonthlyServiceRevenue))
+
+    years = archived_years()
+    charges = select(Charge.period.label('period'), Charge.apartment_id.label('apartment_id'),
+                     Charge.service_id.label('service_id'), Charge.total.label('total'))
+    charges = union_all(*with_archive_parts(charges, Charge, years)).subquery()
+    payments = select(Payment.date, Payment.apartment_id, Payment.amount) \
+        .where(Payment.status == PAID_STATUS, Payment.date.isnot(None))
+    payments = union_all(*with_archive_parts(payments, Payment, years)).subquery()
+
+    parts = union_all(
+        select(charges.c.period.label('period'), charges.c.apartment_id.label('apartment_id'),
+               charges.c.total.label('charged'), literal(0).label('paid')),
+        select(_month_start_sql(payments.c.date, dialect), payments.c.apartment_id,
+               literal(0), payments.c.amount),
+    ).subquery()
+    connection.execute(db.insert(MonthlyBalance).from_select(
+        ['period', 'apartment_id', 'building_id', 'charged', 'paid'],
+        select(parts.c.period, parts.c.apartment_id, Apartment.building_id,
+               func.sum(parts.c.charged), func.sum(parts.c.paid))
+        .join(Apartment, parts.c.apartment_id == Apartment.id)
+        .group_by(parts.c.period, parts.c.apartment_id, Apartment.building_id),
+    ))
+    connection.execute(db.insert(MonthlyServiceRevenue).from_select(
+        ['period', 'building_id', 'service_id', 'charged', 'charges_count'],
+        select(charges.c.period, Apartment.building_id, charges.c.service_id,
+               func.sum(charges.c.total), func.count())
+        .join(Apartment, charges.c.apartment_id == Apartment.id)
+        .group_by(charges.c.period, Apartment.building_id, charges.c.service_id),
+    ))
+
+
+# --- Построение отчетов по агрегатам ---
+
+def building_balance(period, building_id=None):
+    query = db.session.query(
+        Building.address,
+        func.count(MonthlyBalance.id),
+        func.sum(MonthlyBalance.charged),
+        func.sum(MonthlyBalance.paid),
+    ).join(Building, MonthlyBalance.building_id == Building.id).filter(MonthlyBalance.period == period)
+    if building_id:
+        query = query.filter(MonthlyBalance.building_id == building_id)
+    rows = [[address, count, round(charged, 2), round(paid, 2), round(charged - paid, 2)]
+            for address, count, charged, paid in query.group_by(Building.address).order_by(Building.address)]
+    return {
+        'columns': ['Дом', 'Квартир', 'Начислено', 'Оплачено', 'Разница'],
+        'rows': rows,
+        'totals': ['Итого', sum(r[1] for r in rows), round(sum(r[2] for r in rows), 2),
+                   round(sum(r[3] for r in rows), 2), round(sum(r[4] for r in rows), 2)],
+    }
+
+
+def apartment_debt(period, building_id=None):
+    # Долг на конец периода - текущее сальдо без движений после периода: за текущий
+    # месяц это одна строка ApartmentBalance, а не сумма по всей истории квартиры
+    later = select(
+        MonthlyBalance.apartment_id,
+        func.sum(MonthlyBalance.charged - MonthlyBalance.paid).label('delta'),
+    ).where(MonthlyBalance.period > period).group_by(MonthlyBalance.apartment_id).subquery()
+    debt = ApartmentBalance.debt - func.coalesce(later.c.delta, 0)
+    query = db.session.query(
+        Building.address,
+        Apartment.number,
+        func.coalesce(MonthlyBalance.charged, 0),
+        func.coalesce(MonthlyBalance.paid, 0),
+        debt,
+    ).select_from(ApartmentBalance) \
+        .join(Apartment, ApartmentBalance.apartment_id == Apartment.id) \
+        .join(Building, ApartmentBalance.building_id == Building.id) \
+        .outerjoin(MonthlyBalance, (MonthlyBalance.apartment_id == ApartmentBalance.apartment_id)
+                   & (MonthlyBalance.period == period)) \
+        .outerjoin(later, later.c.apartment_id == ApartmentBalance.apartment_id) \
+        .filter(debt > 0)
+    if building_id:
+        query = query.filter(ApartmentBalance.building_id == building_id)
+    query = query.order_by(debt.desc())
+    rows = [[address, number, round(charged, 2), round(paid, 2), round(total, 2)]
+            for address, number, charged, paid, total in query]
+    return {
+        'columns': ['Дом', 'Квартира', 'Начислено за период', 'Оплачено за период', 'Долг на конец периода'],
+        'rows': rows,
+        'totals': ['Итого', len(rows), round(sum(r[2] for r in rows), 2),
+                   round(sum(r[3] for r in rows), 2), round(sum(r[4] for r in rows), 2)],
+    }
+
+
+def service_revenue(period, building_id=None):
+    query = db.session.query(
+        Service.name,
+        func.sum(MonthlyServiceRevenue.charges_count),
+        func.sum(MonthlyServiceRevenue.charged),
+    ).join(Service, MonthlyServiceRevenue.service_id == Service.id) \
+        .filter(MonthlyServiceRevenue.period == period)
+    if building_id:
+        query = query.filter(MonthlyServiceRevenue.building_id == building_id)
+    rows = [[name, count, round(charged, 2)]
+            for name, count, charged in query.group_by(Service.name).order_by(Service.name)]
+    return {
+        'columns': ['Услуга', 'Начислений', 'Сумма'],
+        'rows': rows,
+        'totals': ['Итого', sum(r[1] for r in rows), round(sum(r[2] for r in rows), 2)],
+    }
+
+
+BUILDERS = {
+    'building_balance': building_balance,
+    'apartment_debt': apartment_debt,
+    'service_revenue': service_revenue,
+}
+
+
+def build_report(report_type, period, building_id=None):
+    """Данные сформированного отчета: {'columns': [...], 'rows': [...], 'totals': [...]}."""
+    return BUILDERS[report_type](month_start(period), building_id)
+
+
+def save_report(report_type, period, building_id, title, user_id):
+    """Строит отчет и сохраняет его данные в Report.content (JSON, суммы - строками)."""
+    data = build_report(report_type, period, building_id)
+    report = Report(
+        title=title or f'{REPORT_TYPES[report_type]} за {period:%m.%Y}',
+        content=json.dumps(data, ensure_ascii=False, default=str),
+        report_type=report_type,
+        period=month_start(period),
+        created_by=user_id,
+        created_at=datetime.utcnow(),
+    )
+    db.session.add(report)
+    db.session.commit()
+    return report
@@ -0,0 +1,77 @@
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import login_required, current_user, logout_user
+from models import db, Apartment, Resident, User, Payment
+from statements import statement_for
+from readings import parse_period
+from pagination import paginate_request
+from reports import PAID_STATUS
+from fragments import conditional_page
+
+# Личный кабинет жильца: квитанции берутся из готовых снимков (statements.py),
+# квартира - из кэша пользователей, так что страница квитанции - один запрос по индексу
+resident_bp = Blueprint('resident', __name__, url_prefix='/resident')
+
+@resident_bp.before_request
+@login_required
+def require_resident():
+    if current_user.is_admin:
+        return redirect(url_for('admin.dashboard'))
+    if not current_user.apartment_id:
+        logout_user()
+        flash('Учетная запись не привязана к квартире. Обратитесь в управляющую компанию.', 'danger')
+        return redirect(url_for('login'))
+
+# Главная: последняя квитанция
+@resident_bp.route('/')
+@resident_bp.route('/dashboard')
+@conditional_page('statement')
+def dashboard():
+    statement = statement_for(current_user.apartment_id)
+    return render_template('resident/dashboard.html', statement=statement)
+
+# Квитанция за выбранный месяц
+@resident_bp.route('/charges')
+@conditional_page('statement')
+def charges():
+    period = None
+    if request.args.get('period'):
+        try:
+            period = parse_period(request.args['period'])
+        except ValueError as e:
+            flash(f'Ошибка: {e}', 'danger')
+            return redirect(url_for('resident.charges'))
+    statement = statement_for(current_user.apartment_id, period)
+    selected = period or (statement.period if statement else None)
+    return render_template('resident/charges.html', statement=statement, period=period, selected=selected)
+
+# Все оплаты квартиры, включая поступившие после последней квитанции
+@resident_bp.route('/payments')
+@conditional_page('payment')
+def payments():
+    query = Payment.query.filter(Payment.apartment_id == current_user.apartment_id,
+                                 Payment.status == PAID_STATUS)
+    page = paginate_request(query, [Payment.date, Payment.id], descending=True)
+    return render_template('resident/payments.html', payments=page.items, page=page)
+
+# Контакты и пароль
+@resident_bp.route('/profile', methods=['GET', 'POST'])
+def profile():
+    resident = db.session.get(Resident, current_user.resident_id)
+    if request.method == 'POST':
+        try:
+            resident.phone = request.form.get('phone', '').strip() or None
+            resident.email = request.form.get('email', '').strip() or None
+            password = request.form.get('password', '')
+            if password:
+                if len(password) < 6:
+                    flash('Пароль должен быть не короче 6 символов', 'danger')
+                    return redirect(url_for('resident.profile'))
+                db.session.get(User, current_user.id).set_password(password)
+            db.session.commit()
+            flash('Данные сохранены', 'success')
+            return redirect(url_for('resident.profile'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Ошибка при сохранении: {str(e)}', 'danger')
+    apartment = db.session.get(Apartment, current_user.apartment_id)
+    return render_template('resident/profile.html', resident=resident, apartment=apartment)
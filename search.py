@@ -0,0 +1,135 @@
+"""Поиск квартир и жильцов для форм: полнотекстовый индекс с триграммами.
+
+В SQLite индекс - виртуальная таблица FTS5 search_index, которую триггеры
+(миграция 0011) обновляют при любой записи в building, apartment и resident,
+в том числе при пакетных вставках Core. rowid строки индекса: id * 2 для
+квартиры и id * 2 + 1 для жильца. В других СУБД поиск идёт через LIKE.
+"""
+from sqlalchemy import func, or_, text
+
+from models import db, Building, Apartment, Resident
+
+# Сколько совпадений возвращается по умолчанию и максимум
+SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+# Триграммный индекс находит только подстроки от трёх символов
+MIN_TERM_LENGTH = 3
+
+KINDS = ('apartment', 'resident')
+
+# Таблицы, из которых строится индекс (по их версиям - ETag ответов поиска)
+SOURCE_TABLES = ('building', 'apartment', 'resident')
+
+# Строки индекса; те же выражения записаны в триггерах миграции 0011
+APARTMENT_ROWS = """
+SELECT a.id * 2, 'apartment', a.id, a.id,
+       b.address || ', кв. ' || a.number,
+       b.address || ' кв. ' || a.number
+FROM apartment a JOIN building b ON b.id = a.building_id
+"""
+RESIDENT_ROWS = """
+SELECT r.id * 2 + 1, 'resident', r.id, a.id,
+       r.full_name || ' - ' || b.address || ', кв. ' || a.number,
+       r.full_name || ' ' || coalesce(r.phone, '') || ' '
+           || replace(replace(replace(replace(replace(coalesce(r.phone, ''), ' ', ''), '(', ''), ')', ''), '-', ''), '+', '')
+           || ' ' || coalesce(r.email, '') || ' ' || b.address || ' кв. ' || a.number
+FROM resident r JOIN apartment a ON a.id = r.apartment_id JOIN building b ON b.id = a.building_id
+"""
+INDEX_COLUMNS = 'rowid, kind, ref_id, apartment_id, label, body'
+
+
+def _sqlite():
+    return db.session.get_bind().dialect.name == 'sqlite'
+
+
+def _phrase(term):
+    # Строка в кавычках - подстрока, а не выражение языка запросов FTS5
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _like(term):
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def search(query, kind=None, limit=SEARCH_LIMIT):
+    """Совпадения по адресу, номеру квартиры, ФИО, телефону и email жильца.
+
+    Возвращает список словарей kind, id, apartment_id, label; все слова запроса
+    должны встретиться в строке.
+    """
+    terms = (query or '').split()
+    if not terms:
+        return []
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    if _sqlite():
+        rows = _search_fts(terms, kind, limit)
+    else:
+        rows = _search_like(terms, kind, limit)
+    return [{'kind': row[0], 'id': row[1], 'apartment_id': row[2], 'label': row[3]} for row in rows]
+
+
+def _search_fts(terms, kind, limit):
+    long_terms = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    conditions = []
+    params = {'limit': limit}
+    if long_terms:
+        conditions.append('search_index MATCH :match')
+        params['match'] = ' '.join(_phrase(term) for term in long_terms)
+    # Короткие слова (номер квартиры, дома) проверяются по уже найденным строкам
+    for index, term in enumerate(term for term in terms if len(term) < MIN_TERM_LENGTH):
+        conditions.append(f"body LIKE :short{index} ESCAPE '\\'")
+        params[f'short{index}'] = _like(term)
+    if kind:
+        conditions.append('kind = :kind')
+        params['kind'] = kind
+    # Без ORDER BY rank: ранжирование всех совпадений частого слова («ул.») стоит
+    # сотни миллисекунд, а выборка по порядку rowid останавливается на limit
+    return db.session.execute(text(
+        f'SELECT kind, ref_id, apartment_id, label FROM search_index '
+        f'WHERE {" AND ".join(conditions)} LIMIT :limit'
+    ), params).all()
+
+
+def _contains(column, term):
+    return column.ilike(_like(term), escape='\\')
+
+
+def _phone_digits(column):
+    # Телефон без пробелов, скобок, дефисов и «+», как в строке индекса
+    value = func.coalesce(column, '')
+    for char in (' ', '(', ')', '-', '+'):
+        value = func.replace(value, char, '')
+    return value
+
+
+def _search_like(terms, kind, limit):
+    rows = []
+    if kind in (None, 'apartment'):
+        label = Building.address + ', кв. ' + Apartment.number
+        query = db.session.query(Apartment.id, Apartment.id, label).join(Building)
+        for term in terms:
+            query = query.filter(or_(_contains(Building.address, term), _contains(Apartment.number, term)))
+        rows += [('apartment', *row) for row in query.order_by(Apartment.id).limit(limit)]
+    if kind in (None, 'resident') and len(rows) < limit:
+        label = Resident.full_name + ' - ' + Building.address + ', кв. ' + Apartment.number
+        query = db.session.query(Resident.id, Apartment.id, label) \
+            .join(Apartment, Apartment.id == Resident.apartment_id).join(Building)
+        for term in terms:
+            query = query.filter(or_(_contains(Resident.full_name, term),
+                                     _contains(func.coalesce(Resident.phone, ''), term),
+                                     _contains(_phone_digits(Resident.phone), term),
+                                     _contains(func.coalesce(Resident.email, ''), term),
+                                     _contains(Building.address, term),
+                                     _contains(Apartment.number, term)))
+        rows += [('resident', *row) for row in query.order_by(Resident.id).limit(limit - len(rows))]
+    return rows
+
+
+def rebuild_search_index():
+    """Заново заполняет индекс по текущим данным (без COMMIT); в других СУБД ничего не делает."""
+    if not _sqlite():
+        return
+    db.session.execute(text('DELETE FROM search_index'))
+    db.session.execute(text(f'INSERT INTO search_index ({INDEX_COLUMNS}) {APARTMENT_ROWS}'))
+    db.session.execute(text(f'INSERT INTO search_index ({INDEX_COLUMNS}) {RESIDENT_ROWS}'))
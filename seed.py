@@ -0,0 +1,107 @@
+"""Начальные данные: демонстрационный дом и учётная запись администратора.
+
+Вызываются командами `flask seed` и `flask create-admin`; при старте
+приложения база не трогается.
+"""
+from models import db, User, Building, Apartment, Resident, Service
+
+DEMO_SERVICES = [
+    {
+        'name': 'Холодное водоснабжение',
+        'description': 'Подача холодной воды',
+        'unit': 'м³',
+        'rate': 45.50,
+        'is_counter': True,
+    },
+    {
+        'name': 'Электроэнергия',
+        'description': 'Подача электроэнергии',
+        'unit': 'кВт·ч',
+        'rate': 5.20,
+        'is_counter': True,
+    },
+    {
+        'name': 'Содержание жилья',
+        'description': 'Обслуживание общего имущества',
+        'unit': 'м²',
+        'rate': 25.30,
+        'is_counter': False,
+    },
+    {
+        'name': 'Отопление',
+        'description': 'Подача тепловой энергии',
+        'unit': 'Гкал',
+        'rate': 1800.00,
+        'is_counter': False,
+    },
+    {
+        'name': 'Вывоз ТБО',
+        'description': 'Вывоз твердых бытовых отходов',
+        'unit': 'чел.',
+        'rate': 120.00,
+        'is_counter': False,
+    },
+]
+
+
+def seed_demo():
+    """Создает тестовый дом с квартирами, жильцом и услугами, если домов в базе ещё нет.
+
+    Возвращает список созданного для вывода или пустой список.
+    """
+    if db.session.query(Building.id).first() is not None:
+        return []
+    created = []
+
+    building = Building(address='ул. Примерная, д. 1', floors=9, apartments_count=36, year_built=2010)
+    db.session.add(building)
+    created.append('дом')
+
+    apartments = {}
+    for floor in range(1, 4):
+        for num in range(1, 4):
+            number = f'{floor}{num:02d}'
+            apartments[number] = Apartment(
+                number=number,
+                area=65.5 if num % 2 == 0 else 45.3,
+                rooms=3 if num % 2 == 0 else 2,
+                floor=floor,
+                building=building,
+            )
+    db.session.add_all(apartments.values())
+    created.append(f'квартир: {len(apartments)}')
+
+    db.session.add(Resident(
+        full_name='Иванов Иван Иванович',
+        phone='+7 (999) 123-45-67',
+        email='ivanov@example.com',
+        apartment=apartments['101'],
+        is_owner=True,
+    ))
+    created.append('жилец')
+
+    if db.session.query(Service.id).first() is None:
+        db.session.add_all(Service(**data, is_active=True) for data in DEMO_SERVICES)
+        created.append(f'услуг: {len(DEMO_SERVICES)}')
+
+    db.session.commit()
+    return created
+
+
+def create_admin(username, email, password):
+    """Создает администратора или делает существующего пользователя администратором с новым паролем.
+
+    Возвращает (пользователь, создан ли он).
+    """
+    user = User.query.filter_by(username=username).first()
+    created = user is None
+    if created:
+        user = User(username=username, email=email or f'{username}@localhost')
+        db.session.add(user)
+    elif email:
+        user.email = email
+    user.is_admin = True
+    user.is_active = True
+    user.set_password(password)
+    db.session.commit()
+    return user, created
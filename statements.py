@@ -0,0 +1,93 @@
+"""Квитанции жильцов: снимок начислений, оплат и долга квартиры за месяц.
+
+Снимок записывается при расчёте начислений (billing._save_building) в той же
+транзакции, что и начисления дома, поэтому страница квитанции в кабинете
+жильца - один запрос по уникальному индексу (apartment_id, period).
+Оплаты, загруженные после расчёта, попадают в квитанцию при следующем
+расчёте месяца или по команде `flask statements`.
+"""
+import json
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from models import db, Apartment, Building, Charge, MonthlyBalance, Payment, Service, Statement, upsert
+from money import ZERO, to_decimal
+from reports import PAID_STATUS
+
+
+def _month_bounds(period):
+    start = datetime(period.year, period.month, 1)
+    return start, datetime(period.year + period.month // 12, period.month % 12 + 1, 1)
+
+
+def snapshot_statements(period, building_id=None):
+    """Записывает квитанции за period (без COMMIT) по квартирам с начислениями; возвращает их число."""
+    apartments = select(Apartment.id)
+    if building_id:
+        apartments = apartments.where(Apartment.building_id == building_id)
+
+    # Долг на начало месяца - по помесячным агрегатам, индекс (apartment_id, period)
+    opening = dict(db.session.execute(
+        select(MonthlyBalance.apartment_id, func.sum(MonthlyBalance.charged - MonthlyBalance.paid))
+        .where(MonthlyBalance.apartment_id.in_(apartments), MonthlyBalance.period < period)
+        .group_by(MonthlyBalance.apartment_id)
+    ).all())
+
+    charges = defaultdict(list)
+    addresses = {}
+    for apartment_id, address, number, name, unit, amount, total in db.session.execute(
+        select(Charge.apartment_id, Building.address, Apartment.number,
+               Service.name, Service.unit, Charge.amount, Charge.total)
+        .join(Apartment, Apartment.id == Charge.apartment_id)
+        .join(Building, Building.id == Apartment.building_id)
+        .join(Service, Service.id == Charge.service_id)
+        .where(Charge.apartment_id.in_(apartments), Charge.period == period)
+        .order_by(Charge.apartment_id, Service.id)
+    ):
+        addresses[apartment_id] = f'{address}, кв. {number}'
+        charges[apartment_id].append({'service': name, 'unit': unit, 'amount': str(amount), 'total': str(total)})
+
+    month_start, month_end = _month_bounds(period)
+    payments = defaultdict(list)
+    for apartment_id, paid_at, amount, method in db.session.execute(
+        select(Payment.apartment_id, Payment.date, Payment.amount, Payment.payment_method)
+        .where(Payment.apartment_id.in_(apartments), Payment.status == PAID_STATUS,
+               Payment.date >= month_start, Payment.date < month_end)
+        .order_by(Payment.apartment_id, Payment.date, Payment.id)
+    ):
+        payments[apartment_id].append({'date': paid_at.isoformat(), 'amount': str(amount), 'method': method})
+
+    now = datetime.utcnow()
+    rows = []
+    for apartment_id, lines in charges.items():
+        charged = sum((to_decimal(line['total']) for line in lines), ZERO)
+        paid = sum((to_decimal(line['amount']) for line in payments.get(apartment_id, ())), ZERO)
+        opening_debt = opening.get(apartment_id) or ZERO
+        rows.append({
+            'apartment_id': apartment_id,
+            'period': period,
+            'opening_debt': opening_debt,
+            'charged': charged,
+            'paid': paid,
+            'closing_debt': opening_debt + charged - paid,
+            'details': json.dumps({'address': addresses.get(apartment_id), 'charges': lines,
+                                   'payments': payments.get(apartment_id, [])}, ensure_ascii=False),
+            'created_at': now,
+        })
+    if rows:
+        db.session.connection().execute(
+            upsert(Statement, ['apartment_id', 'period'],
+                   ['opening_debt', 'charged', 'paid', 'closing_debt', 'details', 'created_at']),
+            rows,
+        )
+    return len(rows)
+
+
+def statement_for(apartment_id, period=None):
+    """Квитанция квартиры за период или последняя; None, если её ещё нет."""
+    query = Statement.query.filter(Statement.apartment_id == apartment_id)
+    if period is not None:
+        return query.filter(Statement.period == period).first()
+    return query.order_by(Statement.period.desc()).first()
@@ -0,0 +1,176 @@
+import threading
+import time
+import weakref
+from collections import Counter
+
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+
+from models import db, Building, Apartment, Resident, Service, Charge, Payment, ArchivedYear
+
+# Как часто счётчики сверяются с базой, секунд
+RECONCILE_INTERVAL = 300
+
+
+class StatsCache:
+    """Счётчики панели управления, обновляемые по событиям ORM.
+
+    Значения хранятся отдельно для каждого движка (приложения из create_app) и
+    считаются в отдельном соединении: незафиксированные изменения текущей
+    сессии в них не попадают и приходят дельтами после COMMIT.
+    """
+
+    def __init__(self, reconcile_interval=RECONCILE_INTERVAL):
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._entries = weakref.WeakKeyDictionary()  # движок -> [значения, время загрузки]
+
+    def _compute(self, engine):
+        # Все агрегаты одним запросом вместо семи
+        statement = select(
+            select(func.count(Building.id)).scalar_subquery().label('buildings'),
+            select(func.count(Apartment.id)).scalar_subquery().label('apartments'),
+            select(func.count(Resident.id)).scalar_subquery().label('residents'),
+            select(func.count(Service.id)).where(Service.is_active.is_(True))
+                .scalar_subquery().label('services'),
+            # Суммы перенесённых в архив лет - из их итогов (archive.py)
+            (select(func.coalesce(func.sum(Payment.amount), 0)).scalar_subquery()
+             + select(func.coalesce(func.sum(ArchivedYear.payments_total), 0)).scalar_subquery())
+                .label('total_payments'),
+            select(func.count(Payment.id)).where(Payment.status == 'pending')
+                .scalar_subquery().label('pending_payments'),
+            (select(func.coalesce(func.sum(Charge.total), 0)).scalar_subquery()
+             + select(func.coalesce(func.sum(ArchivedYear.charges_total), 0)).scalar_subquery())
+                .label('total_charges'),
+        )
+        with engine.connect() as connection:
+            return dict(connection.execute(statement).one()._mapping)
+
+    def snapshot(self):
+        engine = db.engine
+        with self._lock:
+            entry = self._entries.get(engine)
+            if entry is None or time.monotonic() - entry[1] > self.reconcile_interval:
+                entry = self._entries[engine] = [self._compute(engine), time.monotonic()]
+            return dict(entry[0])
+
+    def reconcile(self):
+        engine = db.engine
+        with self._lock:
+            self._entries[engine] = [self._compute(engine), time.monotonic()]
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.pop(db.engine, None)
+
+    def apply(self, deltas, engine):
+        with self._lock:
+            entry = self._entries.get(engine)
+            if entry is None:
+                return
+            for key, delta in deltas.items():
+                entry[0][key] += delta
+
+
+class LazyStats:
+    """Обёртка для шаблонов: запрос к кэшу только при первом обращении."""
+
+    def __init__(self, cache):
+        self._cache = cache
+        self._values = None
+
+    def _load(self):
+        if self._values is None:
+            self._values = self._cache.snapshot()
+        return self._values
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._load()[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, name):
+        return self._load()[name]
+
+
+dashboard_stats = StatsCache()
+
+
+def _value(obj, attr):
+    return inspect(obj).dict.get(attr)
+
+
+def _changed(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+def _object_deltas(obj, sign):
+    deltas = Counter()
+    if isinstance(obj, Building):
+        deltas['buildings'] += sign
+    elif isinstance(obj, Apartment):
+        deltas['apartments'] += sign
+    elif isinstance(obj, Resident):
+        deltas['residents'] += sign
+    elif isinstance(obj, Service):
+        if _value(obj, 'is_active') is not False:
+            deltas['services'] += sign
+    elif isinstance(obj, Charge):
+        deltas['total_charges'] += sign * (_value(obj, 'total') or 0)
+    elif isinstance(obj, Payment):
+        deltas['total_payments'] += sign * (_value(obj, 'amount') or 0)
+        if _value(obj, 'status') == 'pending':
+            deltas['pending_payments'] += sign
+    return deltas
+
+
+def _update_deltas(obj):
+    deltas = Counter()
+    if isinstance(obj, Service):
+        change = _changed(obj, 'is_active')
+        if change:
+            deltas['services'] += bool(change[1]) - bool(change[0])
+    elif isinstance(obj, Charge):
+        change = _changed(obj, 'total')
+        if change:
+            deltas['total_charges'] += (change[1] or 0) - (change[0] or 0)
+    elif isinstance(obj, Payment):
+        change = _changed(obj, 'amount')
+        if change:
+            deltas['total_payments'] += (change[1] or 0) - (change[0] or 0)
+        change = _changed(obj, 'status')
+        if change:
+            deltas['pending_payments'] += (change[1] == 'pending') - (change[0] == 'pending')
+    return deltas
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_deltas(session, flush_context):
+    deltas = session.info.setdefault('stats_deltas', Counter())
+    for obj in session.new:
+        deltas.update(_object_deltas(obj, 1))
+    for obj in session.deleted:
+        deltas.update(_object_deltas(obj, -1))
+    for obj in session.dirty:
+        if session.is_modified(obj, include_collections=False):
+            deltas.update(_update_deltas(obj))
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_deltas(session):
+    deltas = session.info.pop('stats_deltas', None)
+    if deltas:
+        dashboard_stats.apply(deltas, session.get_bind())
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_deltas(session):
+    session.info.pop('stats_deltas', None)
@@ -0,0 +1,107 @@
+"""История тарифов и поиск тарифа на период в памяти.
+
+Тариф действует на интервале месяцев [valid_from, valid_to). Тариф дома
+важнее общего; если на период нет ни того ни другого, берётся Service.rate
+(услуги, тариф которых ещё ни разу не меняли).
+"""
+from bisect import bisect_right
+from datetime import date
+
+from models import db, Service, Tariff
+from money import RATE_SCALE, to_decimal
+
+# С какого месяца действует тариф, записанный в Service.rate до появления истории
+TARIFF_EPOCH = date(2000, 1, 1)
+
+
+def _month(value):
+    return date(value.year, value.month, 1)
+
+
+class TariffResolver:
+    """Интервальный индекс тарифов: {(услуга, дом или None): начала интервалов и тарифы}.
+
+    Загружается одним запросом на расчёт; rate() отвечает без обращения к базе.
+    """
+
+    def __init__(self, tariffs, default_rates):
+        self.default_rates = default_rates
+        self._index = {}
+        for tariff in sorted(tariffs, key=lambda tariff: tariff.valid_from):
+            starts, intervals = self._index.setdefault((tariff.service_id, tariff.building_id), ([], []))
+            starts.append(tariff.valid_from)
+            intervals.append((tariff.valid_to, tariff.rate))
+
+    @classmethod
+    def load(cls, service_ids=None, default_rates=None):
+        """default_rates - {service_id: Service.rate}, если вызывающий их уже прочитал."""
+        tariffs = db.session.query(Tariff.service_id, Tariff.building_id, Tariff.rate,
+                                   Tariff.valid_from, Tariff.valid_to)
+        if service_ids is not None:
+            tariffs = tariffs.filter(Tariff.service_id.in_(service_ids))
+        if default_rates is None:
+            services = db.session.query(Service.id, Service.rate)
+            if service_ids is not None:
+                services = services.filter(Service.id.in_(service_ids))
+            default_rates = dict(services.all())
+        return cls(tariffs.all(), default_rates)
+
+    def _find(self, service_id, building_id, period):
+        entry = self._index.get((service_id, building_id))
+        if entry is None:
+            return None
+        starts, intervals = entry
+        position = bisect_right(starts, period) - 1
+        if position < 0:
+            return None
+        valid_to, rate = intervals[position]
+        if valid_to is not None and period >= valid_to:
+            return None
+        return rate
+
+    def rate(self, service_id, building_id, period):
+        """Тариф услуги для дома на период; None, если услуга неизвестна."""
+        period = _month(period)
+        if building_id is not None:
+            rate = self._find(service_id, building_id, period)
+            if rate is not None:
+                return rate
+        rate = self._find(service_id, None, period)
+        if rate is not None:
+            return rate
+        return self.default_rates.get(service_id)
+
+
+def set_tariff(service, rate, valid_from, building_id=None):
+    """Вводит тариф с месяца valid_from (без COMMIT) и возвращает его.
+
+    Действовавший на этот месяц тариф закрывается, новый действует до следующего
+    по истории - прошлые периоды сохраняют свой тариф. Если у услуги ещё нет
+    общих тарифов, прежний Service.rate записывается в историю с TARIFF_EPOCH.
+    """
+    rate = to_decimal(rate, RATE_SCALE)
+    valid_from = _month(valid_from)
+    same_scope = Tariff.building_id.is_(None) if building_id is None else Tariff.building_id == building_id
+    scope = Tariff.query.filter(Tariff.service_id == service.id, same_scope)
+
+    if building_id is None and valid_from > TARIFF_EPOCH and not scope.count():
+        db.session.add(Tariff(service_id=service.id, rate=service.rate or 0, valid_from=TARIFF_EPOCH))
+        db.session.flush()
+
+    tariffs = scope.order_by(Tariff.valid_from).all()
+    tariff = next((tariff for tariff in tariffs if tariff.valid_from == valid_from), None)
+    if tariff is None:
+        following = [tariff.valid_from for tariff in tariffs if tariff.valid_from > valid_from]
+        tariff = Tariff(service_id=service.id, building_id=building_id, valid_from=valid_from,
+                        valid_to=following[0] if following else None)
+        db.session.add(tariff)
+        for previous in tariffs:
+            if previous.valid_from < valid_from and (previous.valid_to is None or previous.valid_to > valid_from):
+                previous.valid_to = valid_from
+    tariff.rate = rate
+    db.session.flush()
+
+    if building_id is None:
+        # Service.rate - текущий общий тариф для списков и форм
+        service.rate = TariffResolver.load([service.id]).rate(service.id, None, date.today())
+    return tariff
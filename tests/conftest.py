@@ -0,0 +1,111 @@
+"""Общие фикстуры: приложение на отдельной базе SQLite для каждого теста.
+
+Схема создаётся миграциями, как `flask db upgrade`; фоновые обработчики задач
+не запускаются.
+"""
+import os
+import tempfile
+
+# До импорта config: база по умолчанию не должна указывать на zhkh.db
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'default.db'))
+os.environ['JOB_WORKERS'] = '0'
+
+import pytest  # noqa: E402
+from flask.testing import FlaskClient  # noqa: E402
+
+from app import create_app  # noqa: E402
+from audit import audit_writer  # noqa: E402
+from config import Config, engine_options  # noqa: E402
+from database import upgrade_database  # noqa: E402
+from fragments import fragment_cache  # noqa: E402
+from models import db, Apartment, Building, Service  # noqa: E402
+from seed import create_admin  # noqa: E402
+from users import user_cache  # noqa: E402
+
+
+def config_for(path, **options):
+    url = 'sqlite:///' + str(path)
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = url
+        SQLALCHEMY_ENGINE_OPTIONS = engine_options(url)
+        JOB_WORKERS = 0
+        INSTRUMENTATION = False
+
+    for name, value in options.items():
+        setattr(TestConfig, name, value)
+    return TestConfig
+
+
+class Client(FlaskClient):
+    """Каждый запрос - в своём контексте приложения, как на сервере.
+
+    Иначе запросы делили бы контекст теста: g (вошедший пользователь, версии
+    таблиц) и сессию базы переходили бы из запроса в запрос.
+    """
+
+    def open(self, *args, **kwargs):
+        # Потоковый ответ дочитывается, пока контекст ещё открыт
+        kwargs.setdefault('buffered', True)
+        with self.application.app_context():
+            return super().open(*args, **kwargs)
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Фабрика приложений на отдельных файлах базы со схемой из миграций."""
+    apps = []
+
+    def make(name='test', **options):
+        app = create_app(config_for(tmp_path / f'{name}.db', **options))
+        app.test_client_class = Client
+        with app.app_context():
+            upgrade_database()
+        apps.append(app)
+        return app
+
+    yield make
+    for app in apps:
+        with app.app_context():
+            audit_writer.flush()
+            db.session.remove()
+            db.engine.dispose()
+    # Кэши процесса, не привязанные к движку, относятся к базе прошлого теста
+    fragment_cache.clear()
+    user_cache.invalidate()
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def building(app):
+    """Дом с квартирами 1-3."""
+    building = Building(address='ул. Тестовая, д. 1', floors=5, apartments_count=3)
+    db.session.add(building)
+    db.session.add_all(Apartment(number=str(number), area=50, building=building) for number in range(1, 4))
+    db.session.commit()
+    return building
+
+
+@pytest.fixture
+def service(app):
+    service = Service(name='Содержание жилья', unit='м²', rate=25, is_counter=False, is_active=True)
+    db.session.add(service)
+    db.session.commit()
+    return service
+
+
+@pytest.fixture
+def admin_client(app):
+    """Клиент, вошедший как администратор."""
+    create_admin('admin', None, 'admin123')
+    client = app.test_client()
+    # Переход после входа показывает сообщение flash - иначе первая страница была бы без ETag
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'}, follow_redirects=True)
+    return client
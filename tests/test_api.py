@@ -0,0 +1,60 @@
+"""API v1: выбор полей, условные GET по версиям таблиц."""
+from decimal import Decimal
+
+from sqlalchemy import event
+
+from models import db, Payment
+
+
+def _payment(building, amount='100'):
+    payment = Payment(apartment_id=building.apartments[0].id, amount=Decimal(amount), status='completed')
+    db.session.add(payment)
+    db.session.commit()
+    return payment
+
+
+def test_fields_select_only_requested_columns(admin_client, building):
+    _payment(building)
+    items = admin_client.get('/api/v1/payments?fields=id,amount').get_json()['items']
+    assert items == [{'id': items[0]['id'], 'amount': '100.00'}]
+    response = admin_client.get('/api/v1/payments?fields=id,secret')
+    assert response.status_code == 400
+    assert 'secret' in response.get_json()['error']
+
+
+def test_not_modified_before_query(app, admin_client, building):
+    _payment(building)
+    response = admin_client.get('/api/v1/payments')
+    etag = response.headers['ETag']
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        cached = admin_client.get('/api/v1/payments', headers={'If-None-Match': etag})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert cached.status_code == 304
+    assert not any('FROM payment' in statement for statement in statements)
+
+
+def test_etag_depends_on_args_and_versions(admin_client, building):
+    _payment(building)
+    etag = admin_client.get('/api/v1/payments').headers['ETag']
+    assert admin_client.get('/api/v1/payments?fields=id').headers['ETag'] != etag
+
+    _payment(building, '200')
+    response = admin_client.get('/api/v1/payments', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert len(response.get_json()['items']) == 2
+
+
+def test_item_and_errors_not_cached(admin_client, building):
+    payment = _payment(building)
+    response = admin_client.get(f'/api/v1/payments/{payment.id}?fields=status')
+    assert response.get_json() == {'status': 'completed'}
+    assert 'ETag' in response.headers
+    missing = admin_client.get('/api/v1/payments/999')
+    assert missing.status_code == 404
+    assert 'ETag' not in missing.headers
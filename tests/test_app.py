@@ -0,0 +1,79 @@
+"""Фабрика приложения и команды flask."""
+from app import create_app
+from config import Config, engine_options
+from models import db, Building, Charge, Statement, User
+
+
+def test_create_app_does_not_touch_database(tmp_path):
+    path = tmp_path / 'untouched.db'
+
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(path)
+        SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+        JOB_WORKERS = 0
+
+    app = create_app(TestConfig)
+    assert not path.exists()
+    assert app.test_client().get('/login').status_code == 200
+    assert not path.exists()
+
+
+def test_apps_use_their_own_databases(make_app):
+    first, second = make_app('first'), make_app('second')
+    with first.app_context():
+        db.session.add(Building(address='ул. Первая, д. 1', floors=1, apartments_count=0))
+        db.session.commit()
+    with second.app_context():
+        assert Building.query.count() == 0
+
+
+def test_index_redirects_to_login(app):
+    response = app.test_client().get('/')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/login')
+
+
+def test_seed_command_runs_once(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['seed'])
+    assert result.exit_code == 0
+    assert result.output.startswith('Создано: ')
+    assert Building.query.count() == 1
+    again = runner.invoke(args=['seed'])
+    assert 'тестовые данные не добавлены' in again.output
+    assert Building.query.count() == 1
+
+
+def test_create_admin_command(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['create-admin', '--username', 'boss', '--password', 'secret1'])
+    assert result.output.strip() == 'Администратор boss создан'
+    result = runner.invoke(args=['create-admin', '--username', 'boss', '--password', 'secret2'])
+    assert result.output.strip() == 'Администратор boss обновлен'
+    db.session.expire_all()
+    user = User.query.filter_by(username='boss').one()
+    assert user.is_admin and user.check_password('secret2')
+    response = app.test_client().post('/login', data={'username': 'boss', 'password': 'secret2'})
+    assert response.headers['Location'] == '/admin/dashboard'
+
+
+def test_generate_and_statements_commands(app):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=['generate', '--buildings', '2', '--apartments', '3', '--months', '2',
+                                 '--start', '01.2024'])
+    assert result.exit_code == 0, result.output
+    assert 'Готово' in result.output
+    assert Charge.query.count() > 0
+
+    result = runner.invoke(args=['statements', '02.2024'])
+    assert result.output.strip() == 'Записано квитанций: 6'
+    assert Statement.query.count() == 12
+
+
+def test_commands_reject_bad_period(app):
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['statements', '2024-02']).exit_code == 2
+    assert runner.invoke(args=['generate', '--start', 'февраль']).exit_code == 2
+    result = runner.invoke(args=['archive', '2999'])
+    assert result.exit_code == 1
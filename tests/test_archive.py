@@ -0,0 +1,91 @@
+"""Архив закрытых лет: перенос строк и UNION ALL с архивными таблицами (archive.py)."""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import func, select
+
+from archive import ArchiveError, archive_table, archive_until, check_not_archived, with_archives
+from exports import charges_select, payments_select
+from ledger import allocate
+from models import db, ApartmentBalance, ArchivedYear, Charge, MonthlyBalance, Payment
+from reports import rebuild_balances
+
+
+@pytest.fixture
+def history(building, service):
+    """Начисления и оплаты квартиры за 2022-2024 годы, по одному на год."""
+    apartment = building.apartments[0]
+    for year in (2022, 2023, 2024):
+        db.session.add(Charge(apartment_id=apartment.id, service_id=service.id, period=date(year, 6, 1),
+                              amount=1, total=100))
+        db.session.add(Payment(apartment_id=apartment.id, amount=100, date=datetime(year, 7, 1)))
+    db.session.add(Payment(apartment_id=apartment.id, amount=5, date=datetime(2022, 8, 1), status='pending'))
+    db.session.commit()
+    return apartment
+
+
+def snapshot():
+    balances = [(row.apartment_id, row.charged, row.paid, row.debt) for row in ApartmentBalance.query]
+    monthly = [(row.period, row.charged, row.paid) for row in MonthlyBalance.query.order_by(MonthlyBalance.period)]
+    return balances, monthly
+
+
+def test_archive_moves_closed_years_and_keeps_aggregates(history):
+    before = snapshot()
+    exported = db.session.execute(charges_select()).all()
+
+    done = archive_until(2023)
+
+    assert [(summary.year, summary.charges_count, summary.payments_count) for summary in done] == [
+        (2022, 1, 1), (2023, 1, 1)]
+    assert db.session.scalars(select(Charge.period)).all() == [date(2024, 6, 1)]
+    # Неподтверждённый платёж ещё может измениться и остаётся в основной таблице
+    assert sorted(db.session.scalars(select(Payment.status)).all()) == ['completed', 'pending']
+    assert db.session.scalar(select(func.count()).select_from(archive_table(Charge, 2022))) == 1
+    assert snapshot() == before
+    # Архивные начисления по-прежнему первые в очереди оплаты: статусы не меняются
+    assert allocate([history.id]) == 0
+    assert Charge.query.one().is_paid
+
+    # Выгрузка за все годы берёт архивные строки в том же порядке
+    assert db.session.execute(charges_select()).all() == exported
+    assert [row.period for row in db.session.execute(charges_select(date(2022, 6, 1)))] == [date(2022, 6, 1)]
+
+
+def test_rebuild_after_archive_gives_same_balances(history):
+    archive_until(2023)
+    before = snapshot()
+    rebuild_balances()
+    db.session.commit()
+    db.session.expire_all()
+    assert snapshot() == before
+
+
+def test_payments_export_unions_only_years_in_range(history):
+    archive_until(2023)
+    query = Payment.query.filter(Payment.status == 'completed')
+
+    everything = db.session.execute(payments_select(query)).all()
+    assert [row.date.year for row in everything] == [2022, 2023, 2024]
+
+    recent = db.session.execute(payments_select(query, date(2023, 1, 1), date(2024, 12, 31))).all()
+    assert [row.date.year for row in recent] == [2023, 2024]
+
+
+def test_with_archives_without_years_keeps_statement(history):
+    statement = select(Charge.id, Charge.period).where(Charge.total > 0)
+    result = db.session.execute(with_archives(statement, Charge, [], ['period', 'id'])).all()
+    assert [row.period.year for row in result] == [2022, 2023, 2024]
+
+
+def test_archived_periods_are_closed(history):
+    archive_until(2022)
+    assert db.session.get(ArchivedYear, 2022).until == date(2023, 1, 1)
+    with pytest.raises(ArchiveError):
+        check_not_archived(date(2022, 12, 1))
+    check_not_archived(date(2023, 1, 1))
+
+
+def test_current_year_cannot_be_archived(app):
+    with pytest.raises(ArchiveError):
+        archive_until(date.today().year)
@@ -0,0 +1,100 @@
+"""Журнал изменений: записи из сессии, пакетная запись и запрет UPDATE/DELETE."""
+import json
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.exc import DatabaseError
+
+from audit import AuditWriter, audit_writer
+from models import db, AuditLog, Payment
+
+
+def _entries():
+    audit_writer.flush()
+    db.session.expire_all()
+    return AuditLog.query.order_by(AuditLog.id).all()
+
+
+def _entry(number):
+    return {'entity': 'payment', 'entity_id': number, 'action': 'insert', 'changes': '{}',
+            'user_id': None, 'username': None, 'origin': 'test', 'created_at': datetime.utcnow()}
+
+
+def _wait(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_insert_update_delete_recorded(app, building):
+    payment = Payment(apartment_id=building.apartments[0].id, amount=Decimal('100'), status='pending')
+    db.session.add(payment)
+    db.session.commit()
+    payment.status = 'completed'
+    db.session.commit()
+    payment_id = payment.id
+    db.session.delete(payment)
+    db.session.commit()
+
+    entries = [entry for entry in _entries() if entry.entity == 'payment']
+    assert [entry.action for entry in entries] == ['insert', 'update', 'delete']
+    assert {entry.entity_id for entry in entries} == {payment_id}
+    assert json.loads(entries[0].changes)['amount'] == [None, '100']
+    assert json.loads(entries[1].changes) == {'status': ['pending', 'completed']}
+    assert json.loads(entries[2].changes)['status'] == ['completed', None]
+
+
+def test_rolled_back_changes_not_recorded(app, building):
+    db.session.add(Payment(apartment_id=building.apartments[0].id, amount=Decimal('100')))
+    db.session.flush()
+    db.session.rollback()
+    assert not [entry for entry in _entries() if entry.entity == 'payment']
+
+
+def test_author_and_origin_of_request(admin_client, building):
+    admin_client.post('/admin/payment/create', data={'apartment_id': building.apartments[0].id, 'amount': '10'})
+    entry = next(entry for entry in _entries() if entry.entity == 'payment')
+    assert entry.username == 'admin'
+    assert entry.origin == 'POST /admin/payment/create'
+
+
+def test_writer_waits_for_full_batch(app):
+    writer = AuditWriter(batch_size=3, interval=60)
+    writer.submit([_entry(1), _entry(2)])
+    # Пакет не набрался, а до интервала далеко - запись ждёт в буфере
+    time.sleep(0.2)
+    assert (writer.pending, writer.written) == (2, 0)
+    writer.submit([_entry(3)])
+    assert _wait(lambda: writer.written == 3)
+    assert writer.batches == 1
+    assert AuditLog.query.count() == 3
+
+
+def test_writer_flushes_after_interval(app):
+    writer = AuditWriter(batch_size=100, interval=0.1)
+    writer.submit([_entry(1)])
+    assert _wait(lambda: writer.written == 1)
+    assert writer.pending == 0
+
+
+def test_failed_batch_counted_as_dropped(app):
+    writer = AuditWriter(batch_size=100, interval=0.01)
+    writer.submit([{**_entry(1), 'entity': None}])
+    writer.flush()
+    assert _wait(lambda: writer.dropped == 1)
+    assert writer.written == 0
+
+
+def test_log_is_append_only(app):
+    db.session.execute(db.insert(AuditLog), [_entry(1)])
+    db.session.commit()
+    with pytest.raises(DatabaseError, match='append-only'):
+        db.session.execute(db.update(AuditLog).values(action='update'))
+    db.session.rollback()
+    with pytest.raises(DatabaseError, match='append-only'):
+        db.session.execute(db.delete(AuditLog))
+    db.session.rollback()
+    assert AuditLog.query.count() == 1
@@ -0,0 +1,18 @@
+"""Нагрузочный набор (benchmarks/suite.py) на маленьком городе: число SQL-запросов не выше базового.
+
+Время на таком объёме ничего не говорит и не проверяется; полный замер с медианами -
+`python benchmarks/suite.py`.
+"""
+from benchmarks import suite
+
+PARAMS = {'buildings': 3, 'apartments': 10, 'months': 3, 'seed': 42}
+
+
+def test_query_counts_within_baseline(make_app):
+    app = make_app('suite')
+    last_period, _ = suite.prepare(app, PARAMS)
+    results = suite.run_cases(app, suite.cases(app, last_period), repeat=1)
+    baseline = suite.load_baseline()['results']
+    assert set(results) == set(baseline)
+    regressions = suite.compare(results, baseline, threshold=float('inf'))
+    assert not regressions, regressions
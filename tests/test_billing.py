@@ -0,0 +1,83 @@
+"""Расчёт начислений по домам (billing.py): суммы, повторный запуск и проводки."""
+from datetime import date
+from decimal import Decimal
+
+from billing import run_billing
+from models import db, Apartment, ApartmentBalance, Building, Charge, MeterReading, MonthlyBalance, Service
+from tariffs import TariffResolver
+
+PERIOD = date(2024, 3, 1)
+
+
+def totals():
+    return {(charge.apartment_id, charge.service_id): charge.total
+            for charge in Charge.query.filter_by(period=PERIOD)}
+
+
+def test_charges_by_area_and_by_meter(building, service):
+    water = Service(name='Холодная вода', unit='м³', rate='45.50', is_counter=True, is_active=True)
+    db.session.add(water)
+    db.session.commit()
+    first, second, third = building.apartments
+    first.area = '45.3'
+    db.session.add(MeterReading(apartment_id=first.id, service_id=water.id, period=PERIOD, value=10,
+                                consumption=3.5))
+    db.session.add(MeterReading(apartment_id=second.id, service_id=water.id, period=PERIOD, value=5,
+                                consumption=-1))
+    db.session.commit()
+
+    report = run_billing(PERIOD, [service.id, water.id], processes=1)
+
+    assert report.created == 6
+    assert totals() == {
+        (first.id, service.id): Decimal('1132.50'),
+        (second.id, service.id): Decimal('1250.00'),
+        (third.id, service.id): Decimal('1250.00'),
+        (first.id, water.id): Decimal('159.25'),
+        # Отрицательный расход (замена счетчика) не даёт отрицательного начисления
+        (second.id, water.id): Decimal('0.00'),
+        (third.id, water.id): Decimal('0.00'),
+    }
+
+
+def test_totals_match_orm_calculation(building, service):
+    run_billing(PERIOD, [service.id], processes=1)
+    resolver = TariffResolver.load([service.id])
+    for charge in Charge.query:
+        assert charge.calculate_total(resolver) == charge.total
+
+
+def test_second_run_is_idempotent_and_resumes(building, service):
+    run_billing(PERIOD, [service.id], processes=1)
+    before = totals()
+
+    again = run_billing(PERIOD, [service.id], processes=1)
+    assert (again.created, again.skipped, again.buildings_skipped) == (0, 3, 1)
+    assert totals() == before
+
+    # Прерванный расчёт: недостающее начисление досчитывается, остальные не трогаются
+    db.session.delete(Charge.query.filter_by(apartment_id=building.apartments[0].id).one())
+    db.session.commit()
+    resumed = run_billing(PERIOD, [service.id], processes=1)
+    assert (resumed.created, resumed.skipped) == (1, 2)
+    assert totals() == before
+
+
+def test_only_selected_building(building, service):
+    other = Building(address='ул. Другая, д. 2')
+    db.session.add(other)
+    db.session.add(Apartment(number='1', area=10, building=other))
+    db.session.commit()
+
+    report = run_billing(PERIOD, [service.id], building_id=other.id, processes=1)
+    assert report.created == 1
+    assert {charge.apartment.building_id for charge in Charge.query} == {other.id}
+
+
+def test_batch_insert_is_posted_to_aggregates(building, service):
+    run_billing(PERIOD, [service.id], processes=1)
+    apartment = building.apartments[1]
+
+    monthly = MonthlyBalance.query.filter_by(apartment_id=apartment.id, period=PERIOD).one()
+    balance = db.session.get(ApartmentBalance, apartment.id)
+    assert monthly.charged == balance.charged == balance.debt == Decimal('1250.00')
@@ -0,0 +1,17 @@
+"""Параллельные читатели и один писатель на профиле SQLite приложения (см. benchmarks/concurrency.py)."""
+from benchmarks.concurrency import run
+from models import db
+
+
+def test_wal_profile_applied(app):
+    assert db.session.execute(db.text('PRAGMA journal_mode')).scalar() == 'wal'
+    assert db.session.execute(db.text('PRAGMA busy_timeout')).scalar() == 30000
+
+
+def test_readers_and_writer_without_locks(app):
+    db.session.remove()
+    counters = run(app, readers=4, seconds=1.5)
+    assert counters.locked == 0
+    assert counters.errors == 0
+    assert counters.reads > 0
+    assert counters.writes > 0
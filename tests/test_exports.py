@@ -0,0 +1,45 @@
+"""Выгрузки начислений и платежей: CSV потоком, XLSX готовым файлом."""
+import io
+from datetime import date
+from decimal import Decimal
+
+from openpyxl import load_workbook
+
+from exports import PAYMENT_COLUMNS
+from models import db, Charge, Payment
+
+
+def _data(building, service):
+    apartment = building.apartments[0]
+    db.session.add(Charge(apartment_id=apartment.id, service_id=service.id, period=date(2024, 1, 1),
+                          amount=Decimal('50'), total=Decimal('1250')))
+    db.session.add(Payment(apartment_id=apartment.id, amount=Decimal('300'), status='completed',
+                           payment_method='bank', description='Оплата'))
+    db.session.commit()
+
+
+def test_csv_export(admin_client, building, service):
+    _data(building, service)
+    response = admin_client.get('/admin/charges/export')
+    assert response.status_code == 200
+    # Поток: длина заранее не известна
+    assert 'Content-Length' not in response.headers
+    lines = response.get_data(as_text=True).lstrip('﻿').splitlines()
+    assert len(lines) == 2
+    assert '1250' in lines[1]
+
+
+def test_xlsx_export_sent_as_file(admin_client, building, service):
+    _data(building, service)
+    response = admin_client.get('/admin/payments/export?format=xlsx')
+    assert response.status_code == 200
+    assert 'payments.xlsx' in response.headers['Content-Disposition']
+    assert int(response.headers['Content-Length']) > 0
+    sheet = load_workbook(io.BytesIO(response.get_data())).active
+    rows = list(sheet.iter_rows(values_only=True))
+    assert list(rows[0]) == PAYMENT_COLUMNS
+    assert rows[1][4] == 300
+
+
+def test_unknown_format_rejected(admin_client):
+    assert admin_client.get('/admin/charges/export?format=pdf').status_code == 400
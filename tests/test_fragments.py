@@ -0,0 +1,82 @@
+"""Версии таблиц, кэш фрагментов и условные GET страниц."""
+from sqlalchemy import event, insert
+
+from fragments import cache_fragment, fragment_cache, versions_of
+from models import db, Building, TableVersion
+
+
+def _version(name):
+    db.session.expire_all()
+    row = db.session.get(TableVersion, name)
+    return row.version if row else 0
+
+
+def _add_building(address='ул. Новая, д. 1'):
+    db.session.add(Building(address=address, floors=5, apartments_count=0))
+    db.session.commit()
+
+
+def test_commit_bumps_written_tables(app):
+    _add_building()
+    assert _version('building') == 1
+    db.session.execute(insert(Building), [{'address': 'ул. Новая, д. 2', 'floors': 5, 'apartments_count': 0}])
+    db.session.commit()
+    assert _version('building') == 2
+    assert _version('apartment') == 0
+
+
+def test_rollback_does_not_bump(app):
+    db.session.add(Building(address='ул. Новая, д. 1', floors=5, apartments_count=0))
+    db.session.flush()
+    db.session.rollback()
+    _add_building('ул. Новая, д. 2')
+    assert _version('building') == 1
+
+
+def test_bump_runs_after_commit(app):
+    # Строка версии не пишется в транзакции писателя и не держит её блокировку
+    events = []
+    engine = db.engine
+    on_execute = lambda conn, cursor, statement, *args: events.append(statement.split()[0:3])  # noqa: E731
+    on_commit = lambda conn: events.append('COMMIT')  # noqa: E731
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    event.listen(engine, 'commit', on_commit)
+    try:
+        _add_building()
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+        event.remove(engine, 'commit', on_commit)
+    bump = next(index for index, item in enumerate(events) if 'table_version' in item)
+    assert events.index('COMMIT') < bump
+
+
+def test_fragment_rendered_once_per_version(app):
+    calls = []
+
+    def render():
+        calls.append(1)
+        return f'<p>{len(calls)}</p>'
+
+    with app.test_request_context('/admin/buildings'):
+        first = cache_fragment('buildings', 'building', caller=render)
+        assert cache_fragment('buildings', 'building', caller=render) == first
+    assert len(calls) == 1
+
+    _add_building()
+    with app.test_request_context('/admin/buildings'):
+        assert versions_of(('building',)) == (1,)
+        assert cache_fragment('buildings', 'building', caller=render) != first
+    assert len(calls) == 2
+    assert fragment_cache.snapshot()['hits'] >= 1
+
+
+def test_conditional_page_not_modified_until_write(admin_client):
+    response = admin_client.get('/admin/buildings')
+    etag = response.headers['ETag']
+    assert response.status_code == 200
+    assert admin_client.get('/admin/buildings', headers={'If-None-Match': etag}).status_code == 304
+
+    _add_building()
+    response = admin_client.get('/admin/buildings', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'ул. Новая, д. 1' in response.get_data(as_text=True)
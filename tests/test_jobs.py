@@ -0,0 +1,84 @@
+"""Очередь задач: захват, прогресс, отмена и итоги."""
+import json
+
+import pytest
+
+import billing
+import jobs
+from models import db, Apartment, Building, Charge, Job
+
+
+def _job(job_id):
+    db.session.expire_all()
+    return db.session.get(Job, job_id)
+
+
+def test_enqueue_deduplicates_and_rejects_unknown_kind(app):
+    first = jobs.enqueue('report', 'Отчет', {'period': '2024-01-01'})
+    assert jobs.enqueue('report', 'Отчет', {'period': '2024-01-01'}).id == first.id
+    assert jobs.enqueue('report', 'Отчет', {'period': '2024-02-01'}).id != first.id
+    with pytest.raises(ValueError):
+        jobs.enqueue('unknown', 'Задача', {})
+
+
+def test_claim_takes_oldest_once(app):
+    first = jobs.enqueue('report', 'Первый', {'n': 1}).id
+    second = jobs.enqueue('report', 'Второй', {'n': 2}).id
+    assert jobs.claim_next('w1') == first
+    assert jobs.claim_next('w2') == second
+    assert jobs.claim_next('w3') is None
+    job = _job(first)
+    assert (job.status, job.worker) == ('running', 'w1')
+
+
+def test_progress_written_and_visible(app):
+    job_id = jobs.enqueue('report', 'Отчет', {}).id
+    jobs.claim_next('w')
+    jobs.JobContext(job_id).progress(5, 10, 'Половина')
+    job = _job(job_id)
+    assert (job.progress, job.total, job.message) == (5, 10, 'Половина')
+    assert jobs.job_state(job)['percent'] == 50
+
+
+def test_cancel_queued_immediately(app):
+    job = jobs.enqueue('report', 'Отчет', {})
+    assert jobs.cancel(job)
+    assert _job(job.id).status == 'cancelled'
+    assert jobs.claim_next('w') is None
+    assert not jobs.cancel(_job(job.id))
+
+
+def test_failed_handler_recorded(app, monkeypatch):
+    def broken(context):
+        raise RuntimeError('сломалось')
+    monkeypatch.setitem(jobs.HANDLERS, 'broken', broken)
+    job_id = jobs.enqueue('broken', 'Задача', {}).id
+    assert jobs.run_pending('w') == 1
+    job = _job(job_id)
+    assert (job.status, job.message) == ('failed', 'сломалось')
+
+
+def test_cancelled_billing_keeps_saved_buildings(app, building, service, monkeypatch):
+    other = Building(address='ул. Тестовая, д. 2', floors=5, apartments_count=1)
+    db.session.add(other)
+    db.session.add(Apartment(number='1', area=40, building=other))
+    db.session.commit()
+    first_id = building.id
+    job_id = jobs.enqueue('billing', 'Расчёт', {'period': '2024-01-01', 'service_ids': [service.id]}).id
+
+    # Отмена приходит, пока записывается первый дом
+    save_building = billing._save_building
+
+    def save_and_cancel(*args):
+        save_building(*args)
+        jobs._write(job_id, cancel_requested=True)
+    monkeypatch.setattr(billing, '_save_building', save_and_cancel)
+    monkeypatch.setattr(jobs, 'PROGRESS_INTERVAL', 0)
+    jobs.run_pending('w')
+
+    job = _job(job_id)
+    assert job.status == 'cancelled'
+    result = json.loads(job.result)
+    assert result['saved_buildings'] == [first_id]
+    assert 'записаны по 1 домам' in job.message
+    assert {charge.apartment.building_id for charge in Charge.query} == {first_id}
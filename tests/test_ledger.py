@@ -0,0 +1,118 @@
+"""Сальдо квартир и разнесение оплаты по начислениям от старых к новым (ledger.py)."""
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import update
+
+from ledger import allocate, allocate_all, rebuild_ledger
+from models import db, ApartmentBalance, Charge, Payment
+from reports import rebuild_balances
+
+
+def charge(apartment, service, period, total):
+    db.session.add(Charge(apartment_id=apartment.id, service_id=service.id, period=period,
+                          amount=1, total=total))
+    db.session.commit()
+
+
+def pay(apartment, amount, status='completed'):
+    payment = Payment(apartment_id=apartment.id, amount=amount, date=datetime(2024, 4, 1), status=status)
+    db.session.add(payment)
+    db.session.commit()
+    return payment
+
+
+def paid_flags(apartment):
+    return [charge.is_paid for charge in
+            Charge.query.filter_by(apartment_id=apartment.id).order_by(Charge.period, Charge.id)]
+
+
+def test_payment_covers_oldest_charges_first(building, service):
+    apartment = building.apartments[0]
+    for month in (1, 2, 3):
+        charge(apartment, service, date(2024, month, 1), 100)
+
+    pay(apartment, 150)
+    assert paid_flags(apartment) == [True, False, False]
+
+    pay(apartment, 50)
+    assert paid_flags(apartment) == [True, True, False]
+
+    balance = db.session.get(ApartmentBalance, apartment.id)
+    assert (balance.charged, balance.paid, balance.debt) == (Decimal('300.00'), Decimal('200.00'),
+                                                             Decimal('100.00'))
+
+
+def test_deleting_or_voiding_payment_reopens_charges(building, service):
+    apartment = building.apartments[0]
+    charge(apartment, service, date(2024, 1, 1), 100)
+    charge(apartment, service, date(2024, 2, 1), 100)
+    first = pay(apartment, 100)
+    second = pay(apartment, 100)
+    assert paid_flags(apartment) == [True, True]
+
+    second.status = 'failed'
+    db.session.commit()
+    assert paid_flags(apartment) == [True, False]
+
+    db.session.delete(first)
+    db.session.commit()
+    assert paid_flags(apartment) == [False, False]
+    assert db.session.get(ApartmentBalance, apartment.id).debt == Decimal('200.00')
+
+
+def test_pending_payment_is_not_allocated(building, service):
+    apartment = building.apartments[0]
+    charge(apartment, service, date(2024, 1, 1), 100)
+    pay(apartment, 100, status='pending')
+    assert paid_flags(apartment) == [False]
+
+
+def test_backdated_charge_takes_its_place_in_the_queue(building, service):
+    apartment = building.apartments[0]
+    charge(apartment, service, date(2024, 2, 1), 100)
+    pay(apartment, 100)
+    assert paid_flags(apartment) == [True]
+
+    # Начисление задним числом встаёт в очередь первым и забирает оплату
+    charge(apartment, service, date(2024, 1, 1), 100)
+    assert paid_flags(apartment) == [True, False]
+
+
+def test_allocate_all_matches_incremental_allocation(building, service):
+    apartments = building.apartments
+    for index, apartment in enumerate(apartments):
+        for month in (1, 2, 3):
+            charge(apartment, service, date(2024, month, 1), 100 + index)
+        pay(apartment, 100 * (index + 1) + index)
+    expected = {apartment.id: paid_flags(apartment) for apartment in apartments}
+
+    db.session.execute(update(Charge).values(is_paid=False))
+    db.session.commit()
+    assert allocate_all() > 0
+    db.session.commit()
+    assert {apartment.id: paid_flags(apartment) for apartment in apartments} == expected
+
+    db.session.execute(update(Charge).values(is_paid=True))
+    db.session.commit()
+    allocate([apartment.id for apartment in apartments])
+    db.session.commit()
+    assert {apartment.id: paid_flags(apartment) for apartment in apartments} == expected
+
+
+def test_rebuild_reproduces_incremental_balances(building, service):
+    apartment = building.apartments[1]
+    for month in (1, 2):
+        charge(apartment, service, date(2024, month, 1), Decimal('99.99'))
+    pay(apartment, Decimal('120.01'))
+    before = db.session.get(ApartmentBalance, apartment.id)
+    before = (before.charged, before.paid, before.debt)
+
+    rebuild_balances()
+    rebuild_ledger()
+    db.session.commit()
+    db.session.expire_all()
+    after = db.session.get(ApartmentBalance, apartment.id)
+    assert (after.charged, after.paid, after.debt) == before == (Decimal('199.98'), Decimal('120.01'),
+                                                                 Decimal('79.97'))
+    assert paid_flags(apartment) == [True, False]
@@ -0,0 +1,56 @@
+"""Целочисленный расчёт начислений: NumPy, построчный путь и эталон на Decimal дают одно и то же."""
+import random
+from decimal import Decimal
+
+import pytest
+
+import money
+from money import (QUANTITY_SCALE, RATE_SCALE, apply_rate, apply_rates, from_units, to_decimal,
+                   to_units)
+
+
+def reference(amount_units, rate_units):
+    rate = from_units(rate_units, RATE_SCALE)
+    return [to_units(apply_rate(from_units(units, QUANTITY_SCALE), rate)) for units in amount_units]
+
+
+def cases():
+    generator = random.Random(7)
+    amounts = [generator.randint(-10 ** 6, 10 ** 8) for _ in range(2000)]
+    # Ровно половина копейки: 0.005 ₽ и -0.005 ₽ при тарифе 1
+    amounts += [5, -5, 15, -15, 0]
+    return amounts, [1, 10000, 455000, 18000000, generator.randint(1, 10 ** 7)]
+
+
+@pytest.mark.parametrize('rate_units', cases()[1])
+def test_integer_paths_match_decimal_reference(monkeypatch, rate_units):
+    amounts = cases()[0]
+    expected = reference(amounts, rate_units)
+
+    if money.numpy is not None:
+        assert apply_rates(amounts, rate_units) == expected
+    monkeypatch.setattr(money, 'numpy', None)
+    assert apply_rates(amounts, rate_units) == expected
+
+
+def test_half_kopeck_rounds_away_from_zero():
+    assert apply_rate(Decimal('0.005'), 1) == Decimal('0.01')
+    assert apply_rate(Decimal('-0.005'), 1) == Decimal('-0.01')
+    assert apply_rates([5, -5, 4], 10000) == [1, -1, 0]
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1 234,56', Decimal('1234.56')),
+    (0.1 + 0.2, Decimal('0.30')),
+    ('2.345', Decimal('2.35')),
+    (Decimal('-2.345'), Decimal('-2.35')),
+])
+def test_to_decimal(value, expected):
+    assert to_decimal(value) == expected
+    assert to_units(value) == int(expected * 100)
+
+
+@pytest.mark.parametrize('value', ['abc', 'NaN', 'Infinity'])
+def test_to_decimal_rejects_garbage(value):
+    with pytest.raises(ValueError):
+        to_decimal(value)
@@ -0,0 +1,77 @@
+"""Постраничные списки по ключу (pagination.py): курсоры вперёд и назад без пропусков и повторов."""
+from datetime import datetime, timedelta
+
+import pytest
+from flask_migrate import downgrade, upgrade
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Payment
+from pagination import decode_cursor, keyset_paginate
+
+KEY = [Payment.date, Payment.id]
+
+
+@pytest.fixture
+def payments(building):
+    apartment = building.apartments[0]
+    start = datetime(2024, 1, 1)
+    # По три платежа на одну и ту же дату: порядок внутри даты решает id
+    db.session.add_all(Payment(apartment_id=apartment.id, amount=index + 1,
+                               date=start + timedelta(days=index // 3)) for index in range(23))
+    db.session.commit()
+    return [payment.id for payment in Payment.query.order_by(Payment.date.desc(), Payment.id.desc())]
+
+
+def ids(page):
+    return [payment.id for payment in page.items]
+
+
+def test_forward_and_back_cover_every_row_once(payments):
+    pages = [keyset_paginate(Payment.query, KEY, descending=True, page_size=5)]
+    assert not pages[0].has_prev
+    while pages[-1].has_next:
+        pages.append(keyset_paginate(Payment.query, KEY, descending=True, after=pages[-1].next_cursor,
+                                     page_size=5))
+    assert [payment_id for page in pages for payment_id in ids(page)] == payments
+    assert [len(page.items) for page in pages] == [5, 5, 5, 5, 3]
+
+    # Назад от последней страницы - те же страницы в обратном порядке
+    page = pages[-1]
+    for expected in reversed(pages[:-1]):
+        page = keyset_paginate(Payment.query, KEY, descending=True, before=page.prev_cursor, page_size=5)
+        assert ids(page) == ids(expected)
+    assert not page.has_prev
+
+
+def test_ascending_order(payments):
+    page = keyset_paginate(Payment.query, KEY, page_size=4)
+    following = keyset_paginate(Payment.query, KEY, after=page.next_cursor, page_size=4)
+    assert ids(page) + ids(following) == list(reversed(payments))[:8]
+
+
+def test_malformed_cursor(app):
+    for cursor in ('garbage', 'WzFd'):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor, KEY)
+
+
+def test_payment_date_is_required(building):
+    with pytest.raises(IntegrityError):
+        db.session.execute(text("INSERT INTO payment (apartment_id, amount, date) VALUES (:id, 100, NULL)"),
+                           {'id': building.apartments[0].id})
+    db.session.rollback()
+
+
+def test_migration_fills_missing_dates(building):
+    apartment_id = building.apartments[0].id
+    db.session.remove()
+    downgrade(revision='0014')
+    db.session.execute(text("INSERT INTO payment (apartment_id, amount, status, created_at) "
+                            "VALUES (:apartment_id, 100, 'completed', '2024-05-06 07:08:09')"),
+                       {'apartment_id': apartment_id})
+    db.session.commit()
+    upgrade()
+
+    page = keyset_paginate(Payment.query, KEY, descending=True)
+    assert [payment.date for payment in page.items] == [datetime(2024, 5, 6, 7, 8, 9)]
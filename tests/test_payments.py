@@ -0,0 +1,60 @@
+"""Создание и изменение платежей: одна проверка полей в форме админки и в API."""
+from decimal import Decimal
+
+from models import db, Payment
+
+
+def _payment(building):
+    payment = Payment(apartment_id=building.apartments[0].id, amount=Decimal('100'),
+                      status='completed', payment_method='bank')
+    db.session.add(payment)
+    db.session.commit()
+    return payment
+
+
+def test_form_rejects_unknown_status(admin_client, building):
+    payment = _payment(building)
+    response = admin_client.post(f'/admin/payment/{payment.id}/update', data={'status': 'stolen'},
+                                 follow_redirects=True)
+    assert 'Некорректный статус: stolen' in response.get_data(as_text=True)
+    db.session.expire_all()
+    assert payment.status == 'completed'
+
+
+def test_form_rejects_bad_amount_and_method(admin_client, building):
+    payment = _payment(building)
+    for data in ({'amount': '-5'}, {'amount': 'abc'}, {'payment_method': 'barter'}):
+        admin_client.post(f'/admin/payment/{payment.id}/update', data=data)
+    db.session.expire_all()
+    assert payment.amount == Decimal('100')
+    assert payment.payment_method == 'bank'
+
+
+def test_form_updates_valid_fields(admin_client, building):
+    payment = _payment(building)
+    admin_client.post(f'/admin/payment/{payment.id}/update',
+                      data={'amount': '250.50', 'status': 'pending', 'payment_method': 'cash'})
+    db.session.expire_all()
+    assert (payment.amount, payment.status, payment.payment_method) == (Decimal('250.50'), 'pending', 'cash')
+
+
+def test_form_create_validates_like_api(admin_client, building):
+    apartment_id = building.apartments[0].id
+    admin_client.post('/admin/payment/create', data={'apartment_id': apartment_id, 'amount': '10',
+                                                     'status': 'stolen'})
+    assert Payment.query.count() == 0
+    admin_client.post('/admin/payment/create', data={'apartment_id': apartment_id, 'amount': '10'})
+    payment = Payment.query.one()
+    assert (payment.status, payment.payment_method) == ('completed', 'bank')
+
+
+def test_api_returns_same_errors(admin_client, building):
+    payment = _payment(building)
+    response = admin_client.patch(f'/api/v1/payments/{payment.id}', json={'status': 'stolen'})
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Некорректный статус: stolen'
+    response = admin_client.post('/api/v1/payments', json={'apartment_id': 999, 'amount': 10})
+    assert response.status_code == 400
+    response = admin_client.post('/api/v1/payments', json={'apartment_id': building.apartments[0].id,
+                                                           'amount': '0'})
+    assert response.status_code == 400
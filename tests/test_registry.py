@@ -0,0 +1,77 @@
+"""Загрузка реестров банка: сопоставление квартир и отсечение повторов (registry.py)."""
+import io
+from decimal import Decimal
+
+import pytest
+
+from models import db, ApartmentBalance, Payment
+from registry import import_registry, normalize_address
+
+
+def registry(*lines, header='Дата;Адрес;Квартира;Сумма;Номер документа', encoding='utf-8'):
+    return io.BytesIO('\n'.join((header,) + lines).encode(encoding))
+
+
+ADDRESS = 'Тестовая ул, 1'
+
+
+def test_address_spelling_variants_match(building):
+    assert normalize_address('г. Москва, ул. Тестовая, д. 1') == normalize_address('Москва Тестовая 1')
+
+    report = import_registry(registry(f'01.03.2025;{ADDRESS};кв. 2;1 500,50;A-1',
+                                      f'01.03.2025;{ADDRESS};99;10;A-2',
+                                      f'31.02.2025;{ADDRESS};1;10;A-3',
+                                      encoding='cp1251'), 'day.csv')
+
+    assert (report.matched, report.unmatched, report.invalid) == (1, 1, 1)
+    payment = Payment.query.one()
+    assert (payment.apartment_id, payment.amount) == (building.apartments[1].id, Decimal('1500.50'))
+    assert db.session.get(ApartmentBalance, payment.apartment_id).paid == Decimal('1500.50')
+
+
+def test_reimport_of_same_registry_is_skipped(building):
+    lines = (f'01.03.2025;{ADDRESS};1;100;A-1', f'01.03.2025;{ADDRESS};2;200;A-2')
+    import_registry(registry(*lines), 'day.csv', 'Банк')
+    report = import_registry(registry(*lines), 'day-copy.csv', 'Банк')
+    assert (report.matched, report.duplicates) == (0, 2)
+    assert Payment.query.count() == 2
+
+
+def test_row_numbers_are_not_document_numbers(building):
+    header = 'id;Дата;Адрес;Квартира;Сумма'
+    first = import_registry(registry(f'1;01.03.2025;{ADDRESS};1;100', f'2;01.03.2025;{ADDRESS};2;200',
+                                     header=header), 'day1.csv')
+    second = import_registry(registry(f'1;02.03.2025;{ADDRESS};1;100', f'2;02.03.2025;{ADDRESS};2;200',
+                                      header=header), 'day2.csv')
+    assert (first.matched, second.matched, second.duplicates) == (2, 2, 0)
+
+
+def test_same_document_number_from_different_banks(building):
+    line = f'01.03.2025;{ADDRESS};1;100;777'
+    assert import_registry(registry(line), 'a.csv', 'Банк А').matched == 1
+    assert import_registry(registry(line), 'b.csv', 'Банк Б').matched == 1
+    assert import_registry(registry(line), 'c.csv', 'Банк А').duplicates == 1
+
+
+@pytest.mark.parametrize('source', [None, 'Банк'])
+def test_identical_unreferenced_payments_are_both_loaded(building, source):
+    header = 'Дата;Адрес;Квартира;Сумма;Плательщик'
+    lines = (f'03.03.2025;{ADDRESS};1;500;Иванов', f'03.03.2025;{ADDRESS};1;500;Иванов')
+
+    report = import_registry(registry(*lines, header=header), 'day3.csv', source)
+    assert (report.matched, report.duplicates, report.suspected) == (2, 0, 1)
+    assert [line for line, *_ in report.suspected_lines] == [3]
+
+    # Тот же файл ещё раз - повтор, а не новые платежи
+    again = import_registry(registry(*lines, header=header), 'day3.csv', source)
+    assert (again.matched, again.duplicates) == (0, 2)
+
+    # Такой же платеж в другом файле загружается, но выносится на проверку
+    other = import_registry(registry(lines[0], header=header), 'day3-evening.csv', source)
+    assert (other.matched, other.suspected) == (1, 1)
+    assert Payment.query.count() == 3
+
+
+def test_missing_required_column(app):
+    with pytest.raises(ValueError, match='amount'):
+        import_registry(registry(f'01.03.2025;{ADDRESS};1', header='Дата;Адрес;Квартира'), 'bad.csv')
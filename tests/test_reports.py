@@ -0,0 +1,50 @@
+"""Отчёты по помесячным агрегатам и сальдо квартир."""
+from datetime import date, datetime
+from decimal import Decimal
+
+from models import db, Charge, Payment
+from reports import apartment_debt
+
+PERIODS = [date(2024, 1, 1), date(2024, 2, 1), date(2024, 3, 1)]
+
+
+def _history(building, service):
+    first, second, third = building.apartments
+    for period in PERIODS:
+        for apartment in (first, second):
+            db.session.add(Charge(apartment_id=apartment.id, service_id=service.id, period=period,
+                                  amount=Decimal('50'), total=Decimal('1000')))
+    # Вторая квартира гасит долг в феврале, третья платит вперёд
+    db.session.add(Payment(apartment_id=second.id, amount=Decimal('2000'), status='completed',
+                           date=datetime(2024, 2, 10)))
+    db.session.add(Payment(apartment_id=first.id, amount=Decimal('300'), status='completed',
+                           date=datetime(2024, 3, 5)))
+    db.session.add(Payment(apartment_id=third.id, amount=Decimal('500'), status='completed',
+                           date=datetime(2024, 1, 20)))
+    db.session.add(Payment(apartment_id=first.id, amount=Decimal('999'), status='pending',
+                           date=datetime(2024, 3, 6)))
+    db.session.commit()
+
+
+def _debts(period):
+    return {row[1]: row[2:] for row in apartment_debt(period)['rows']}
+
+
+def test_debt_at_end_of_each_period(building, service):
+    _history(building, service)
+    assert _debts(PERIODS[0]) == {'1': [1000, 0, 1000], '2': [1000, 0, 1000]}
+    assert _debts(PERIODS[1]) == {'1': [1000, 0, 2000]}
+    assert _debts(PERIODS[2]) == {'1': [1000, 300, 2700], '2': [1000, 0, 1000]}
+
+
+def test_debt_before_any_activity(building, service):
+    _history(building, service)
+    assert apartment_debt(date(2023, 12, 1))['rows'] == []
+
+
+def test_debt_totals_and_building_filter(building, service):
+    _history(building, service)
+    report = apartment_debt(PERIODS[2], building.id)
+    assert [row[1] for row in report['rows']] == ['1', '2']
+    assert report['totals'] == ['Итого', 2, 2000, 300, 3700]
+    assert apartment_debt(PERIODS[2], building.id + 1)['rows'] == []
@@ -0,0 +1,101 @@
+"""Личный кабинет жильца: вход, доступ только к своей квартире."""
+from decimal import Decimal
+
+import pytest
+
+from models import db, Payment, Resident, User
+
+
+def _resident_user(apartment, username, password='secret1', is_active=True):
+    resident = Resident(full_name=f'Жилец {username}', apartment_id=apartment.id)
+    user = User(username=username, email=f'{username}@example.com', is_admin=False, is_active=is_active,
+                resident=resident)
+    user.set_password(password)
+    db.session.add_all([resident, user])
+    db.session.commit()
+    return resident, user
+
+
+def _login(app, username, password='secret1'):
+    client = app.test_client()
+    client.post('/login', data={'username': username, 'password': password}, follow_redirects=True)
+    return client
+
+
+@pytest.fixture
+def residents(app, building):
+    first, second, _ = building.apartments
+    db.session.add_all([
+        Payment(apartment_id=first.id, amount=Decimal('111.11'), status='completed'),
+        Payment(apartment_id=second.id, amount=Decimal('222.22'), status='completed'),
+        Payment(apartment_id=first.id, amount=Decimal('333.33'), status='pending'),
+    ])
+    db.session.commit()
+    return _resident_user(first, 'first'), _resident_user(second, 'second')
+
+
+def test_sees_only_own_completed_payments(app, residents):
+    page = _login(app, 'first').get('/resident/payments').get_data(as_text=True)
+    assert '111.11' in page
+    assert '222.22' not in page
+    assert '333.33' not in page
+
+
+def test_no_admin_or_api_access(app, residents):
+    client = _login(app, 'first')
+    response = client.get('/admin/payments')
+    assert response.status_code == 302
+    assert '/admin/' not in response.headers['Location']
+    assert client.get('/api/v1/payments').status_code == 403
+    assert client.get('/admin/payment/create').status_code == 302
+
+
+def test_anonymous_redirected_to_login(app):
+    response = app.test_client().get('/resident/payments')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+
+
+def test_etag_is_per_user(app, residents):
+    etag = _login(app, 'first').get('/resident/payments').headers['ETag']
+    response = _login(app, 'second').get('/resident/payments', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert '222.22' in response.get_data(as_text=True)
+
+
+def test_moved_resident_sees_new_apartment(app, building, residents):
+    (resident, _), _ = residents
+    client = _login(app, 'first')
+    assert '111.11' in client.get('/resident/payments').get_data(as_text=True)
+    db.session.get(Resident, resident.id).apartment_id = building.apartments[1].id
+    db.session.commit()
+    page = client.get('/resident/payments').get_data(as_text=True)
+    assert '222.22' in page
+    assert '111.11' not in page
+
+
+def test_unlinked_and_inactive_accounts(app, building):
+    user = User(username='nobody', email='nobody@example.com', is_admin=False, is_active=True)
+    user.set_password('secret1')
+    db.session.add(user)
+    db.session.commit()
+    client = _login(app, 'nobody')
+    response = client.get('/resident/')
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+    # Учётную запись без квартиры разлогинило
+    assert '/login' in client.get('/resident/payments').headers['Location']
+
+    _resident_user(building.apartments[2], 'inactive', is_active=False)
+    assert _login(app, 'inactive').get('/resident/').status_code == 302
+
+
+def test_admin_grants_access(admin_client, app, building):
+    resident = Resident(full_name='Сидоров', apartment_id=building.apartments[2].id)
+    db.session.add(resident)
+    db.session.commit()
+    admin_client.post(f'/admin/resident/{resident.id}/account',
+                      data={'username': 'sidorov', 'password': 'secret1', 'is_active': 'on'})
+    response = _login(app, 'sidorov').get('/resident/profile')
+    assert response.status_code == 200
+    assert 'Сидоров' in response.get_data(as_text=True)
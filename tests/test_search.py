@@ -0,0 +1,76 @@
+"""Поиск квартир и жильцов: индекс FTS5 на триггерах и запасной путь через LIKE."""
+import pytest
+from sqlalchemy import insert
+
+import search
+from models import db, Apartment, Building, Resident
+from search import rebuild_search_index
+
+
+@pytest.fixture
+def resident(building):
+    resident = Resident(full_name='Иванов Пётр Сергеевич', phone='+7 (912) 345-67-89', email='petr@example.com',
+                        apartment_id=building.apartments[1].id, is_owner=True)
+    db.session.add(resident)
+    db.session.commit()
+    return resident
+
+
+def _found(query, kind=None):
+    return {(item['kind'], item['id']) for item in search.search(query, kind)}
+
+
+def test_index_follows_writes(building, resident):
+    apartment = building.apartments[0]
+    assert ('apartment', apartment.id) in _found('Тестовая 1', 'apartment')
+    assert _found('Иванов') == {('resident', resident.id)}
+
+    building.address = 'пр. Победы, д. 7'
+    resident.full_name = 'Петров Пётр Сергеевич'
+    db.session.commit()
+    assert _found('Тестовая') == set()
+    assert ('apartment', apartment.id) in _found('Победы')
+    assert _found('Иванов') == set()
+    assert _found('Петров Победы') == {('resident', resident.id)}
+
+    db.session.delete(resident)
+    db.session.commit()
+    assert _found('Петров') == set()
+
+
+def test_core_inserts_indexed(building):
+    db.session.execute(insert(Apartment), [{'number': '77', 'area': 30, 'building_id': building.id}])
+    db.session.commit()
+    assert _found('Тестовая 77', 'apartment') == {('apartment', Apartment.query.filter_by(number='77').one().id)}
+
+
+def test_phone_email_and_short_terms(building, resident):
+    assert _found('9123456789') == {('resident', resident.id)}
+    assert _found('petr@example') == {('resident', resident.id)}
+    # «2» короче триграммы и проверяется по строкам, найденным словом «Тестовая»
+    assert _found('Тестовая 2', 'apartment') == {('apartment', building.apartments[1].id)}
+    assert search.search('') == []
+
+
+def test_rebuild_matches_triggers(building, resident):
+    before = _found('Тестовая')
+    db.session.execute(db.text('DELETE FROM search_index'))
+    assert _found('Тестовая') == set()
+    rebuild_search_index()
+    assert _found('Тестовая') == before
+
+
+@pytest.mark.parametrize('query, kind', [
+    ('Тестовая', None), ('Тестовая 2', 'apartment'), ('Иванов', 'resident'), ('9123456789', None),
+    ('petr@example', None), ('нет такого', None),
+])
+def test_like_fallback_finds_the_same(building, resident, monkeypatch, query, kind):
+    expected = _found(query, kind)
+    monkeypatch.setattr(search, '_sqlite', lambda: False)
+    assert _found(query, kind) == expected
+
+
+def test_api_search(admin_client, building, resident):
+    items = admin_client.get('/api/v1/search?q=Иванов').get_json()['items']
+    assert [item['label'] for item in items] == ['Иванов Пётр Сергеевич - ул. Тестовая, д. 1, кв. 2']
+    assert admin_client.get('/api/v1/search?q=x&kind=building').status_code == 400
@@ -0,0 +1,51 @@
+"""Счётчики панели управления (stats.py): дельты по событиям ORM и сверка с базой."""
+from datetime import datetime
+from decimal import Decimal
+
+from models import db, Building, Payment
+from stats import dashboard_stats
+
+
+def test_deltas_follow_commits(building):
+    before = dashboard_stats.snapshot()
+
+    db.session.add(Building(address='ул. Новая, д. 5'))
+    db.session.add(Payment(apartment_id=building.apartments[0].id, amount=Decimal('10.50'), date=datetime(2024, 1, 1),
+                           status='pending'))
+    db.session.commit()
+    after = dashboard_stats.snapshot()
+    assert after['buildings'] == before['buildings'] + 1
+    assert after['pending_payments'] == before['pending_payments'] + 1
+    assert after['total_payments'] == before['total_payments'] + Decimal('10.50')
+
+    dashboard_stats.reconcile()
+    assert dashboard_stats.snapshot() == after
+
+
+def test_rolled_back_changes_are_not_counted(building):
+    before = dashboard_stats.snapshot()
+    db.session.add(Building(address='ул. Новая, д. 5'))
+    db.session.flush()
+    db.session.rollback()
+    assert dashboard_stats.snapshot() == before
+
+
+def test_snapshot_inside_open_transaction_is_not_counted_twice(building):
+    db.session.add(Building(address='ул. Новая, д. 5'))
+    db.session.flush()
+    # Пересчёт посреди транзакции: её строки ещё не зафиксированы и придут дельтой
+    dashboard_stats.invalidate()
+    assert dashboard_stats.snapshot()['buildings'] == 1
+    db.session.commit()
+    assert dashboard_stats.snapshot()['buildings'] == 2
+
+
+def test_each_app_has_its_own_counters(app, make_app, building):
+    assert dashboard_stats.snapshot()['buildings'] == 1
+    other = make_app('other')
+    with other.app_context():
+        assert dashboard_stats.snapshot()['buildings'] == 0
+        db.session.add(Building(address='ул. Другая, д. 1'))
+        db.session.commit()
+        assert dashboard_stats.snapshot()['buildings'] == 1
+    assert dashboard_stats.snapshot()['buildings'] == 1
@@ -0,0 +1,73 @@
+"""История тарифов: разбиение интервалов в set_tariff и поиск в TariffResolver."""
+from datetime import date
+from decimal import Decimal
+
+from models import db, Tariff
+from tariffs import TARIFF_EPOCH, TariffResolver, set_tariff
+
+
+def rates(service, building_id, periods):
+    resolver = TariffResolver.load([service.id])
+    return [resolver.rate(service.id, building_id, period) for period in periods]
+
+
+def intervals(service, building_id=None):
+    query = Tariff.query.filter_by(service_id=service.id, building_id=building_id).order_by(Tariff.valid_from)
+    return [(tariff.valid_from, tariff.valid_to, tariff.rate) for tariff in query]
+
+
+def test_without_history_service_rate_is_used(service):
+    assert rates(service, None, [date(2024, 1, 1)]) == [Decimal('25.0000')]
+    assert TariffResolver.load([service.id]).rate(service.id + 1, None, date(2024, 1, 1)) is None
+
+
+def test_new_tariff_keeps_past_periods(service):
+    set_tariff(service, 30, date(2024, 3, 15))
+    db.session.commit()
+
+    assert intervals(service) == [
+        (TARIFF_EPOCH, date(2024, 3, 1), Decimal('25.0000')),
+        (date(2024, 3, 1), None, Decimal('30.0000')),
+    ]
+    assert rates(service, None, [date(2024, 2, 1), date(2024, 3, 1), date(2030, 1, 1)]) == [
+        Decimal('25.0000'), Decimal('30.0000'), Decimal('30.0000')]
+
+
+def test_tariff_inserted_between_existing_ones(service):
+    set_tariff(service, 30, date(2024, 3, 1))
+    set_tariff(service, 28, date(2024, 1, 1))
+    db.session.commit()
+
+    assert intervals(service) == [
+        (TARIFF_EPOCH, date(2024, 1, 1), Decimal('25.0000')),
+        (date(2024, 1, 1), date(2024, 3, 1), Decimal('28.0000')),
+        (date(2024, 3, 1), None, Decimal('30.0000')),
+    ]
+    assert rates(service, None, [date(2023, 12, 1), date(2024, 2, 28), date(2024, 3, 1)]) == [
+        Decimal('25.0000'), Decimal('28.0000'), Decimal('30.0000')]
+
+
+def test_same_month_replaces_rate(service):
+    set_tariff(service, 30, date(2024, 3, 1))
+    set_tariff(service, '31,5', date(2024, 3, 20))
+    db.session.commit()
+
+    assert intervals(service)[-1] == (date(2024, 3, 1), None, Decimal('31.5000'))
+    assert len(intervals(service)) == 2
+
+
+def test_building_tariff_overrides_general_within_its_interval(building, service):
+    set_tariff(service, 30, date(2024, 1, 1))
+    set_tariff(service, 40, date(2024, 6, 1), building_id=building.id)
+    db.session.commit()
+
+    periods = [date(2024, 5, 1), date(2024, 6, 1)]
+    assert rates(service, building.id, periods) == [Decimal('30.0000'), Decimal('40.0000')]
+    assert rates(service, None, periods) == [Decimal('30.0000'), Decimal('30.0000')]
+
+
+def test_current_general_tariff_is_copied_to_service(service):
+    set_tariff(service, 30, date(2000, 2, 1))
+    set_tariff(service, 99, date(2999, 1, 1))
+    db.session.commit()
+    assert service.rate == Decimal('30.0000')
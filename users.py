@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from models import db, User, Resident
+
+# Сколько секунд запись кэша считается свежей (страховка для нескольких процессов)
+USER_CACHE_TTL = 60
+
+# Сколько пользователей хранится одновременно
+USER_CACHE_SIZE = 1024
+
+
+class UserIdentity:
+    """Поля пользователя, нужные для входа и проверки прав, без привязки к сессии БД."""
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, id, username, email, is_admin, is_active, resident_id=None, apartment_id=None):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.is_admin = bool(is_admin)
+        self.is_active = bool(is_active)
+        # Жилец и его квартира для личного кабинета (resident.py)
+        self.resident_id = resident_id
+        self.apartment_id = apartment_id
+
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, UserIdentity) and self.id == other.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+class UserCache:
+    """LRU-кэш пользователей с ограниченным временем жизни записей."""
+
+    def __init__(self, ttl=USER_CACHE_TTL, maxsize=USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, ttl=None, maxsize=None):
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if maxsize is not None:
+                self.maxsize = maxsize
+            self._entries.clear()
+
+    def _load(self, user_id):
+        row = db.session.execute(
+            select(User.id, User.username, User.email, User.is_admin, User.is_active,
+                   User.resident_id, Resident.apartment_id)
+            .outerjoin(Resident, Resident.id == User.resident_id)
+            .where(User.id == user_id)
+        ).first()
+        return UserIdentity(*row) if row else None
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and now - entry[0] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        identity = self._load(user_id)
+        if identity is None:
+            return None
+        with self._lock:
+            self._entries[user_id] = (now, identity)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_ids=None):
+        with self._lock:
+            if user_ids is None:
+                self._entries.clear()
+            else:
+                for user_id in user_ids:
+                    self._entries.pop(user_id, None)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries),
+                    'hit_rate': self.hit_rate}
+
+
+user_cache = UserCache()
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_users(session, flush_context):
+    changed = {obj.id for obj in session.new | session.dirty | session.deleted if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault('changed_users', set()).update(changed)
+    # Квартира жильца хранится в кэше вместе с его пользователем; переезды редки - сбрасывается весь кэш
+    if any(isinstance(obj, Resident)
+           and (obj in session.deleted or inspect(obj).attrs.apartment_id.history.has_changes())
+           for obj in session.dirty | session.deleted):
+        session.info['residents_moved'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_users(session):
+    changed = session.info.pop('changed_users', None)
+    if session.info.pop('residents_moved', False):
+        user_cache.invalidate()
+    elif changed:
+        user_cache.invalidate(changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_users(session):
+    session.info.pop('changed_users', None)
+    session.info.pop('residents_moved', None)